@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Adquisicion de Sensores en segundo plano - Proyecto Zenalyze
+Un hilo lee los sensores y publica fotos inmutables de la lectura;
+el hilo de dibujo solo toma la ultima referencia, sin locks
+"""
+
+import os
+import threading
+import time
+from collections import namedtuple
+
+# ============================================
+# CONFIGURACION
+# ============================================
+
+# Leer sensores en un hilo aparte (0 = en el loop de dibujo, como antes)
+SENSORES_EN_HILO = os.getenv('SENSORES_EN_HILO', '1') == '1'
+
+# Calibracion MQ-135 (voltaje en aire limpio y a fondo de escala)
+VOLTAJE_AIRE_LIMPIO = 0.5
+VOLTAJE_MAX = 3.0
+
+DEBUG = True
+
+# ============================================
+# LECTURA INMUTABLE
+# ============================================
+
+# namedtuple: inmutable y con __slots__ vacio, publicarla es asignar una referencia
+LecturaSensores = namedtuple('LecturaSensores', [
+    'temp', 'hum', 'ppm_co2', 'lux', 'nivel_ruido', 'movimiento', 'timestamp',
+    'voltaje_ldr', 'calidad_aire', 'valor_mic', 'diferencia_mic', 'co2',
+], defaults=[0, "normal", 0, 0, False])
+
+# ============================================
+# CONVERSIONES
+# ============================================
+
+def voltaje_a_ppm(voltaje, voltaje_aire_limpio=VOLTAJE_AIRE_LIMPIO, voltaje_max=VOLTAJE_MAX):
+    """Convierte voltaje del MQ-135 a PPM CO2"""
+    if voltaje <= voltaje_aire_limpio:
+        return 400
+    ppm = 400 + ((voltaje - voltaje_aire_limpio) / (voltaje_max - voltaje_aire_limpio)) * 2100
+    return int(min(ppm, 3000))
+
+
+def clasificar_calidad(ppm):
+    """Clasifica calidad del aire segun PPM CO2"""
+    if ppm < 600:
+        return "excelente"
+    elif ppm < 800:
+        return "bueno"
+    elif ppm < 1000:
+        return "regular"
+    else:
+        return "malo"
+
+# ============================================
+# HILO DE ADQUISICION
+# ============================================
+
+class HiloAdquisicion(threading.Thread):
+    def __init__(self, leer, intervalo, nombre="sensores"):
+        super().__init__(name=nombre, daemon=True)
+        self.leer = leer
+        self.intervalo = intervalo
+        self.detener_evento = threading.Event()
+        self.despertar_evento = threading.Event()
+
+        # Estadisticas
+        self.lecturas = 0
+        self.errores = 0
+        self.tiempos_lectura = RegistroTiempos()
+
+    def run(self):
+        """Lee los sensores cada intervalo hasta que se detenga"""
+        siguiente = time.monotonic()
+        while not self.detener_evento.is_set():
+            inicio = time.perf_counter()
+            try:
+                self.leer()
+                self.lecturas += 1
+            except Exception as e:
+                self.errores += 1
+                if DEBUG:
+                    print("DEBUG: Error en hilo de sensores - " + str(e))
+            self.tiempos_lectura.registrar(time.perf_counter() - inicio)
+
+            # Si una lectura lenta se come el intervalo, no acumular atraso
+            siguiente = max(siguiente + self.intervalo, time.monotonic())
+            if self.despertar_evento.wait(siguiente - time.monotonic()):
+                self.despertar_evento.clear()
+                siguiente = time.monotonic()
+
+    def cambiar_intervalo(self, intervalo):
+        """Nuevo intervalo; si es mas corto, la proxima lectura sale ya"""
+        acortar = intervalo < self.intervalo
+        self.intervalo = intervalo
+        if acortar:
+            self.despertar_evento.set()
+
+    def detener(self, espera=2.0):
+        """Pide al hilo que termine y lo espera"""
+        self.detener_evento.set()
+        self.despertar_evento.set()
+        if self.is_alive():
+            self.join(espera)
+
+# ============================================
+# TIEMPOS
+# ============================================
+
+class RegistroTiempos:
+    def __init__(self, capacidad=4096):
+        self.capacidad = capacidad
+        self.muestras = [0.0] * capacidad
+        self.total = 0
+
+    def registrar(self, segundos):
+        """Guarda una duracion (sobrescribe las mas viejas)"""
+        self.muestras[self.total % self.capacidad] = segundos
+        self.total += 1
+
+    def percentiles(self, ps=(50, 95, 99)):
+        """Percentiles en milisegundos de las ultimas muestras"""
+        n = min(self.total, self.capacidad)
+        if n == 0:
+            return {p: 0.0 for p in ps}
+        ordenadas = sorted(self.muestras[:n])
+        return {p: ordenadas[min(n - 1, int(n * p / 100))] * 1000 for p in ps}
+
+    def resumen(self):
+        """Texto con p50/p95/p99 y maximo"""
+        n = min(self.total, self.capacidad)
+        pct = self.percentiles()
+        maximo = max(self.muestras[:n]) * 1000 if n else 0.0
+        return "p50={:.1f}ms p95={:.1f}ms p99={:.1f}ms max={:.1f}ms (n={})".format(
+            pct[50], pct[95], pct[99], maximo, n)
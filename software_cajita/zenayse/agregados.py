@@ -0,0 +1,225 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Agregados por Minuto/Hora/Dia - Proyecto Zenalyze
+Resume las lecturas a medida que llegan (cuenta, media de Welford, minimo,
+maximo y ultimo) y emite un registro compacto al cerrar cada intervalo
+"""
+
+import os
+import time
+from collections import namedtuple
+
+# ============================================
+# CONFIGURACION
+# ============================================
+
+GUARDAR_AGREGADOS = os.getenv('GUARDAR_AGREGADOS', '1') == '1'
+ARCHIVO_AGREGADOS = 'data/agregados.csv'
+
+# Segundos de cada resolucion
+RESOLUCIONES = (60, 3600, 86400)
+NOMBRES_RESOLUCION = {60: "minuto", 3600: "hora", 86400: "dia"}
+
+# Campo del registro -> atributo de LecturaSensores
+CAMPOS = (
+    ("temp", "temp"),
+    ("hum", "hum"),
+    ("ppm", "ppm_co2"),
+    ("lux", "lux"),
+    ("mic", "diferencia_mic"),
+    ("movimiento", "movimiento"),  # La media es la fraccion del tiempo con movimiento
+)
+
+ENCABEZADO_AGREGADOS = "resolucion,inicio,cuenta,parcial," + ",".join(
+    "{0}_media,{0}_min,{0}_max,{0}_ultimo".format(campo) for campo, _ in CAMPOS)
+
+# ============================================
+# REGISTROS
+# ============================================
+
+# estadisticas: {campo: EstadisticaCampo}
+# parcial: el proceso arranco o se apago dentro del intervalo; tras un reinicio puede
+# haber otra fila parcial con el mismo inicio (se combinan ponderando por cuenta)
+BloqueAgregado = namedtuple('BloqueAgregado', ['resolucion', 'inicio', 'cuenta', 'estadisticas', 'parcial'])
+EstadisticaCampo = namedtuple('EstadisticaCampo', ['media', 'minimo', 'maximo', 'ultimo'])
+
+
+def inicio_intervalo(ts, resolucion):
+    """Inicio del intervalo que contiene ts (dias en hora local)"""
+    if resolucion % 86400 == 0:
+        # Medianoche local con mktime: el dia del cambio de hora dura 23 o 25 horas
+        t = time.localtime(ts)
+        return time.mktime((t.tm_year, t.tm_mon, t.tm_mday, 0, 0, 0, 0, 0, -1))
+    desfase = time.localtime(ts).tm_gmtoff if resolucion >= 3600 else 0
+    return (ts + desfase) // resolucion * resolucion - desfase
+
+
+def fin_intervalo(inicio, resolucion):
+    """Inicio del intervalo siguiente (la proxima medianoche local para los dias)"""
+    if resolucion % 86400 == 0:
+        t = time.localtime(inicio)
+        return time.mktime((t.tm_year, t.tm_mon, t.tm_mday + resolucion // 86400, 0, 0, 0, 0, 0, -1))
+    return inicio + resolucion
+
+
+def fila_csv(bloque):
+    """Fila CSV del bloque con el formato de ENCABEZADO_AGREGADOS"""
+    partes = [NOMBRES_RESOLUCION.get(bloque.resolucion, str(bloque.resolucion)),
+              time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(bloque.inicio)),
+              str(bloque.cuenta), "1" if bloque.parcial else "0"]
+    for campo, _ in CAMPOS:
+        e = bloque.estadisticas[campo]
+        partes.append("{:.3f},{:.3f},{:.3f},{:.3f}".format(e.media, e.minimo, e.maximo, e.ultimo))
+    return ",".join(partes)
+
+# ============================================
+# CLASE AGREGADOR
+# ============================================
+
+class Agregador:
+    """Un intervalo abierto por resolucion; memoria constante"""
+
+    def __init__(self, emitir, resoluciones=RESOLUCIONES, campos=CAMPOS):
+        self.emitir = emitir  # Recibe cada BloqueAgregado cerrado
+        self.resoluciones = resoluciones
+        self.campos = campos
+        self.atributos = [atributo for _, atributo in campos]
+
+        # Por resolucion: [inicio, fin, cuenta, medias, minimos, maximos, ultimos, parcial]
+        self.abiertos = {resolucion: None for resolucion in resoluciones}
+        self.cerrados = set()  # Resoluciones que ya cerraron un intervalo entero
+        self.emitidos = 0
+
+    def agregar(self, lectura):
+        """Suma una LecturaSensores a los intervalos abiertos"""
+        ts = lectura.timestamp
+        valores = [float(getattr(lectura, atributo)) for atributo in self.atributos]
+
+        for resolucion in self.resoluciones:
+            abierto = self.abiertos[resolucion]
+            if abierto is not None and ts >= abierto[1]:
+                self.cerrar_intervalo(resolucion)
+                abierto = None
+
+            if abierto is None:
+                # El primer intervalo de cada resolucion empezo antes que el proceso
+                inicio = inicio_intervalo(ts, resolucion)
+                self.abiertos[resolucion] = [inicio, fin_intervalo(inicio, resolucion), 1,
+                                             list(valores), list(valores), list(valores), valores,
+                                             resolucion not in self.cerrados]
+                continue
+
+            abierto[2] += 1
+            n = abierto[2]
+            medias, minimos, maximos = abierto[3], abierto[4], abierto[5]
+            for i, x in enumerate(valores):
+                medias[i] += (x - medias[i]) / n
+                if x < minimos[i]:
+                    minimos[i] = x
+                elif x > maximos[i]:
+                    maximos[i] = x
+            abierto[6] = valores
+
+    def cerrar_intervalo(self, resolucion, parcial=False):
+        """Emite el intervalo abierto de una resolucion"""
+        abierto = self.abiertos[resolucion]
+        if abierto is None:
+            return
+        inicio, _, cuenta, medias, minimos, maximos, ultimos, primero = abierto
+        estadisticas = {campo: EstadisticaCampo(medias[i], minimos[i], maximos[i], ultimos[i])
+                        for i, (campo, _) in enumerate(self.campos)}
+        self.abiertos[resolucion] = None
+        self.emitidos += 1
+        if not parcial:
+            self.cerrados.add(resolucion)
+        self.emitir(BloqueAgregado(resolucion, inicio, cuenta, estadisticas, parcial or primero))
+
+    def cerrar(self):
+        """Emite los intervalos a medio llenar (al apagar), marcados como parciales"""
+        for resolucion in self.resoluciones:
+            self.cerrar_intervalo(resolucion, parcial=True)
+
+# ============================================
+# MAIN - Comparacion contra la agregacion por fuerza bruta
+# ============================================
+
+if __name__ == '__main__':
+    import random
+    from adquisicion import LecturaSensores
+
+    random.seed(7)
+    lecturas = []
+    ts = time.mktime((2026, 3, 1, 22, 0, 0, 0, 0, -1))
+    temp = 22.0
+    for i in range(400000):
+        ts += random.uniform(0.1, 0.6)
+        temp += random.gauss(0, 0.02)
+        lecturas.append(LecturaSensores(temp=temp, hum=random.uniform(30, 70),
+                                        ppm_co2=random.randint(380, 2000), lux=random.randint(0, 800),
+                                        nivel_ruido="silencio", movimiento=random.random() < 0.05,
+                                        timestamp=ts, diferencia_mic=abs(random.gauss(0, 300))))
+
+    bloques = []
+    agregador = Agregador(bloques.append)
+    inicio = time.perf_counter()
+    for lectura in lecturas:
+        agregador.agregar(lectura)
+    agregador.cerrar()
+    por_lectura = (time.perf_counter() - inicio) / len(lecturas)
+
+    # Fuerza bruta: agrupar todo y calcular con sum/min/max
+    errores = 0
+    for resolucion in RESOLUCIONES:
+        grupos = {}
+        for lectura in lecturas:
+            grupos.setdefault(inicio_intervalo(lectura.timestamp, resolucion), []).append(lectura)
+
+        emitidos = {b.inicio: b for b in bloques if b.resolucion == resolucion}
+        assert sorted(emitidos) == sorted(grupos), resolucion
+
+        for inicio_grupo, grupo in grupos.items():
+            bloque = emitidos[inicio_grupo]
+            assert bloque.cuenta == len(grupo)
+            for campo, atributo in CAMPOS:
+                valores = [float(getattr(l, atributo)) for l in grupo]
+                e = bloque.estadisticas[campo]
+                esperado = sum(valores) / len(valores)
+                if (abs(e.media - esperado) > 1e-9 * max(1.0, abs(esperado))
+                        or e.minimo != min(valores) or e.maximo != max(valores)
+                        or e.ultimo != valores[-1]):
+                    errores += 1
+
+        print("{:>6}: {} intervalos".format(NOMBRES_RESOLUCION[resolucion], len(grupos)))
+
+    # Solo el primer y el ultimo intervalo de cada resolucion quedan parciales
+    for resolucion in RESOLUCIONES:
+        propios = [b for b in bloques if b.resolucion == resolucion]
+        marcas = [b.parcial for b in propios]
+        assert marcas == [True] + [False] * (len(propios) - 2) + [True], (resolucion, marcas)
+
+    # Cambio de hora (Europa, 29 de marzo de 2026): el dia dura 23 h y es un solo intervalo
+    if hasattr(time, 'tzset'):
+        zona = os.environ.get('TZ')
+        os.environ['TZ'] = 'Europe/Madrid'
+        time.tzset()
+        dias = []
+        cambio = Agregador(dias.append, resoluciones=(86400,))
+        medianoche = time.mktime((2026, 3, 29, 0, 0, 0, 0, 0, -1))
+        for hora in range(0, 48):
+            cambio.agregar(LecturaSensores(22.0, 50.0, 400, 300, "silencio", False, medianoche + hora * 1800 + 1))
+        cambio.cerrar()
+        if zona is None:
+            del os.environ['TZ']
+        else:
+            os.environ['TZ'] = zona
+        time.tzset()
+        assert [(d.inicio, d.cuenta) for d in dias] == [(medianoche, 46), (medianoche + 23 * 3600, 2)], \
+            [(d.inicio, d.cuenta) for d in dias]
+        print("Dia con cambio de hora: 23 h en un solo intervalo")
+
+    print("Errores contra fuerza bruta: {}".format(errores))
+    print("agregar(): {:.1f} us por lectura".format(por_lectura * 1e6))
+    print(ENCABEZADO_AGREGADOS)
+    print(fila_csv(bloques[0]))
+    assert errores == 0
@@ -0,0 +1,306 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Almacen de Lecturas - Proyecto Zenalyze
+Archivo circular de tamano fijo mapeado en memoria con registros empaquetados;
+consulta por rango de tiempo con vistas NumPy sin copia
+"""
+
+import bisect
+import mmap
+import os
+import struct
+import time
+import zlib
+
+import numpy as np
+
+# ============================================
+# CONFIGURACION
+# ============================================
+
+GUARDAR_HISTORIAL = os.getenv('GUARDAR_HISTORIAL', '1') == '1'
+ARCHIVO_HISTORIAL = os.getenv('ARCHIVO_HISTORIAL', 'data/historial_lecturas.bin')
+
+# 1M registros de 32 bytes = 32 MB, ~3.5 dias a una lectura cada 0.3 s
+CAPACIDAD_HISTORIAL = int(os.getenv('CAPACIDAD_HISTORIAL', 1000000))
+
+# Cada cuanto se confirman los registros en disco (segundos)
+INTERVALO_SYNC = float(os.getenv('INTERVALO_SYNC_HISTORIAL', 5))
+
+# Ranuras despues de la cabeza confirmada que no se leen: el escritor confirma
+# antes de llenarlas, asi un lector (u otro arranque tras un corte) nunca ve
+# como mas viejos registros que se escribieron despues del ultimo contador
+BANDA_GUARDA = 4096
+
+DEBUG = True
+
+# ============================================
+# FORMATO DEL ARCHIVO
+# ============================================
+
+# Registro de 32 bytes; el relleno mantiene el timestamp alineado a 8
+REGISTRO = np.dtype([
+    ('timestamp', '<f8'),
+    ('temp', '<f4'),
+    ('hum', '<f4'),
+    ('ppm', '<f4'),
+    ('lux', '<f4'),
+    ('mic', '<f4'),
+    ('movimiento', 'u1'),
+    ('relleno', 'V3'),
+])
+
+MAGICO = b'ZNLR'
+VERSION = 1
+TAMANO_ENCABEZADO = 4096  # Una pagina: los registros quedan alineados para msync
+
+# magico, version, tamano de registro, capacidad
+FORMATO_FIJO = struct.Struct('<4sIIQ')
+
+# Dos copias del contador; se escribe la que no es la ultima valida, asi un
+# corte a mitad de escritura deja intacta la anterior
+# secuencia, escritos, ultimo timestamp, crc32 de los tres campos
+FORMATO_RANURA = struct.Struct('<QQdI')
+OFFSETS_RANURA = (64, 128)
+
+# ============================================
+# CLASE ALMACEN
+# ============================================
+
+class AlmacenLecturas:
+    def __init__(self, ruta=ARCHIVO_HISTORIAL, capacidad=CAPACIDAD_HISTORIAL,
+                 solo_lectura=False, intervalo_sync=INTERVALO_SYNC):
+        self.ruta = ruta
+        self.solo_lectura = solo_lectura
+        self.intervalo_sync = intervalo_sync
+
+        if not solo_lectura:
+            self.crear_si_falta(capacidad)
+
+        self.archivo = open(ruta, 'rb' if solo_lectura else 'r+b')
+        acceso = mmap.ACCESS_READ if solo_lectura else mmap.ACCESS_WRITE
+        self.mm = mmap.mmap(self.archivo.fileno(), 0, access=acceso)
+
+        magico, version, tamano, self.capacidad = FORMATO_FIJO.unpack_from(self.mm, 0)
+        if magico != MAGICO or version != VERSION or tamano != REGISTRO.itemsize:
+            self.cerrar()
+            raise ValueError("Archivo de historial invalido: " + ruta)
+
+        # Vista sobre el mapa: escribir en ella escribe en el archivo
+        self.registros = np.frombuffer(self.mm, dtype=REGISTRO, count=self.capacidad,
+                                       offset=TAMANO_ENCABEZADO)
+
+        self.banda = min(BANDA_GUARDA, self.capacidad // 4)
+
+        self.secuencia, self.escritos, self.ultimo_ts = self.leer_contador()
+        self.confirmados = self.escritos
+        self.ultimo_sync = time.monotonic()
+
+    def crear_si_falta(self, capacidad):
+        """Crea el archivo (disperso) con el encabezado si no existe"""
+        if os.path.exists(self.ruta):
+            return
+        directorio = os.path.dirname(self.ruta)
+        if directorio and not os.path.exists(directorio):
+            os.makedirs(directorio)
+
+        temporal = self.ruta + ".tmp"
+        with open(temporal, 'wb') as f:
+            f.truncate(TAMANO_ENCABEZADO + capacidad * REGISTRO.itemsize)
+            f.write(FORMATO_FIJO.pack(MAGICO, VERSION, REGISTRO.itemsize, capacidad))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temporal, self.ruta)
+        if DEBUG:
+            print("INFO: Historial creado: {} ({} registros, {:.0f} MB)".format(
+                self.ruta, capacidad, capacidad * REGISTRO.itemsize / 1048576))
+
+    # ---------- Contador de escrituras ----------
+
+    def leer_contador(self):
+        """(secuencia, escritos, ultimo_ts) de la ranura valida mas reciente"""
+        mejor = (0, 0, 0.0)
+        for offset in OFFSETS_RANURA:
+            secuencia, escritos, ultimo_ts, crc = FORMATO_RANURA.unpack_from(self.mm, offset)
+            datos = FORMATO_RANURA.pack(secuencia, escritos, ultimo_ts, 0)[:-4]
+            if crc == zlib.crc32(datos) and secuencia >= mejor[0]:
+                mejor = (secuencia, escritos, ultimo_ts)
+        return mejor
+
+    def sincronizar(self):
+        """Lleva los registros a disco y despues confirma el contador"""
+        if self.solo_lectura or self.escritos == self.confirmados:
+            return
+
+        # Primero los datos: el contador nunca apunta a registros sin escribir
+        self.mm.flush()
+
+        self.secuencia += 1
+        datos = FORMATO_RANURA.pack(self.secuencia, self.escritos, self.ultimo_ts, 0)[:-4]
+        offset = OFFSETS_RANURA[self.secuencia % 2]
+        FORMATO_RANURA.pack_into(self.mm, offset, self.secuencia, self.escritos,
+                                 self.ultimo_ts, zlib.crc32(datos))
+        self.mm.flush(0, TAMANO_ENCABEZADO)
+
+        self.confirmados = self.escritos
+        self.ultimo_sync = time.monotonic()
+
+    # ---------- Escritura ----------
+
+    def agregar(self, lectura):
+        """Guarda una LecturaSensores (solo desde un hilo escritor)"""
+        # Los timestamps no retroceden aunque el reloj se ajuste: el orden permite buscar
+        ts = max(lectura.timestamp, self.ultimo_ts)
+
+        registro = self.registros[self.escritos % self.capacidad]
+        registro['timestamp'] = ts
+        registro['temp'] = lectura.temp
+        registro['hum'] = lectura.hum
+        registro['ppm'] = lectura.ppm_co2
+        registro['lux'] = lectura.lux
+        registro['mic'] = lectura.diferencia_mic
+        registro['movimiento'] = lectura.movimiento
+
+        self.ultimo_ts = ts
+        self.escritos += 1
+
+        if (time.monotonic() - self.ultimo_sync >= self.intervalo_sync
+                or self.escritos - self.confirmados >= self.banda):
+            self.sincronizar()
+
+    # ---------- Consulta ----------
+
+    def __len__(self):
+        return min(self.escritos, self.capacidad - self.banda)
+
+    def vistas_ultimos(self, n):
+        """Los ultimos n registros confirmados en orden de tiempo, como una o dos vistas"""
+        if self.solo_lectura:
+            self.secuencia, self.escritos, self.ultimo_ts = self.leer_contador()
+        n = min(n, len(self))
+        inicio = (self.escritos - n) % self.capacidad
+        if inicio + n <= self.capacidad:
+            return (self.registros[inicio:inicio + n],)
+        return (self.registros[inicio:], self.registros[:inicio + n - self.capacidad])
+
+    def segmentos(self):
+        """Los registros guardados en orden de tiempo (sin la banda de guarda)"""
+        return self.vistas_ultimos(self.capacidad)
+
+    def rango_vistas(self, desde, hasta):
+        """Vistas (sin copia) de los registros con desde <= timestamp < hasta"""
+        vistas = []
+        for segmento in self.segmentos():
+            # bisect lee ~20 registros; searchsorted copiaria la columna entera
+            # porque el campo timestamp de un arreglo estructurado no es contiguo
+            inicio = bisect.bisect_left(segmento, desde, key=lambda r: r['timestamp'])
+            fin = bisect.bisect_left(segmento, hasta, lo=inicio, key=lambda r: r['timestamp'])
+            if fin > inicio:
+                vistas.append(segmento[inicio:fin])
+        return vistas
+
+    def rango(self, desde, hasta):
+        """Registros del rango en un solo arreglo (copia solo si da la vuelta)"""
+        vistas = self.rango_vistas(desde, hasta)
+        if not vistas:
+            return self.registros[:0]
+        if len(vistas) == 1:
+            return vistas[0]
+        return np.concatenate(vistas)
+
+    def ultimos(self, n):
+        """Los ultimos n registros (copia solo si da la vuelta)"""
+        vistas = self.vistas_ultimos(n)
+        if len(vistas) == 1:
+            return vistas[0]
+        return np.concatenate(vistas)
+
+    def cerrar(self):
+        """Confirma lo pendiente y libera el mapa"""
+        if self.mm is None:
+            return
+        self.sincronizar()
+        self.registros = None
+        try:
+            self.mm.close()
+        except BufferError:
+            pass  # Aun hay vistas vivas; el mapa se libera con ellas
+        self.mm = None
+        self.archivo.close()
+
+# ============================================
+# MAIN - Prueba de consulta y de recuperacion
+# ============================================
+
+if __name__ == '__main__':
+    import tempfile
+    from adquisicion import LecturaSensores
+
+    ruta = os.path.join(tempfile.mkdtemp(), 'historial.bin')
+    capacidad = 200000
+    almacen = AlmacenLecturas(ruta, capacidad=capacidad, intervalo_sync=1e9)
+
+    # 1.5 vueltas del anillo a una lectura cada 0.3 s
+    total = capacidad * 3 // 2
+    t0 = 1.7e9
+    inicio = time.perf_counter()
+    for i in range(total):
+        almacen.agregar(LecturaSensores(temp=22.0, hum=50.0, ppm_co2=400, lux=300,
+                                        nivel_ruido="silencio", movimiento=i % 100 == 0,
+                                        timestamp=t0 + i * 0.3, diferencia_mic=float(i % 500)))
+    escritura = (time.perf_counter() - inicio) / total
+    almacen.sincronizar()
+    print("agregar(): {:.1f} us por registro".format(escritura * 1e6))
+
+    # Una hora en medio del anillo; cruza el punto de vuelta
+    cabeza_ts = t0 + (total - capacidad) * 0.3
+    desde = cabeza_ts + (capacidad - (total - capacidad)) * 0.3 - 1800
+    hasta = desde + 3600
+
+    inicio = time.perf_counter()
+    for _ in range(100):
+        vistas = almacen.rango_vistas(desde, hasta)
+    indice = (time.perf_counter() - inicio) / 100
+
+    inicio = time.perf_counter()
+    todo = np.concatenate(almacen.segmentos())
+    lineal = todo[(todo['timestamp'] >= desde) & (todo['timestamp'] < hasta)]
+    barrido = time.perf_counter() - inicio
+
+    encontrados = sum(len(v) for v in vistas)
+    assert encontrados == len(lineal) == 12000, (encontrados, len(lineal))
+    assert all(np.shares_memory(v, almacen.registros) for v in vistas)
+    print("rango de 1 h: {} registros en {} vistas, {:.0f} us (barrido completo: {:.1f} ms)".format(
+        encontrados, len(vistas), indice * 1e6, barrido * 1000))
+
+    # Corte sin sincronizar: al reabrir solo aparece lo confirmado
+    confirmados = almacen.escritos
+    for i in range(1000):
+        almacen.agregar(LecturaSensores(22.0, 50.0, 400, 300, "silencio", False,
+                                        t0 + (total + i) * 0.3))
+    almacen.mm.flush()  # Como si el kernel ya hubiera escrito las paginas de datos
+    del vistas, todo, lineal
+    almacen.registros = None
+    almacen.mm.close()
+    almacen.archivo.close()
+
+    lector = AlmacenLecturas(ruta, solo_lectura=True)
+    assert lector.escritos == confirmados, (lector.escritos, confirmados)
+    print("reabierto: {} registros confirmados, ultimo ts={:.1f}".format(len(lector), lector.ultimo_ts))
+
+    # Los 1000 sin confirmar pisaron las ranuras mas viejas: no deben aparecer
+    # ni romper el orden que usa la busqueda
+    ultimo_confirmado = t0 + (total - 1) * 0.3
+    todo = lector.rango(t0, t0 + 1e9)
+    assert len(todo) == len(lector) == capacidad - lector.banda, (len(todo), len(lector))
+    assert np.all(np.diff(todo['timestamp']) > 0) and todo['timestamp'][-1] == ultimo_confirmado
+    desde = todo['timestamp'][0]
+    hasta = desde + 3600
+    parte = lector.rango(desde, hasta)
+    assert len(parte) == 12000 and parte['timestamp'].min() >= desde and parte['timestamp'].max() < hasta
+    ultimos = lector.ultimos(5000)
+    assert np.all(np.diff(ultimos['timestamp']) > 0) and ultimos['timestamp'][-1] == ultimo_confirmado
+    print("vuelta + corte: rango() y ultimos() en orden, sin registros sin confirmar")
+    del todo, parte, ultimos
+    lector.cerrar()
@@ -0,0 +1,238 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Atlas de Texto - Proyecto Zenalyze
+Glifos pre-rasterizados por fuente y cache de medidas: los textos se arman
+copiando glifos en lugar de pasar cada cadena por FreeType en cada cuadro
+"""
+
+from collections import OrderedDict
+
+import numpy as np
+from PIL import Image, ImageDraw
+
+# ============================================
+# CONFIGURACION
+# ============================================
+
+# Digitos, signos y unidades de los campos numericos
+CARACTERES = "0123456789.,-+:%| CVlupmx"
+
+# Textos armados que se guardan (valores distintos que se repiten)
+CAPACIDAD_TEXTOS = 256
+
+DEBUG = True
+
+# ============================================
+# CLASE ATLAS
+# ============================================
+
+class AtlasTexto:
+    def __init__(self, fuente, caracteres=CARACTERES, textos_fijos=(), capacidad=CAPACIDAD_TEXTOS):
+        self.fuente = fuente
+        self.capacidad = capacidad
+        self.glifos = {}       # caracter -> (arreglo uint8, dx, dy)
+        self.avances = {}      # (caracter, siguiente) -> avance en pixeles con kerning
+        self.mascaras = OrderedDict()  # texto -> (Image L, (dx, dy))
+        self.cajas = {}        # texto -> textbbox en (0, 0)
+
+        # Estadisticas
+        self.aciertos = 0
+        self.compuestos = 0
+        self.rasterizados = 0
+
+        # Las fuentes de mapa de bits (load_default sin FreeType) no se pueden armar por glifo
+        self.compatible = hasattr(fuente, "getmask2") and hasattr(fuente, "getlength")
+        self.componer = self.compatible
+
+        if self.compatible:
+            for caracter in caracteres:
+                self.glifo(caracter)
+            # Si el motor de layout posiciona distinto (p. ej. raqm) se usa la cadena completa
+            self.componer = self.verificar("Temp: 22.5 C 1234 ppm 99% |||")
+            if DEBUG and not self.componer:
+                print("INFO: Atlas de texto sin composicion por glifo para esta fuente")
+            for texto in textos_fijos:
+                self.mascara(texto)
+
+    def rasterizar(self, texto):
+        """Mascara L y desplazamiento de texto, igual a lo que usa draw.text"""
+        nucleo, desplazamiento = self.fuente.getmask2(texto, "L")
+        mascara = Image.new("L", nucleo.size, 0)
+        if nucleo.size[0] and nucleo.size[1]:
+            ImageDraw.Draw(mascara).text((-desplazamiento[0], -desplazamiento[1]), texto,
+                                         fill=255, font=self.fuente)
+        self.rasterizados += 1
+        return mascara, desplazamiento
+
+    def glifo(self, caracter):
+        """Glifo de un caracter (se rasteriza la primera vez)"""
+        glifo = self.glifos.get(caracter)
+        if glifo is None:
+            mascara, (dx, dy) = self.rasterizar(caracter)
+            glifo = (np.asarray(mascara), dx, dy)
+            self.glifos[caracter] = glifo
+        return glifo
+
+    def avance(self, caracter, siguiente):
+        """Pixeles desde caracter hasta siguiente, con kerning"""
+        par = (caracter, siguiente)
+        avance = self.avances.get(par)
+        if avance is None:
+            avance = int(round(self.fuente.getlength(caracter + siguiente) - self.fuente.getlength(siguiente)))
+            self.avances[par] = avance
+        return avance
+
+    def componer_texto(self, texto):
+        """Arma la mascara del texto con los glifos del atlas"""
+        partes = []
+        x = 0
+        for i, caracter in enumerate(texto):
+            arreglo, dx, dy = self.glifo(caracter)
+            partes.append((x + dx, dy, arreglo))
+            if i + 1 < len(texto):
+                x += self.avance(caracter, texto[i + 1])
+
+        partes = [p for p in partes if p[2].size]
+        if not partes:
+            return self.rasterizar(texto)
+
+        x0 = min(p[0] for p in partes)
+        y0 = min(p[1] for p in partes)
+        x1 = max(p[0] + p[2].shape[1] for p in partes)
+        y1 = max(p[1] + p[2].shape[0] for p in partes)
+
+        # FreeType combina glifos que se tocan con el maximo, no con la suma
+        lienzo = np.zeros((y1 - y0, x1 - x0), dtype=np.uint8)
+        for x, y, arreglo in partes:
+            alto, ancho = arreglo.shape
+            zona = lienzo[y - y0:y - y0 + alto, x - x0:x - x0 + ancho]
+            np.maximum(zona, arreglo, out=zona)
+
+        self.compuestos += 1
+        return Image.fromarray(lienzo, "L"), (x0, y0)
+
+    def mascara(self, texto):
+        """Mascara del texto: del cache, armada por glifos o rasterizada"""
+        guardada = self.mascaras.get(texto)
+        if guardada is not None:
+            self.mascaras.move_to_end(texto)
+            self.aciertos += 1
+            return guardada
+
+        guardada = self.componer_texto(texto) if self.componer else self.rasterizar(texto)
+        self.mascaras[texto] = guardada
+        if len(self.mascaras) > self.capacidad:
+            self.mascaras.popitem(last=False)
+        return guardada
+
+    def verificar(self, texto):
+        """True si armar por glifos da exactamente lo mismo que FreeType"""
+        armada, desplazamiento = self.componer_texto(texto)
+        referencia, desplazamiento_ref = self.rasterizar(texto)
+        return (desplazamiento == desplazamiento_ref and armada.size == referencia.size
+                and armada.tobytes() == referencia.tobytes())
+
+    def caja(self, texto):
+        """Igual a draw.textbbox((0, 0), texto, font) pero con cache"""
+        caja = self.cajas.get(texto)
+        if caja is None:
+            caja = self.fuente.getbbox(texto)
+            if len(self.cajas) >= self.capacidad:
+                self.cajas.clear()
+            self.cajas[texto] = caja
+        return caja
+
+    def dibujar(self, draw, posicion, texto, color):
+        """Igual a draw.text(posicion, texto, fill=color, font=fuente)"""
+        if not self.compatible:
+            draw.text(posicion, texto, fill=color, font=self.fuente)
+            return
+        mascara, (dx, dy) = self.mascara(texto)
+        draw.bitmap((posicion[0] + dx, posicion[1] + dy), mascara, fill=color)
+
+
+def atlas_de(atlas, fuente, **opciones):
+    """Atlas de una fuente dentro de un diccionario {id(fuente): AtlasTexto}"""
+    existente = atlas.get(id(fuente))
+    if existente is None:
+        existente = AtlasTexto(fuente, **opciones)
+        atlas[id(fuente)] = existente
+    return existente
+
+# ============================================
+# MAIN - Comparacion contra draw.text
+# ============================================
+
+if __name__ == '__main__':
+    import random
+    import time
+    from PIL import ImageChops, ImageFont
+
+    try:
+        fuente = ImageFont.truetype("/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf", 18)
+    except OSError:
+        fuente = ImageFont.load_default(18)
+
+    random.seed(5)
+    textos = (["Temp: {:.1f} C".format(random.uniform(15, 32)) for _ in range(40)]
+              + ["Humedad: {:.0f}%".format(random.uniform(20, 90)) for _ in range(40)]
+              + ["CO2: {} ppm".format(random.randint(400, 3000)) for _ in range(40)]
+              + ["Dif: {}".format(random.randint(0, 900)) for _ in range(40)])
+
+    inicio = time.perf_counter()
+    atlas = AtlasTexto(fuente)
+    creacion = time.perf_counter() - inicio
+
+    a = Image.new("RGB", (240, 40), "black")
+    b = Image.new("RGB", (240, 40), "black")
+    distintos = 0
+    for texto in textos:
+        a.paste((0, 0, 0), (0, 0, 240, 40))
+        b.paste((0, 0, 0), (0, 0, 240, 40))
+        ImageDraw.Draw(a).text((10, 5), texto, fill="cyan", font=fuente)
+        atlas.dibujar(ImageDraw.Draw(b), (10, 5), texto, "cyan")
+        if ImageChops.difference(a, b).getbbox():
+            distintos += 1
+
+    draw = ImageDraw.Draw(a)
+    n = 20
+    inicio = time.perf_counter()
+    for _ in range(n):
+        for texto in textos:
+            draw.text((10, 5), texto, fill="cyan", font=fuente)
+    directo = (time.perf_counter() - inicio) / (n * len(textos))
+
+    inicio = time.perf_counter()
+    for _ in range(n):
+        for texto in textos:
+            atlas.dibujar(draw, (10, 5), texto, "cyan")
+    cache = (time.perf_counter() - inicio) / (n * len(textos))
+
+    inicio = time.perf_counter()
+    for texto in textos:
+        atlas.componer_texto(texto)
+    armado = (time.perf_counter() - inicio) / len(textos)
+
+    inicio = time.perf_counter()
+    for _ in range(n):
+        for texto in textos:
+            draw.textbbox((0, 0), texto, font=fuente)
+    caja_directa = (time.perf_counter() - inicio) / (n * len(textos))
+
+    for texto in textos:
+        atlas.caja(texto)
+    inicio = time.perf_counter()
+    for _ in range(n):
+        for texto in textos:
+            atlas.caja(texto)
+    caja_cache = (time.perf_counter() - inicio) / (n * len(textos))
+
+    print("Composicion por glifo: {}  creacion del atlas: {:.1f} ms".format(
+        "si" if atlas.componer else "no", creacion * 1000))
+    print("Imagenes distintas a draw.text: {} de {}".format(distintos, len(textos)))
+    print("draw.text:            {:6.1f} us".format(directo * 1e6))
+    print("atlas (en cache):     {:6.1f} us".format(cache * 1e6))
+    print("atlas (armar glifos): {:6.1f} us".format(armado * 1e6))
+    print("textbbox:             {:6.1f} us   caja() en cache: {:.2f} us".format(
+        caja_directa * 1e6, caja_cache * 1e6))
@@ -0,0 +1,293 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Benchmark de Dibujo y Adquisicion - Proyecto Zenalyze
+Corre los metodos de dibujo y lectura de ambos monitores con hardware simulado
+y un display en memoria; guarda percentiles, memoria por cuadro y FPS en JSON
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+
+# Antes de importar los monitores: hardware simulado y sin escrituras a disco ni red
+os.environ['MODO_HARDWARE'] = 'simulado'
+os.environ['SUBIR_LECTURAS'] = '0'
+os.environ['GUARDAR_HISTORIAL'] = '0'
+os.environ['GUARDAR_AGREGADOS'] = '0'
+
+from PIL import Image, ImageDraw
+
+import monitor_sensores_lcd
+import testeo
+from adquisicion import RegistroTiempos
+from hardware import HardwareSimulado
+from render_mandala import RenderMandala, diferencia_con_pil, TOLERANCIA_PIXELES
+from salida_lcd import SalidaLCD
+
+# ============================================
+# CONFIGURACION
+# ============================================
+
+SEMILLA = 1234
+ITERACIONES = 500
+CALENTAMIENTO = 20
+ITERACIONES_MEMORIA = 50
+
+DIRECTORIO_RESULTADOS = 'benchmarks'
+
+# ============================================
+# PREPARACION
+# ============================================
+
+def preparar(monitor, semilla=SEMILLA):
+    """Lo minimo de inicializar() para dibujar y leer, sin hilos ni splash"""
+    monitor.hw = HardwareSimulado(semilla=semilla)
+    monitor.cargar_fuentes()
+    monitor.gpio = monitor.hw.gpio()
+    monitor.dht = monitor.hw.dht11(23)
+    monitor.ldr = monitor.hw.canal_analogico(0)
+    monitor.mq135_channel = monitor.hw.canal_analogico(2)
+    monitor.device = monitor.hw.display(24, 25)
+    monitor.salida = SalidaLCD(monitor.device)
+    return monitor
+
+
+def casos_mandala(semilla=SEMILLA):
+    """(nombre, funcion) de MandalaAvanzada"""
+    m = preparar(monitor_sensores_lcd.MandalaAvanzada(), semilla)
+    m.mostrando_splash = False
+    m.muestrear_sensores()
+    imagen = Image.new(m.device.mode, m.device.size, "black")
+    draw = ImageDraw.Draw(imagen)
+
+    def girar():
+        m.rotation = (m.rotation + 1) % 360
+
+    def mandala():
+        girar()
+        m.dibujar_mandala(draw, m.lectura)
+
+    def texto_estado():
+        m.estado_actual = "neutral"
+        m.tiempo_mostrar_estado = time.time()
+        m.dibujar_texto_estado(draw)
+
+    def cuadro():
+        girar()
+        m.dibujar_pantalla()
+
+    # Render NumPy de los mismos llamados, sobre su buffer fijo
+    m.render_mandala = m.render_mandala or RenderMandala(m.geometria)
+
+    def mandala_numpy():
+        girar()
+        m.dibujar_mandala_numpy(m.lectura)
+
+    return [
+        ("mandala.dibujar_mandala", mandala),
+        ("mandala.dibujar_mandala_numpy", mandala_numpy),
+        ("mandala.dibujar_splash", lambda: m.dibujar_splash(draw)),
+        ("mandala.dibujar_texto_estado", texto_estado),
+        ("mandala.muestrear_sensores", m.muestrear_sensores),
+        ("mandala.cuadro", cuadro),
+    ]
+
+
+def casos_paginas(semilla=SEMILLA):
+    """(nombre, funcion) de SensorLCDMonitor"""
+    s = preparar(testeo.SensorLCDMonitor(), semilla)
+    s.muestrear_sensores()
+    imagen = Image.new(s.device.mode, s.device.size, "black")
+    draw = ImageDraw.Draw(imagen)
+
+    casos = [
+        ("paginas.dibujar_pagina_1", lambda: s.dibujar_pagina_1(draw, s.lectura)),
+        ("paginas.dibujar_pagina_2", lambda: s.dibujar_pagina_2(draw, s.lectura)),
+        ("paginas.dibujar_pagina_3", lambda: s.dibujar_pagina_3(draw, s.lectura)),
+        ("paginas.muestrear_sensores", s.muestrear_sensores),
+    ]
+
+    # Cuadro completo por pagina; los sensores cambian una vez por segundo como en el monitor
+    for pagina in range(3):
+        def cuadro(pagina=pagina, contador=[0]):
+            contador[0] += 1
+            if contador[0] % 40 == 0:
+                s.muestrear_sensores()
+            s.pagina = pagina
+            s.actualizar_display()
+        casos.append(("paginas.cuadro_pagina_{}".format(pagina + 1), cuadro))
+
+    return casos
+
+def casos_salida(semilla=SEMILLA):
+    """(nombre, funcion) de SalidaLCD con cuadros que cambian poco y del todo"""
+    device = HardwareSimulado(semilla=semilla).display(24, 25)
+    salida = SalidaLCD(device)
+    parciales = []
+    for i in range(8):
+        imagen = Image.new(device.mode, device.size, "black")
+        ImageDraw.Draw(imagen).text((100 + i, 110), str(i), fill="white")
+        parciales.append(imagen)
+    completos = [Image.new(device.mode, device.size, (i * 30, 255 - i * 30, 80)) for i in range(8)]
+
+    def mostrar(cuadros, contador=[0]):
+        contador[0] += 1
+        salida.mostrar(cuadros[contador[0] % len(cuadros)])
+
+    return [
+        ("salida.mostrar_parcial", lambda: mostrar(parciales)),
+        ("salida.mostrar_completo", lambda: mostrar(completos)),
+    ]
+
+# ============================================
+# MEDICION
+# ============================================
+
+def medir(funcion, iteraciones=ITERACIONES, calentamiento=CALENTAMIENTO):
+    """Percentiles por llamada (ms) y FPS posible si fuera el cuadro entero"""
+    for _ in range(calentamiento):
+        funcion()
+
+    registro = RegistroTiempos(capacidad=iteraciones)
+    inicio_total = time.perf_counter()
+    for _ in range(iteraciones):
+        inicio = time.perf_counter()
+        funcion()
+        registro.registrar(time.perf_counter() - inicio)
+    total = time.perf_counter() - inicio_total
+
+    pct = registro.percentiles((50, 95, 99))
+    media = total / iteraciones
+    return {
+        "n": iteraciones,
+        "media_ms": media * 1000,
+        "p50_ms": pct[50],
+        "p95_ms": pct[95],
+        "p99_ms": pct[99],
+        "max_ms": max(registro.muestras) * 1000,
+        "fps_posible": 1.0 / media if media > 0 else 0.0,
+    }
+
+
+def medir_memoria(funcion, iteraciones=ITERACIONES_MEMORIA):
+    """Pico de memoria por llamada y bloques que quedan vivos (fugas o caches)"""
+    funcion()
+    tracemalloc.start()
+    picos = []
+    bloques_inicio = sys.getallocatedblocks()
+    for _ in range(iteraciones):
+        actual, _ = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        funcion()
+        _, pico = tracemalloc.get_traced_memory()
+        picos.append(pico - actual)
+    bloques_netos = (sys.getallocatedblocks() - bloques_inicio) / iteraciones
+    tracemalloc.stop()
+
+    picos.sort()
+    return {
+        "kb_pico_por_llamada": picos[len(picos) // 2] / 1024,
+        "bloques_netos_por_llamada": bloques_netos,
+    }
+
+
+def commit_actual():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                              text=True, cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except Exception:
+        return ""
+
+
+def correr(iteraciones=ITERACIONES, filtro=None):
+    """Corre todos los casos y devuelve el diccionario de resultados"""
+    resultados = {}
+    casos = casos_mandala() + casos_paginas() + casos_salida()
+    for nombre, funcion in casos:
+        if filtro and filtro not in nombre:
+            continue
+        # Los DEBUG de los monitores no cuentan en la medicion
+        with contextlib.redirect_stdout(io.StringIO()):
+            tiempos = medir(funcion, iteraciones)
+            memoria = medir_memoria(funcion)
+        tiempos.update(memoria)
+        resultados[nombre] = tiempos
+        print("{:<32} p50={:7.3f}ms p95={:7.3f}ms p99={:7.3f}ms  {:8.0f} FPS  {:7.1f} KB".format(
+            nombre, tiempos["p50_ms"], tiempos["p95_ms"], tiempos["p99_ms"],
+            tiempos["fps_posible"], tiempos["kb_pico_por_llamada"]))
+
+    # El render NumPy tiene que verse como el de PIL
+    peor, media = diferencia_con_pil(RenderMandala(monitor_sensores_lcd.GeometriaMandala()))
+    print("{}: render NumPy distinto a PIL en {:.2%} de los pixeles (peor cuadro, tolerancia {:.2%})".format(
+        "OK" if peor <= TOLERANCIA_PIXELES else "ERROR", peor, TOLERANCIA_PIXELES))
+
+    return {
+        "commit": commit_actual(),
+        "fecha": datetime.now().isoformat(timespec='seconds'),
+        "plataforma": platform.platform(),
+        "procesador": platform.processor() or platform.machine(),
+        "python": platform.python_version(),
+        "semilla": SEMILLA,
+        "iteraciones": iteraciones,
+        "casos": resultados,
+        "render_numpy_diferencia": {"peor": peor, "media": media, "tolerancia": TOLERANCIA_PIXELES},
+    }
+
+
+def comparar(anterior, actual):
+    """Imprime el cambio de p50 por caso respecto a otra corrida"""
+    print("\nComparado con {} ({}):".format(anterior.get("commit") or "?", anterior.get("fecha", "")))
+    for nombre, caso in actual["casos"].items():
+        base = anterior.get("casos", {}).get(nombre)
+        if not base or not base["p50_ms"]:
+            print("  {:<32} (nuevo)".format(nombre))
+            continue
+        cambio = (caso["p50_ms"] - base["p50_ms"]) / base["p50_ms"] * 100
+        marca = "  <-- REGRESION" if cambio > 10 else ""
+        print("  {:<32} {:7.3f}ms -> {:7.3f}ms  {:+6.1f}%{}".format(
+            nombre, base["p50_ms"], caso["p50_ms"], cambio, marca))
+
+# ============================================
+# MAIN
+# ============================================
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Benchmark de dibujo y adquisicion")
+    parser.add_argument('--iteraciones', type=int, default=ITERACIONES)
+    parser.add_argument('--filtro', help="Solo los casos cuyo nombre contiene este texto")
+    parser.add_argument('--salida', help="Archivo JSON (por defecto benchmarks/<commit>-<fecha>.json)")
+    parser.add_argument('--comparar', help="JSON de una corrida anterior")
+    args = parser.parse_args()
+
+    # Los monitores escriben en data/ relativo al directorio actual
+    directorio_origen = os.getcwd()
+    os.chdir(tempfile.mkdtemp())
+    resultados = correr(args.iteraciones, args.filtro)
+    os.chdir(directorio_origen)
+
+    salida = args.salida or os.path.join(DIRECTORIO_RESULTADOS, "{}-{}.json".format(
+        resultados["commit"] or "sin-commit", datetime.now().strftime("%Y%m%d-%H%M%S")))
+    directorio = os.path.dirname(salida)
+    if directorio and not os.path.exists(directorio):
+        os.makedirs(directorio)
+    with open(salida, 'w', encoding='utf-8') as f:
+        json.dump(resultados, f, indent=2)
+    print("\nOK: Resultados guardados en " + salida)
+
+    if args.comparar:
+        with open(args.comparar, encoding='utf-8') as f:
+            comparar(json.load(f), resultados)
+
+    # Una corrida con el render NumPy distinto a PIL no es valida
+    diferencia = resultados["render_numpy_diferencia"]
+    sys.exit(0 if diferencia["peor"] <= diferencia["tolerancia"] else 1)
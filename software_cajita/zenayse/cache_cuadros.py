@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Cache de cuadros de la Mandala - Proyecto Zenalyze
+Guarda cuadros completos ya dibujados con expulsion LRU y tope de memoria
+"""
+
+import os
+from collections import OrderedDict
+
+# ============================================
+# CONFIGURACION
+# ============================================
+
+# Tope de memoria del cache (un cuadro RGB de 240x240 ocupa ~170 KB)
+CACHE_CUADROS_MB = float(os.getenv('CACHE_CUADROS_MB', 32))
+
+# ============================================
+# CLASE CACHE
+# ============================================
+
+class CacheCuadros:
+    def __init__(self, memoria_max_mb=CACHE_CUADROS_MB):
+        self.memoria_max = int(memoria_max_mb * 1024 * 1024)
+        self.memoria = 0
+        self.cuadros = OrderedDict()
+
+        # Estadisticas
+        self.aciertos = 0
+        self.fallos = 0
+        self.expulsiones = 0
+
+    def tamano_imagen(self, imagen):
+        """Bytes que ocupa una imagen PIL"""
+        ancho, alto = imagen.size
+        return ancho * alto * len(imagen.getbands())
+
+    def obtener(self, clave):
+        """Devuelve el cuadro guardado o None"""
+        imagen = self.cuadros.get(clave)
+        if imagen is None:
+            self.fallos += 1
+            return None
+
+        self.cuadros.move_to_end(clave)
+        self.aciertos += 1
+        return imagen
+
+    def guardar(self, clave, imagen):
+        """Guarda un cuadro y expulsa los menos usados si no cabe"""
+        tamano = self.tamano_imagen(imagen)
+        if tamano > self.memoria_max:
+            return
+
+        anterior = self.cuadros.pop(clave, None)
+        if anterior is not None:
+            self.memoria -= self.tamano_imagen(anterior)
+
+        while self.cuadros and self.memoria + tamano > self.memoria_max:
+            _, expulsada = self.cuadros.popitem(last=False)
+            self.memoria -= self.tamano_imagen(expulsada)
+            self.expulsiones += 1
+
+        self.cuadros[clave] = imagen
+        self.memoria += tamano
+
+    def limpiar(self):
+        """Vacia el cache"""
+        self.cuadros.clear()
+        self.memoria = 0
+
+    def tasa_aciertos(self):
+        """Fraccion de cuadros servidos desde el cache"""
+        total = self.aciertos + self.fallos
+        return self.aciertos / total if total else 0.0
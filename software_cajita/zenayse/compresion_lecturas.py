@@ -0,0 +1,292 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Compresion de Lecturas - Proyecto Zenalyze
+Banda muerta por canal con latido maximo antes de subir, y
+codificacion delta (zigzag + varint) de lotes de filas cuantizadas
+"""
+
+import base64
+import os
+import sys
+import time
+
+# ============================================
+# CONFIGURACION
+# ============================================
+
+# Filtrar las lecturas que van a la base y al hub (el historial local guarda todas)
+COMPRIMIR_LECTURAS = os.getenv('COMPRIMIR_LECTURAS', '0') == '1'
+
+# Segundos maximos sin emitir aunque nada cambie (latido)
+MAX_SILENCIO = float(os.getenv('MAX_SILENCIO_LECTURAS', 300))
+
+# Banda muerta por canal: (absoluta, relativa al ultimo valor emitido).
+# Se emite cuando |actual - emitido| > max(absoluta, relativa * |emitido|),
+# asi reconstruir con el ultimo valor emitido nunca se aleja mas que eso
+BANDAS = {
+    'temp': (float(os.getenv('BANDA_TEMP', 0.5)), 0.0),
+    'hum': (float(os.getenv('BANDA_HUM', 2.0)), 0.0),
+    'lux': (float(os.getenv('BANDA_LUX', 10)), float(os.getenv('BANDA_LUX_RELATIVA', 0.05))),
+    'ppm_co2': (float(os.getenv('BANDA_CO2', 25)), float(os.getenv('BANDA_CO2_RELATIVA', 0.02))),
+}
+
+# Canales discretos: cualquier cambio se emite
+DISCRETOS = ('movimiento', 'nivel_ruido')
+
+# Escala a entero de cada columna de las filas del hub
+# (timestamp, secuencia, temp, hum, luz, co2, movimiento, ruido)
+ESCALAS_HUB = (1000, 1, 10, 10, 1, 1, 1, 1)
+
+DEBUG = True
+
+# ============================================
+# BANDA MUERTA
+# ============================================
+
+class CompresorLecturas:
+    """Deja pasar una LecturaSensores solo si algun canal salio de su banda o vencio el latido"""
+
+    def __init__(self, bandas=None, max_silencio=MAX_SILENCIO):
+        self.bandas = tuple((bandas or BANDAS).items())
+        self.max_silencio = max_silencio
+        self.ultima = None
+
+        # Estadisticas
+        self.recibidas = 0
+        self.emitidas = 0
+        self.latidos = 0
+        self.por_canal = dict.fromkeys([canal for canal, _ in self.bandas] + list(DISCRETOS), 0)
+
+    def canal_cambiado(self, lectura):
+        """Primer canal fuera de su banda respecto a la ultima emitida (None si ninguno)"""
+        ultima = self.ultima
+        for canal in DISCRETOS:
+            if getattr(lectura, canal) != getattr(ultima, canal):
+                return canal
+        for canal, (absoluta, relativa) in self.bandas:
+            emitido = getattr(ultima, canal)
+            if abs(getattr(lectura, canal) - emitido) > max(absoluta, relativa * abs(emitido)):
+                return canal
+        return None
+
+    def filtrar(self, lectura):
+        """La lectura si hay que emitirla, None si la ultima emitida todavia la representa"""
+        self.recibidas += 1
+        if self.ultima is not None:
+            canal = self.canal_cambiado(lectura)
+            if canal is not None:
+                self.por_canal[canal] += 1
+            elif lectura.timestamp - self.ultima.timestamp >= self.max_silencio:
+                self.latidos += 1
+            else:
+                return None
+        self.ultima = lectura
+        self.emitidas += 1
+        return lectura
+
+    def cota(self, canal, emitido):
+        """Error maximo de reconstruccion de un canal dado el valor emitido"""
+        absoluta, relativa = dict(self.bandas)[canal]
+        return max(absoluta, relativa * abs(emitido))
+
+    def razon(self):
+        return self.recibidas / self.emitidas if self.emitidas else 0.0
+
+    def resumen(self):
+        return "{}/{} lecturas emitidas (x{:.1f}), {} latidos, cambios {}".format(
+            self.emitidas, self.recibidas, self.razon(), self.latidos, self.por_canal)
+
+# ============================================
+# CODIFICACION DELTA
+# ============================================
+
+def codificar_filas(filas, escalas):
+    """Filas numericas a bytes: cada columna se escala a entero y se guarda la
+    diferencia con la fila anterior en zigzag + varint (error <= 0.5 / escala)"""
+    salida = bytearray()
+    _varint(salida, len(filas))
+    _varint(salida, len(escalas))
+    anterior = [0] * len(escalas)
+    for fila in filas:
+        for i, escala in enumerate(escalas):
+            entero = round(fila[i] * escala)
+            delta = entero - anterior[i]
+            anterior[i] = entero
+            _varint(salida, (delta << 1) ^ (delta >> 63))
+    return bytes(salida)
+
+def decodificar_filas(datos, escalas):
+    """Inverso de codificar_filas; ValueError si los bytes no cierran"""
+    try:
+        n, pos = _leer_varint(datos, 0)
+        ancho, pos = _leer_varint(datos, pos)
+        if ancho != len(escalas):
+            raise ValueError("ancho {} != {}".format(ancho, len(escalas)))
+        filas = []
+        anterior = [0] * ancho
+        for _ in range(n):
+            fila = []
+            for i, escala in enumerate(escalas):
+                zz, pos = _leer_varint(datos, pos)
+                anterior[i] += (zz >> 1) ^ -(zz & 1)
+                fila.append(anterior[i] / escala if escala != 1 else anterior[i])
+            filas.append(fila)
+    except IndexError:
+        raise ValueError("bloque truncado")
+    if pos != len(datos):
+        raise ValueError("bytes de sobra")
+    return filas
+
+def codificar_filas_texto(filas, escalas):
+    """codificar_filas en base64 para viajar dentro de JSON"""
+    return base64.b64encode(codificar_filas(filas, escalas)).decode("ascii")
+
+def decodificar_filas_texto(texto, escalas):
+    try:
+        datos = base64.b64decode(texto, validate=True)
+    except (TypeError, ValueError) as e:
+        raise ValueError("base64 invalido - " + str(e))
+    return decodificar_filas(datos, escalas)
+
+def _varint(salida, n):
+    while n > 0x7f:
+        salida.append((n & 0x7f) | 0x80)
+        n >>= 7
+    salida.append(n)
+
+def _leer_varint(datos, pos):
+    n = 0
+    desplazamiento = 0
+    while True:
+        byte = datos[pos]
+        pos += 1
+        n |= (byte & 0x7f) << desplazamiento
+        if byte < 0x80:
+            return n, pos
+        desplazamiento += 7
+        if desplazamiento > 70:
+            raise ValueError("varint demasiado largo")
+
+# ============================================
+# REPRODUCCION DE DATOS
+# ============================================
+
+def lecturas_historial(ruta, limite):
+    """Las ultimas lecturas del historial en disco como LecturaSensores"""
+    from adquisicion import LecturaSensores
+    from almacen_lecturas import AlmacenLecturas
+    from microfono import clasificar_ruido
+    almacen = AlmacenLecturas(ruta, solo_lectura=True)
+    try:
+        registros = almacen.ultimos(limite)
+        # El historial guarda el RMS del microfono; el nivel sale de los umbrales fijos
+        lecturas = [LecturaSensores(temp=float(r['temp']), hum=float(r['hum']), ppm_co2=float(r['ppm']),
+                                    lux=float(r['lux']), nivel_ruido=clasificar_ruido(float(r['mic']), 300, 800, 1500),
+                                    movimiento=bool(r['movimiento']), timestamp=float(r['timestamp']),
+                                    voltaje_ldr=0.0, calidad_aire="", valor_mic=0,
+                                    diferencia_mic=float(r['mic']), co2=False)
+                    for r in registros]
+    finally:
+        almacen.cerrar()
+    return lecturas
+
+def lecturas_simuladas(n, intervalo=0.3):
+    """Un dia tranquilo: caminatas lentas con ruido de sensor, luz que sube y baja, PIR esporadico"""
+    import math
+    import random
+    from adquisicion import LecturaSensores
+    random.seed(7)
+    temp, hum, ppm = 21.0, 48.0, 450.0
+    movimiento = False
+    lecturas = []
+    inicio = time.time() - n * intervalo
+    for i in range(n):
+        t = inicio + i * intervalo
+        temp += random.gauss(0, 0.01)
+        hum += random.gauss(0, 0.03)
+        ppm = min(max(ppm + random.gauss(0, 0.8) + (0.05 if movimiento else -0.02), 380), 2000)
+        lux = max(0.0, 400 * math.sin(i * intervalo / 86400 * 2 * math.pi)) + random.gauss(0, 1.5)
+        if random.random() < (0.02 if movimiento else 0.0005):
+            movimiento = not movimiento
+        ruido = "bajo" if movimiento and random.random() < 0.3 else "silencio"
+        lecturas.append(LecturaSensores(temp=round(temp), hum=round(hum), ppm_co2=int(ppm), lux=int(lux),
+                                        nivel_ruido=ruido, movimiento=movimiento, timestamp=t,
+                                        voltaje_ldr=0.0, calidad_aire="", valor_mic=0,
+                                        diferencia_mic=0.0, co2=False))
+    return lecturas
+
+# ============================================
+# MAIN (prueba de compresion)
+# ============================================
+
+if __name__ == '__main__':
+    import json
+
+    ruta = None
+    n = 288000  # Un dia a 0.3 s
+    args = sys.argv[1:]
+    if '--historial' in args:
+        ruta = args[args.index('--historial') + 1]
+    if '--lecturas' in args:
+        n = int(args[args.index('--lecturas') + 1])
+
+    lecturas = lecturas_historial(ruta, n) if ruta else lecturas_simuladas(n)
+    if not lecturas:
+        print("ERROR: No hay lecturas para reproducir")
+        sys.exit(1)
+    print("INFO: {} lecturas de {}".format(len(lecturas), ruta or "simulacion"))
+
+    compresor = CompresorLecturas()
+    inicio = time.perf_counter()
+    emitidas = [lectura for lectura in lecturas if compresor.filtrar(lectura)]
+    por_lectura = (time.perf_counter() - inicio) / len(lecturas)
+    print("OK: " + compresor.resumen())
+    print("INFO: {:.2f} us por lectura en el filtro".format(por_lectura * 1e6))
+
+    # Reconstruccion por retencion: cada lectura se representa con la ultima emitida
+    def fila_hub(lectura, secuencia):
+        return (lectura.timestamp, secuencia, lectura.temp, lectura.hum, lectura.lux,
+                lectura.ppm_co2, lectura.movimiento, lectura.nivel_ruido != "silencio")
+
+    filas = [fila_hub(lectura, i + 1) for i, lectura in enumerate(emitidas)]
+    datos = codificar_filas(filas, ESCALAS_HUB)
+    recibidas = decodificar_filas(datos, ESCALAS_HUB)
+    columnas = {'temp': 2, 'hum': 3, 'lux': 4, 'ppm_co2': 5}
+
+    errores = dict.fromkeys(columnas, 0.0)
+    excedidas = dict.fromkeys(columnas, 0)
+    discretos_mal = 0
+    j = -1
+    for lectura in lecturas:
+        while j + 1 < len(emitidas) and emitidas[j + 1].timestamp <= lectura.timestamp:
+            j += 1
+        emitida, fila = emitidas[j], recibidas[j]
+        for canal, columna in columnas.items():
+            error = abs(getattr(lectura, canal) - fila[columna])
+            errores[canal] = max(errores[canal], error)
+            # Banda muerta mas la mitad del paso de cuantizacion
+            if error > compresor.cota(canal, getattr(emitida, canal)) + 0.5 / ESCALAS_HUB[columna] + 1e-9:
+                excedidas[canal] += 1
+        if bool(fila[6]) != lectura.movimiento or bool(fila[7]) != (lectura.nivel_ruido != "silencio"):
+            discretos_mal += 1
+
+    for canal in columnas:
+        absoluta, relativa = dict(compresor.bandas)[canal]
+        print("INFO: {:8s} error maximo {:7.3f} (banda {} / {:.0%}) fuera de cota: {}".format(
+            canal, errores[canal], absoluta, relativa, excedidas[canal]))
+    print("INFO: Canales discretos distintos: {}".format(discretos_mal))
+
+    crudo = len(lecturas) * 32  # Registro del historial
+    todas_json = len(json.dumps([list(fila_hub(l, i)) for i, l in enumerate(lecturas)],
+                                separators=(",", ":")))
+    emitidas_json = len(json.dumps([list(f) for f in filas], separators=(",", ":")))
+    print("INFO: Registros de 32 B: {:,} B".format(crudo))
+    print("INFO: JSON de todas:     {:,} B".format(todas_json))
+    print("INFO: JSON de emitidas:  {:,} B (x{:.1f})".format(emitidas_json, todas_json / emitidas_json))
+    print("INFO: Delta emitidas:    {:,} B (x{:.1f} contra JSON, {:.1f} B por fila)".format(
+        len(datos), todas_json / len(datos), len(datos) / max(len(filas), 1)))
+
+    ok = not any(excedidas.values()) and not discretos_mal
+    print(("OK: " if ok else "ERROR: ") + "Error de reconstruccion dentro de la cota")
+    sys.exit(0 if ok else 1)
@@ -0,0 +1,236 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Demonio de Sensores - Proyecto Zenalyze
+Unico proceso que abre el GPIO, el DHT11 y el ADS1115; publica la ultima
+lectura, el historial y los flancos de botones y PIR en memoria compartida
+para que los monitores (FUENTE_SENSORES=demonio) corran a la vez
+"""
+
+import os
+import signal
+import sys
+import threading
+import time
+from dotenv import load_dotenv
+
+# Cargar configuracion antes de los modulos que leen variables de entorno
+load_dotenv()
+
+from adquisicion import LecturaSensores, RegistroTiempos, voltaje_a_ppm, clasificar_calidad
+from entradas import EntradaGPIO
+from hardware import crear_hardware, MODO_HARDWARE, CANAL_LDR, CANAL_MIC, CANAL_MQ135
+from memoria_sensores import MemoriaSensores
+from microfono import (MuestreadorMicrofono, LineaBaseMicrofono, clasificar_ruido,
+                       TASA_ADS1115, UMBRALES_ADAPTATIVOS)
+
+# ============================================
+# CONFIGURACION
+# ============================================
+
+# GPIO (los mismos pines que usan los monitores)
+PIN_DHT11 = int(os.getenv('PIN_DHT11', 23))
+PIN_MQ135 = int(os.getenv('PIN_MQ135', 26))
+PIN_PIR = int(os.getenv('PIN_PIR', 14))
+PIN_BTN1 = int(os.getenv('PIN_BTN1', 16))
+PIN_BTN2 = int(os.getenv('PIN_BTN2', 20))
+PIN_BTN3 = int(os.getenv('PIN_BTN3', 21))
+
+# Segundos entre lecturas publicadas
+INTERVALO_DEMONIO = float(os.getenv('INTERVALO_DEMONIO', 1.0))
+
+# Umbrales fijos del microfono (RMS)
+UMBRALES_RUIDO = (300, 800, 1500)
+
+DEBUG = True
+
+# ============================================
+# CLASE DEMONIO
+# ============================================
+
+class DemonioSensores:
+    def __init__(self, memoria=None, intervalo=INTERVALO_DEMONIO):
+        self.hw = crear_hardware()
+        self.memoria = memoria or MemoriaSensores()
+        self.intervalo = intervalo
+        self.gpio = None
+        self.entradas = None
+        self.dht = None
+        self.ldr = None
+        self.mq135_channel = None
+        self.mic = None
+        self.muestreador = None
+        self.linea_base_mic = None
+        self.lock_ads = threading.Lock()  # El ADS1115 lo comparten dos hilos
+        self.detener_evento = threading.Event()
+
+        # Ultimos valores validos (un fallo del sensor repite el anterior)
+        self.temp = 22.0
+        self.hum = 50.0
+        self.lux = 300
+        self.voltaje_ldr = 0.0
+        self.ppm_co2 = 400
+        self.calidad_aire = "normal"
+        self.co2 = False
+        self.movimiento = False
+        self.nivel_ruido = "silencio"
+        self.valor_mic = 0
+        self.diferencia_mic = 0.0
+
+        # Estadisticas
+        self.publicadas = 0
+        self.errores = {"dht11": 0, "ldr": 0, "mq135": 0}
+        self.tiempos = RegistroTiempos()
+
+    def inicializar(self):
+        """Abre el GPIO, el DHT11, el ADS1115 y el microfono"""
+        print("CONFIG: Inicializando sensores...\n")
+        GPIO = self.gpio = self.hw.gpio()
+        GPIO.setwarnings(False)
+        GPIO.setmode(GPIO.BCM)
+        GPIO.setup(PIN_MQ135, GPIO.IN)
+        GPIO.setup(PIN_PIR, GPIO.IN)
+        botones = [PIN_BTN1, PIN_BTN2, PIN_BTN3]
+        for pin in botones:
+            GPIO.setup(pin, GPIO.IN, pull_up_down=GPIO.PUD_UP)
+
+        # Los flancos van directo a la memoria compartida (cada monitor decide que hacer)
+        self.movimiento = bool(GPIO.input(PIN_PIR))
+        self.entradas = EntradaGPIO(GPIO, al_evento=self.al_evento)
+        for pin in botones:
+            self.entradas.agregar_boton(pin)
+        self.entradas.agregar_sensor(PIN_PIR)
+        self.hw.iniciar_actividad(PIN_PIR, botones)
+        print("OK: GPIO, botones y PIR")
+
+        try:
+            self.dht = self.hw.dht11(PIN_DHT11)
+            print("OK: DHT11")
+        except Exception as e:
+            print("ERROR: DHT11 - " + str(e))
+
+        try:
+            self.ldr = self.hw.canal_analogico(CANAL_LDR)
+            self.mq135_channel = self.hw.canal_analogico(CANAL_MQ135)
+            self.mic = self.hw.canal_analogico(CANAL_MIC)
+            self.hw.configurar_tasa_adc(TASA_ADS1115)
+            print("OK: ADS1115 (LDR, MQ-135 y microfono)")
+        except Exception as e:
+            print("ERROR: ADS1115 - " + str(e))
+
+        if self.mic:
+            self.linea_base_mic = LineaBaseMicrofono.cargar()
+            self.muestreador = MuestreadorMicrofono(self.mic, self.linea_base_mic, self.lock_ads)
+            self.muestreador.start()
+
+    def al_evento(self, evento):
+        """Callback del GPIO: el PIR tambien cambia la proxima lectura"""
+        if evento.pin == PIN_PIR:
+            self.movimiento = evento.valor
+        self.memoria.evento(evento)
+
+    def umbrales_ruido(self):
+        if UMBRALES_ADAPTATIVOS and self.linea_base_mic:
+            return self.linea_base_mic.umbrales(UMBRALES_RUIDO)
+        return UMBRALES_RUIDO
+
+    def muestrear(self):
+        """Lee todos los sensores y devuelve la LecturaSensores"""
+        if self.dht:
+            try:
+                temp, hum = self.dht.temperature, self.dht.humidity
+                if temp is not None and hum is not None:
+                    self.temp, self.hum = temp, hum
+            except Exception:
+                self.errores["dht11"] += 1
+
+        self.co2 = bool(self.gpio.input(PIN_MQ135))
+
+        if self.ldr:
+            try:
+                with self.lock_ads:
+                    voltaje = self.ldr.voltage
+                if voltaje > 0:
+                    self.voltaje_ldr = voltaje
+                    self.lux = int((voltaje / 3.3) * 1000)
+            except Exception:
+                self.errores["ldr"] += 1
+
+        if self.mq135_channel:
+            try:
+                with self.lock_ads:
+                    voltaje = self.mq135_channel.voltage
+                if voltaje > 0:
+                    self.ppm_co2 = voltaje_a_ppm(voltaje)
+                    self.calidad_aire = clasificar_calidad(self.ppm_co2)
+            except Exception:
+                self.errores["mq135"] += 1
+
+        if self.muestreador:
+            estadisticas = self.muestreador.estadisticas
+            if estadisticas.muestras:
+                self.valor_mic = estadisticas.valor
+                self.diferencia_mic = estadisticas.rms
+                self.nivel_ruido = clasificar_ruido(estadisticas.rms, *self.umbrales_ruido())
+
+        return LecturaSensores(temp=self.temp, hum=self.hum, ppm_co2=self.ppm_co2, lux=self.lux,
+                               nivel_ruido=self.nivel_ruido, movimiento=self.movimiento,
+                               timestamp=time.time(), voltaje_ldr=self.voltaje_ldr,
+                               calidad_aire=self.calidad_aire, valor_mic=self.valor_mic,
+                               diferencia_mic=self.diferencia_mic, co2=self.co2)
+
+    def ejecutar(self, duracion=None):
+        """Publica una lectura cada intervalo (duracion en segundos, None = hasta detener)"""
+        try:
+            # Dentro del try: si falla el GPIO o el I2C tambien se libera todo
+            self.inicializar()
+            print("\nOK: Demonio de sensores publicando cada {:.1f} s (Ctrl+C para salir)\n".format(self.intervalo))
+            fin = time.monotonic() + duracion if duracion else None
+            siguiente = time.monotonic()
+            while not self.detener_evento.is_set() and (fin is None or time.monotonic() < fin):
+                inicio = time.perf_counter()
+                self.memoria.publicar(self.muestrear())
+                self.publicadas += 1
+                self.tiempos.registrar(time.perf_counter() - inicio)
+
+                siguiente = max(siguiente + self.intervalo, time.monotonic())
+                self.detener_evento.wait(siguiente - time.monotonic())
+        except KeyboardInterrupt:
+            print("\nINFO: Demonio detenido por usuario")
+        finally:
+            print("INFO: Limpiando recursos...")
+            if self.muestreador:
+                self.muestreador.detener()
+                self.linea_base_mic.guardar()
+            if self.entradas:
+                self.entradas.limpiar()
+            if self.dht:
+                self.dht.exit()
+            if self.gpio:
+                self.gpio.cleanup()
+            self.memoria.cerrar()
+            print("INFO: {} lecturas publicadas, errores {}".format(self.publicadas, self.errores))
+            print("INFO: Tiempo por lectura: " + self.tiempos.resumen())
+            print("OK: Finalizado")
+
+    def detener(self):
+        self.detener_evento.set()
+
+# ============================================
+# MAIN
+# ============================================
+
+if __name__ == '__main__':
+    if MODO_HARDWARE != 'simulado' and not os.path.exists('.env'):
+        print("ERROR: Archivo .env no encontrado")
+        sys.exit(1)
+
+    try:
+        demonio = DemonioSensores()
+    except RuntimeError as e:
+        print("ERROR: " + str(e))
+        sys.exit(1)
+
+    # systemd detiene con SIGTERM: salir igual que con Ctrl+C para borrar el segmento
+    signal.signal(signal.SIGTERM, lambda senal, cuadro: demonio.detener())
+    demonio.ejecutar()
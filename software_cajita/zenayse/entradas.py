@@ -0,0 +1,265 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Entradas por Interrupcion - Proyecto Zenalyze
+Botones y PIR por deteccion de flancos del GPIO, con anti-rebote por pin
+y una cola que el loop principal vacia sin bloquear
+"""
+
+import os
+import queue
+import random
+import threading
+import time
+from collections import namedtuple
+
+# ============================================
+# CONFIGURACION
+# ============================================
+
+# Anti-rebote por pin (segundos)
+ANTIRREBOTE_BOTON = float(os.getenv('ANTIRREBOTE_BOTON', 0.2))
+ANTIRREBOTE_PIR = 0.0
+
+# Eventos pendientes maximos (si el loop se traba no crece sin limite)
+CAPACIDAD_COLA = 64
+
+DEBUG = True
+
+# ============================================
+# EVENTOS
+# ============================================
+
+# pin: GPIO BCM, valor: True = activo (boton presionado / PIR con movimiento)
+EventoEntrada = namedtuple('EventoEntrada', ['pin', 'valor', 'timestamp'])
+
+# ============================================
+# CLASE ENTRADAS
+# ============================================
+
+class EntradaGPIO:
+    def __init__(self, gpio, capacidad=CAPACIDAD_COLA, al_evento=None, al_encolar=None):
+        self.gpio = gpio
+        self.al_evento = al_evento  # Si se da, recibe cada evento en lugar de la cola
+        self.al_encolar = al_encolar  # Si se da, se llama despues de encolar (despierta al loop)
+        self.cola = queue.Queue(maxsize=capacidad)
+        self.pines = {}           # pin -> (activo_en_bajo, antirrebote)
+        self.ultimo_evento = {}   # pin -> timestamp del ultimo evento aceptado
+        self.descartados = 0
+
+    def agregar_boton(self, pin, antirrebote=ANTIRREBOTE_BOTON):
+        """Boton con pull-up: evento al presionar (flanco de bajada)"""
+        self.pines[pin] = (True, antirrebote)
+        self.gpio.add_event_detect(pin, self.gpio.FALLING, callback=self._flanco,
+                                   bouncetime=max(1, int(antirrebote * 1000)))
+
+    def agregar_sensor(self, pin, antirrebote=ANTIRREBOTE_PIR):
+        """Sensor digital activo en alto (PIR): evento en ambos flancos"""
+        self.pines[pin] = (False, antirrebote)
+        self.gpio.add_event_detect(pin, self.gpio.BOTH, callback=self._flanco)
+
+    def _flanco(self, pin):
+        """Callback del GPIO (corre en el hilo de eventos del GPIO)"""
+        ahora = time.perf_counter()
+        activo_en_bajo, antirrebote = self.pines[pin]
+
+        # Anti-rebote independiente por pin: un boton no bloquea a otro
+        if ahora - self.ultimo_evento.get(pin, -1e9) < antirrebote:
+            return
+        self.ultimo_evento[pin] = ahora
+
+        if activo_en_bajo:
+            valor = True  # Solo se detecta el flanco de bajada: presionado
+        else:
+            valor = bool(self.gpio.input(pin))
+
+        evento = EventoEntrada(pin, valor, ahora)
+        if self.al_evento:
+            self.al_evento(evento)
+            return
+        try:
+            self.cola.put_nowait(evento)
+        except queue.Full:
+            self.descartados += 1
+        if self.al_encolar:
+            self.al_encolar()
+
+    def leer_eventos(self):
+        """Devuelve los eventos pendientes sin bloquear"""
+        eventos = []
+        while True:
+            try:
+                eventos.append(self.cola.get_nowait())
+            except queue.Empty:
+                return eventos
+
+    def limpiar(self):
+        """Quita la deteccion de flancos"""
+        for pin in self.pines:
+            try:
+                self.gpio.remove_event_detect(pin)
+            except Exception:
+                pass
+
+# ============================================
+# GPIO SIMULADO
+# ============================================
+
+class GPIOSimulado:
+    """Imita la API de RPi.GPIO para correr sin Raspberry Pi"""
+
+    BCM = 11
+    BOARD = 10
+    IN = 1
+    OUT = 0
+    HIGH = 1
+    LOW = 0
+    PUD_OFF = 20
+    PUD_DOWN = 21
+    PUD_UP = 22
+    RISING = 31
+    FALLING = 32
+    BOTH = 33
+
+    def __init__(self, detener=None):
+        self.niveles = {}
+        self.detectores = {}  # pin -> [flanco, callbacks, bouncetime, ultimo]
+        self.lock = threading.Lock()
+        self.pendientes = queue.Queue()
+        self.hilo = None
+        self.detener = detener  # Event de los hilos que mueven los pines simulados
+
+    def setwarnings(self, activo):
+        pass
+
+    def setmode(self, modo):
+        pass
+
+    def setup(self, pin, modo, pull_up_down=None, initial=None):
+        """Configura el pin; con pull-up arranca en alto"""
+        with self.lock:
+            if initial is not None:
+                self.niveles[pin] = initial
+            else:
+                self.niveles[pin] = self.HIGH if pull_up_down == self.PUD_UP else self.LOW
+
+    def input(self, pin):
+        return self.niveles.get(pin, self.LOW)
+
+    def output(self, pin, valor):
+        self.cambiar(pin, valor)
+
+    def add_event_detect(self, pin, flanco, callback=None, bouncetime=None):
+        with self.lock:
+            callbacks = [callback] if callback else []
+            self.detectores[pin] = [flanco, callbacks, (bouncetime or 0) / 1000.0, -1e9]
+        if self.hilo is None:
+            self.hilo = threading.Thread(target=self._despachar, name="gpio-sim", daemon=True)
+            self.hilo.start()
+
+    def add_event_callback(self, pin, callback):
+        with self.lock:
+            self.detectores[pin][1].append(callback)
+
+    def remove_event_detect(self, pin):
+        with self.lock:
+            self.detectores.pop(pin, None)
+
+    def cleanup(self, pin=None):
+        with self.lock:
+            if pin is None:
+                self.detectores.clear()
+            else:
+                self.detectores.pop(pin, None)
+        if pin is None:
+            # Limpieza completa: paran la actividad simulada y el hilo de callbacks
+            if self.detener is not None:
+                self.detener.set()
+            if self.hilo is not None:
+                self.pendientes.put(None)
+                self.hilo = None
+
+    def cambiar(self, pin, valor):
+        """Cambia el nivel de un pin y dispara los callbacks del flanco"""
+        valor = self.HIGH if valor else self.LOW
+        with self.lock:
+            anterior = self.niveles.get(pin, self.LOW)
+            self.niveles[pin] = valor
+            detector = self.detectores.get(pin)
+            if detector is None or anterior == valor:
+                return
+
+            flanco, callbacks, bouncetime, ultimo = detector
+            if flanco == self.RISING and valor != self.HIGH:
+                return
+            if flanco == self.FALLING and valor != self.LOW:
+                return
+
+            ahora = time.perf_counter()
+            if ahora - ultimo < bouncetime:
+                return
+            detector[3] = ahora
+
+        # Como RPi.GPIO, los callbacks corren en un hilo aparte
+        for callback in list(callbacks):
+            self.pendientes.put((callback, pin))
+
+    def presionar(self, pin, duracion=0.05):
+        """Simula presionar y soltar un boton con pull-up"""
+        self.cambiar(pin, self.LOW)
+        time.sleep(duracion)
+        self.cambiar(pin, self.HIGH)
+
+    def _despachar(self):
+        while True:
+            pendiente = self.pendientes.get()
+            if pendiente is None:
+                return
+            callback, pin = pendiente
+            try:
+                callback(pin)
+            except Exception as e:
+                if DEBUG:
+                    print("DEBUG: Error en callback GPIO simulado - " + str(e))
+
+# ============================================
+# MAIN - Latencia de entrada con GPIO simulado
+# ============================================
+
+if __name__ == '__main__':
+    gpio = GPIOSimulado()
+    gpio.setmode(gpio.BCM)
+    pines = [16, 20, 21]
+    for pin in pines:
+        gpio.setup(pin, gpio.IN, pull_up_down=gpio.PUD_UP)
+
+    entradas = EntradaGPIO(gpio)
+    for pin in pines:
+        entradas.agregar_boton(pin)
+
+    presiones = 120
+    tiempos_presion = []
+
+    def pulsar():
+        for i in range(presiones):
+            # Botones distintos a ~70-120 ms (el anti-rebote global de 0.3 s perdia estas)
+            time.sleep(random.uniform(0.07, 0.12))
+            pin = pines[i % len(pines)]
+            tiempos_presion.append(time.perf_counter())
+            gpio.presionar(pin, duracion=0.005)
+
+    hilo = threading.Thread(target=pulsar)
+    hilo.start()
+
+    # Loop a 40 FPS que solo vacia la cola
+    latencias = []
+    while hilo.is_alive() or not entradas.cola.empty():
+        for evento in entradas.leer_eventos():
+            latencias.append(time.perf_counter() - tiempos_presion[len(latencias)])
+        time.sleep(0.025)
+
+    latencias.sort()
+    n = len(latencias)
+    print("Presiones: {}  Eventos: {}  Descartados: {}".format(presiones, n, entradas.descartados))
+    print("Latencia presion -> loop: p50={:.1f}ms p95={:.1f}ms max={:.1f}ms".format(
+        latencias[n // 2] * 1000, latencias[int(n * 0.95)] * 1000, latencias[-1] * 1000))
@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Geometria precalculada de la Mandala - Proyecto Zenalyze
+Tablas de vertices por rotacion para no llamar a cos/sin en cada cuadro
+"""
+
+import math
+import time
+
+# ============================================
+# CONFIGURACION
+# ============================================
+
+ANCHO = 240
+ALTO = 240
+
+TRIANGULOS = 6
+PETALOS = 12
+ANILLOS_MIN = 3
+ANILLOS_MAX = 8
+
+# Los triangulos se repiten cada 60 grados y los petalos cada 30,
+# asi que la mandala completa solo tiene 60 rotaciones distintas
+SIMETRIA = 60
+
+# Colores fijos de la mandala (RGB, PIL no tiene que parsear strings)
+COLOR_MORADO = (0xA8, 0x55, 0xF7)     # Triangulos
+COLOR_AZUL_ANILLO = (0x60, 0xA5, 0xFA)  # Anillos de humedad
+COLOR_AIRE_BUENO = (0x10, 0xB9, 0x81)   # Verde
+COLOR_AIRE_REGULAR = (0xF5, 0x9E, 0x0B)  # Amarillo
+COLOR_AIRE_MALO = (0xEF, 0x44, 0x44)    # Rojo
+COLOR_LUZ_ALTA = (0xFD, 0xE0, 0x47)     # Amarillo
+COLOR_LUZ_BAJA = (0x3B, 0x82, 0xF6)     # Azul
+COLOR_BLANCO = (255, 255, 255)
+
+# ============================================
+# CLASE GEOMETRIA
+# ============================================
+
+class GeometriaMandala:
+    def __init__(self, ancho=ANCHO, alto=ALTO):
+        self.cx = ancho // 2
+        self.cy = alto // 2
+        self.maxR = min(ancho, alto) // 2 - 20
+
+        # Cajas de los circulos fijos
+        self.caja_exterior = self._caja(int(self.maxR * 0.90))
+        self.caja_central = self._caja(int(self.maxR * 0.20))
+        self.caja_punto = self._caja(3)
+        self.caja_luz = self._caja(int(self.maxR * 0.08))
+
+        # Anillos de humedad por cantidad de anillos
+        self.anillos = {}
+        for rings in range(ANILLOS_MIN, ANILLOS_MAX + 1):
+            self.anillos[rings] = tuple(
+                self._caja(int(self.maxR * (0.3 + (i / rings) * 0.25)))
+                for i in range(1, rings + 1)
+            )
+
+        # Vertices por rotacion entera (0 a SIMETRIA-1)
+        self.triangulos = [self._calcular_triangulos(rot) for rot in range(SIMETRIA)]
+        self.petalos = [self._calcular_petalos(rot) for rot in range(SIMETRIA)]
+
+    def _caja(self, radio):
+        """Caja delimitadora de un circulo centrado"""
+        return ((self.cx - radio, self.cy - radio),
+                (self.cx + radio, self.cy + radio))
+
+    def _calcular_triangulos(self, rotation):
+        """Poligonos de los triangulos para una rotacion"""
+        cx, cy, maxR = self.cx, self.cy, self.maxR
+        r1 = maxR * 0.75
+        r2 = maxR * 0.85
+        poligonos = []
+        for i in range(TRIANGULOS):
+            angle = (i / TRIANGULOS) * math.pi * 2 + (rotation * math.pi / 180)
+
+            x1 = cx + math.cos(angle) * r1
+            y1 = cy + math.sin(angle) * r1
+            x2 = cx + math.cos(angle + 0.35) * r2
+            y2 = cy + math.sin(angle + 0.35) * r2
+            x3 = cx + math.cos(angle + 0.70) * r1
+            y3 = cy + math.sin(angle + 0.70) * r1
+
+            poligonos.append(((int(x1), int(y1)), (int(x2), int(y2)), (int(x3), int(y3))))
+        return tuple(poligonos)
+
+    def _calcular_petalos(self, rotation):
+        """Segmentos de los petalos para una rotacion"""
+        cx, cy = self.cx, self.cy
+        petal_len = self.maxR * 0.70
+        lineas = []
+        for i in range(PETALOS):
+            angle = (i / PETALOS) * math.pi * 2 + (rotation * math.pi / 180)
+
+            x1 = cx + math.cos(angle) * petal_len
+            y1 = cy + math.sin(angle) * petal_len
+            x2 = cx + math.cos(angle) * (petal_len * 0.3)
+            y2 = cy + math.sin(angle) * (petal_len * 0.3)
+
+            lineas.append(((int(x2), int(y2)), (int(x1), int(y1))))
+        return tuple(lineas)
+
+    def cantidad_anillos(self, hum):
+        """Numero de anillos segun la humedad"""
+        return max(ANILLOS_MIN, min(ANILLOS_MAX, int(hum / 15)))
+
+
+def color_aire(ppm_co2):
+    """Color de los petalos segun PPM CO2"""
+    if ppm_co2 < 600:
+        return COLOR_AIRE_BUENO
+    elif ppm_co2 < 1000:
+        return COLOR_AIRE_REGULAR
+    else:
+        return COLOR_AIRE_MALO
+
+
+def color_luz(lux):
+    """Color del circulo interno segun la luz"""
+    if lux > 200:
+        return COLOR_LUZ_ALTA
+    else:
+        return COLOR_LUZ_BAJA
+
+# ============================================
+# MAIN - Comparacion de tiempos
+# ============================================
+
+if __name__ == '__main__':
+    cuadros = 4000
+
+    inicio = time.perf_counter()
+    geometria = GeometriaMandala()
+    tiempo_tablas = time.perf_counter() - inicio
+
+    # Antes: trigonometria y strings hex en cada cuadro
+    inicio = time.perf_counter()
+    for cuadro in range(cuadros):
+        rot = cuadro % 360
+        geometria._calcular_triangulos(rot)
+        geometria._calcular_petalos(rot)
+        "#{:02x}{:02x}{:02x}".format(150, 220, 100)
+        "#{:02x}{:02x}{:02x}".format(100, 220, 180)
+        maxR = geometria.maxR
+        rings = geometria.cantidad_anillos(55.0)
+        for i in range(1, rings + 1):
+            int(maxR * (0.3 + (i / rings) * 0.25))
+    antes = (time.perf_counter() - inicio) / cuadros
+
+    # Despues: solo busqueda en tablas
+    inicio = time.perf_counter()
+    for cuadro in range(cuadros):
+        rot = cuadro % SIMETRIA
+        geometria.triangulos[rot]
+        geometria.petalos[rot]
+        geometria.anillos[geometria.cantidad_anillos(55.0)]
+    despues = (time.perf_counter() - inicio) / cuadros
+
+    print("Tablas construidas en {:.1f} ms".format(tiempo_tablas * 1000))
+    print("Geometria por cuadro antes:   {:.1f} us".format(antes * 1e6))
+    print("Geometria por cuadro despues: {:.1f} us".format(despues * 1e6))
+    print("Mejora: {:.0f}x".format(antes / despues))
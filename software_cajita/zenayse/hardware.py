@@ -0,0 +1,211 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Capa de Hardware - Proyecto Zenalyze
+Backend real (importa RPi.GPIO, board, adafruit y luma solo al usarlos) y
+backend simulado para correr los monitores sin Raspberry Pi
+"""
+
+import os
+import random
+import threading
+import time
+
+from entradas import GPIOSimulado
+from microfono import FuenteADCSimulada
+
+# ============================================
+# CONFIGURACION
+# ============================================
+
+# 'real' = Raspberry Pi, 'simulado' = sensores de caminata aleatoria y display dummy
+MODO_HARDWARE = os.getenv('MODO_HARDWARE', 'real')
+
+# Semilla para repetir la misma simulacion (vacia = aleatoria)
+SEMILLA_SIMULACION = os.getenv('SEMILLA_SIMULACION', '')
+
+# 'dia' = PIR y botones al azar con luz de interior; 'noche' = pieza oscura y sin movimiento
+ESCENA_SIMULADA = os.getenv('ESCENA_SIMULADA', 'dia')
+
+# Canales del ADS1115
+CANAL_LDR = 0
+CANAL_MIC = 1
+CANAL_MQ135 = 2
+
+DEBUG = True
+
+# ============================================
+# BACKEND REAL
+# ============================================
+
+class HardwareReal:
+    """Raspberry Pi: cada modulo se importa y cada bus se abre al pedirlo"""
+
+    simulado = False
+
+    def __init__(self):
+        self._gpio = None
+        self._ads = None
+
+    def gpio(self):
+        if self._gpio is None:
+            import RPi.GPIO as GPIO
+            self._gpio = GPIO
+        return self._gpio
+
+    def dht11(self, pin):
+        import board
+        import adafruit_dht
+        return adafruit_dht.DHT11(getattr(board, "D{}".format(pin)), use_pulseio=False)
+
+    def ads1115(self):
+        """El ADS1115 compartido (el I2C se abre la primera vez)"""
+        if self._ads is None:
+            import board
+            import adafruit_ads1x15.ads1115 as ADS
+            self._ads = ADS.ADS1115(board.I2C())
+        return self._ads
+
+    def canal_analogico(self, canal):
+        from adafruit_ads1x15.analog_in import AnalogIn
+        return AnalogIn(self.ads1115(), canal)
+
+    def configurar_tasa_adc(self, tasa):
+        self.ads1115().data_rate = tasa
+
+    def display(self, pin_dc, pin_rst):
+        from luma.core.interface.serial import spi
+        from luma.lcd.device import st7789
+        serial = spi(port=0, device=0, gpio_DC=pin_dc, gpio_RST=pin_rst)
+        return st7789(serial, width=240, height=240, rotate=3)
+
+    def iniciar_actividad(self, pin_pir, pines_botones):
+        pass
+
+# ============================================
+# BACKEND SIMULADO
+# ============================================
+
+class CaminataAleatoria:
+    """Valor que se mueve un paso aleatorio en cada lectura, dentro de limites"""
+
+    def __init__(self, inicial, paso, minimo, maximo, azar):
+        self.valor = inicial
+        self.paso = paso
+        self.minimo = minimo
+        self.maximo = maximo
+        self.azar = azar
+
+    def siguiente(self):
+        self.valor += self.azar.gauss(0, self.paso)
+        self.valor = min(self.maximo, max(self.minimo, self.valor))
+        return self.valor
+
+
+class DHTSimulado:
+    """Imita adafruit_dht.DHT11 (con fallos ocasionales como el real)"""
+
+    def __init__(self, azar):
+        self.azar = azar
+        self.temp = CaminataAleatoria(22.0, 0.05, 15.0, 32.0, azar)
+        self.hum = CaminataAleatoria(50.0, 0.2, 20.0, 90.0, azar)
+
+    @property
+    def temperature(self):
+        if self.azar.random() < 0.05:
+            raise RuntimeError("Checksum did not validate")
+        return round(self.temp.siguiente())
+
+    @property
+    def humidity(self):
+        return round(self.hum.siguiente())
+
+    def exit(self):
+        pass
+
+
+class CanalSimulado:
+    """Imita un AnalogIn del ADS1115 con voltaje de caminata aleatoria"""
+
+    def __init__(self, inicial, paso, azar):
+        self.caminata = CaminataAleatoria(inicial, paso, 0.0, 3.3, azar)
+
+    @property
+    def voltage(self):
+        return self.caminata.siguiente()
+
+    @property
+    def value(self):
+        return int(self.voltage * 32767 / 4.096)
+
+
+class HardwareSimulado:
+    """Sin Raspberry Pi: GPIO simulado, sensores aleatorios y el display dummy de luma"""
+
+    simulado = True
+
+    def __init__(self, semilla=SEMILLA_SIMULACION, escena=ESCENA_SIMULADA):
+        self.azar = random.Random(int(semilla)) if semilla else random.Random()
+        self.escena = escena
+        self.detener_evento = threading.Event()  # Lo activa gpio().cleanup()
+        self._gpio = GPIOSimulado(self.detener_evento)
+
+    def gpio(self):
+        return self._gpio
+
+    def dht11(self, pin):
+        return DHTSimulado(self.azar)
+
+    def canal_analogico(self, canal):
+        if canal == CANAL_MIC:
+            return FuenteADCSimulada()
+        if canal == CANAL_LDR:
+            if self.escena == 'noche':
+                return CanalSimulado(0.03, 0.002, self.azar)  # ~10 lux
+            return CanalSimulado(1.0, 0.02, self.azar)
+        return CanalSimulado(0.8, 0.01, self.azar)
+
+    def configurar_tasa_adc(self, tasa):
+        pass
+
+    def display(self, pin_dc, pin_rst):
+        from luma.core.device import dummy
+        return dummy(width=240, height=240, rotate=3, mode="RGB")
+
+    def iniciar_actividad(self, pin_pir, pines_botones):
+        """Hilo que mueve el PIR y presiona botones de vez en cuando (de noche nadie)"""
+        if self.escena == 'noche':
+            return
+
+        def actividad():
+            while not self.detener_evento.wait(self.azar.uniform(2.0, 6.0)):
+                self._gpio.cambiar(pin_pir, self.azar.random() < 0.3)
+                if pines_botones and self.azar.random() < 0.3:
+                    self._gpio.presionar(self.azar.choice(pines_botones))
+
+        threading.Thread(target=actividad, name="actividad-sim", daemon=True).start()
+
+
+def crear_hardware(modo=MODO_HARDWARE):
+    """Backend segun MODO_HARDWARE"""
+    if modo == 'simulado':
+        if DEBUG:
+            print("INFO: Hardware simulado")
+        return HardwareSimulado()
+    return HardwareReal()
+
+# ============================================
+# MAIN - Tiempo de importacion de los monitores
+# ============================================
+
+if __name__ == '__main__':
+    import subprocess
+    import sys
+
+    for modulo in ('testeo', 'monitor_sensores_lcd'):
+        inicio = time.perf_counter()
+        resultado = subprocess.run([sys.executable, '-c', 'import ' + modulo],
+                                   capture_output=True, text=True)
+        total = time.perf_counter() - inicio
+        estado = "OK" if resultado.returncode == 0 else "ERROR - " + resultado.stderr.strip().splitlines()[-1]
+        print("import {:<22} {:7.1f} ms (proceso completo)  {}".format(modulo, total * 1000, estado))
@@ -0,0 +1,686 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Hub de la Flota - Proyecto Zenalyze
+Servicio asyncio que recibe lotes compactos de lecturas y estados de animo de
+muchas cajas por HTTP o UDP, descarta duplicados por dispositivo y secuencia
+y los escribe juntos en PostgreSQL por una sola conexion
+"""
+
+import argparse
+import asyncio
+import hmac
+import json
+import os
+import random
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from subida_db import DB_CONFIG, COLUMNAS, copiar_filas
+from compresion_lecturas import decodificar_filas_texto, ESCALAS_HUB
+
+# ============================================
+# CONFIGURACION
+# ============================================
+
+# Solo local por defecto; para escuchar en la red hace falta HUB_TOKEN
+HUB_HOST = os.getenv('HUB_HOST', '127.0.0.1')
+HUB_TOKEN = os.getenv('HUB_TOKEN', '')
+HUB_PUERTO_HTTP = int(os.getenv('HUB_PUERTO_HTTP', 8740))
+HUB_PUERTO_UDP = int(os.getenv('HUB_PUERTO_UDP', 8741))  # 0 = sin UDP
+
+INTERVALO_HUB = float(os.getenv('INTERVALO_HUB', 0.5))  # segundos maximos entre escrituras
+TAMANO_LOTE_HUB = 5000         # filas pendientes que adelantan la escritura
+MAX_PENDIENTES_HUB = 200000    # filas esperando la base antes de rechazar mensajes
+VENTANA_SECUENCIAS = 4096      # secuencias recientes recordadas por dispositivo
+MAX_CUERPO = 1024 * 1024       # bytes por pedido HTTP
+
+TABLA_LECTURAS_HUB = os.getenv('HUB_TABLA_LECTURAS', 'lecturas')
+TABLA_ESTADOS_HUB = os.getenv('HUB_TABLA_ESTADOS', 'estados_animo')
+COLUMNAS_LECTURAS_HUB = COLUMNAS + ("dispositivo", "secuencia")
+COLUMNAS_ESTADOS_HUB = ("timestamp", "estado", "temperatura", "humedad", "co2", "luz", "ruido",
+                        "dispositivo", "secuencia")
+
+# Lo que el hub agrega a la base; se aplica una vez con `hub_flota.py --migrar`
+# (no cambia nada si ya existe). El indice unico hace que un reenvio ya escrito
+# se descarte en la base aunque el hub se haya reiniciado
+ESQUEMA_HUB = """
+    ALTER TABLE {lecturas} ADD COLUMN IF NOT EXISTS dispositivo TEXT;
+    ALTER TABLE {lecturas} ADD COLUMN IF NOT EXISTS secuencia BIGINT;
+    CREATE UNIQUE INDEX IF NOT EXISTS {lecturas}_dispositivo_secuencia ON {lecturas} (dispositivo, secuencia);
+    CREATE TABLE IF NOT EXISTS {estados} (
+        id SERIAL PRIMARY KEY, timestamp TIMESTAMP, estado VARCHAR(10), temperatura REAL,
+        humedad REAL, co2 INTEGER, luz INTEGER, ruido VARCHAR(10), dispositivo TEXT, secuencia BIGINT);
+    CREATE UNIQUE INDEX IF NOT EXISTS {estados}_dispositivo_secuencia ON {estados} (dispositivo, secuencia);
+"""
+
+# Tablas temporales de la sesion: COPY entra aca y de aca pasa con ON CONFLICT DO NOTHING
+ESQUEMA_TEMPORAL_HUB = """
+    CREATE TEMP TABLE IF NOT EXISTS hub_temporal_lecturas ON COMMIT DELETE ROWS
+        AS SELECT {columnas_lecturas} FROM {lecturas} WITH NO DATA;
+    CREATE TEMP TABLE IF NOT EXISTS hub_temporal_estados ON COMMIT DELETE ROWS
+        AS SELECT {columnas_estados} FROM {estados} WITH NO DATA;
+"""
+
+# Mensaje (JSON por POST /ingesta o en un datagrama UDP):
+#   {"d": "caja-01", "m": 17,
+#    "l": [[timestamp, secuencia, temp, hum, luz, co2, movimiento, ruido], ...],
+#    "e": [[timestamp, secuencia, estado, temp, hum, co2, luz, nivel_ruido], ...]}
+# Con HUB_TOKEN el POST lleva "Authorization: Bearer <token>" y el datagrama UDP un campo "t"
+# Con COMPRIMIR_LECTURAS la caja manda las lecturas en "lz": las mismas filas en
+# deltas cuantizados con ESCALAS_HUB (compresion_lecturas.codificar_filas) y en base64
+# "m" solo hace falta en UDP: el hub contesta {"m": 17, "ok": true} cuando las filas
+# ya estan en la base; sin esa respuesta la caja reenvia y el duplicado se descarta
+NOMBRE_VALIDO = re.compile(r'^[A-Za-z0-9_.:-]{1,64}$')
+ESTADOS_VALIDOS = ("bien", "neutral", "mal")
+NIVELES_RUIDO = ("silencio", "bajo", "medio", "alto")
+
+DEBUG = True
+
+# ============================================
+# DUPLICADOS
+# ============================================
+
+class VentanaSecuencias:
+    """Secuencias ya escritas de un dispositivo: la mayor y un mapa de bits de las anteriores"""
+
+    __slots__ = ('mayor', 'bits')
+
+    def __init__(self):
+        self.mayor = None
+        self.bits = 0
+
+    def vista(self, secuencia):
+        if self.mayor is None:
+            return False
+        atras = self.mayor - secuencia
+        if atras < 0 or atras >= VENTANA_SECUENCIAS:
+            return False  # Nueva, o mas vieja que la ventana (spool de un corte largo)
+        return bool((self.bits >> atras) & 1)
+
+    def marcar(self, secuencia):
+        if self.mayor is None or secuencia - self.mayor >= VENTANA_SECUENCIAS:
+            self.mayor = secuencia
+            self.bits = 1
+            return
+        atras = self.mayor - secuencia
+        if atras < 0:
+            self.bits = ((self.bits << -atras) | 1) & ((1 << VENTANA_SECUENCIAS) - 1)
+            self.mayor = secuencia
+        elif atras < VENTANA_SECUENCIAS:
+            self.bits |= 1 << atras
+
+
+def decodificar(mensaje):
+    """(dispositivo, lecturas, estados) de un mensaje; ValueError si algo no cierra"""
+    try:
+        dispositivo = mensaje["d"]
+        if not isinstance(dispositivo, str) or not NOMBRE_VALIDO.match(dispositivo):
+            raise ValueError("dispositivo invalido")
+
+        filas = list(mensaje.get("l") or ())
+        if mensaje.get("lz"):
+            filas += decodificar_filas_texto(mensaje["lz"], ESCALAS_HUB)
+
+        lecturas = []
+        for ts, secuencia, temp, hum, luz, co2, movimiento, ruido in filas:
+            lecturas.append((int(secuencia), (datetime.fromtimestamp(float(ts)), float(temp), float(hum),
+                                              int(luz), int(co2), bool(movimiento), bool(ruido),
+                                              dispositivo, int(secuencia))))
+
+        estados = []
+        for ts, secuencia, estado, temp, hum, co2, luz, nivel_ruido in mensaje.get("e") or ():
+            if estado not in ESTADOS_VALIDOS or nivel_ruido not in NIVELES_RUIDO:
+                raise ValueError("estado invalido")
+            estados.append((int(secuencia), (datetime.fromtimestamp(float(ts)), estado, float(temp),
+                                             float(hum), int(co2), int(luz), nivel_ruido,
+                                             dispositivo, int(secuencia))))
+    except (KeyError, TypeError, OverflowError, OSError, AttributeError) as e:
+        raise ValueError("mensaje invalido - " + str(e))
+    return dispositivo, lecturas, estados
+
+# ============================================
+# ESCRITURA EN POSTGRESQL
+# ============================================
+
+class EscritorPostgres:
+    """Una conexion a PostgreSQL, usada solo desde el hilo de escritura del hub"""
+
+    def __init__(self, config=None, tabla_lecturas=TABLA_LECTURAS_HUB, tabla_estados=TABLA_ESTADOS_HUB):
+        self.config = config or DB_CONFIG
+        self.tabla_lecturas = tabla_lecturas
+        self.tabla_estados = tabla_estados
+        self.conexion = None
+
+    def migrar(self):
+        """Aplica ESQUEMA_HUB (paso explicito, no se corre al conectar)"""
+        import psycopg2
+        conexion = psycopg2.connect(**self.config)
+        try:
+            with conexion.cursor() as cur:
+                cur.execute(ESQUEMA_HUB.format(lecturas=self.tabla_lecturas, estados=self.tabla_estados))
+            conexion.commit()
+        finally:
+            conexion.close()
+        print("OK: Esquema del hub aplicado en {} y {}".format(self.tabla_lecturas, self.tabla_estados))
+
+    def conectar(self):
+        if self.conexion is not None and not self.conexion.closed:
+            return
+        import psycopg2
+        self.conexion = psycopg2.connect(**self.config)
+        try:
+            with self.conexion.cursor() as cur:
+                cur.execute(ESQUEMA_TEMPORAL_HUB.format(
+                    lecturas=self.tabla_lecturas, estados=self.tabla_estados,
+                    columnas_lecturas=", ".join(COLUMNAS_LECTURAS_HUB),
+                    columnas_estados=", ".join(COLUMNAS_ESTADOS_HUB)))
+            self.conexion.commit()
+        except Exception as e:
+            self.cerrar()
+            raise RuntimeError("{} (falta correr hub_flota.py --migrar?)".format(str(e).strip()))
+        if DEBUG:
+            print("OK: Hub conectado a PostgreSQL ({})".format(self.config['host']))
+
+    def escribir(self, lecturas, estados):
+        """Todas las filas pendientes en una transaccion; devuelve cuantas eran nuevas en la base"""
+        self.conectar()
+        nuevas = 0
+        try:
+            with self.conexion.cursor() as cur:
+                for filas, tabla, temporal, columnas in (
+                        (lecturas, self.tabla_lecturas, "hub_temporal_lecturas", COLUMNAS_LECTURAS_HUB),
+                        (estados, self.tabla_estados, "hub_temporal_estados", COLUMNAS_ESTADOS_HUB)):
+                    if not filas:
+                        continue
+                    copiar_filas(cur, temporal, columnas, filas)
+                    lista = ", ".join(columnas)
+                    cur.execute("INSERT INTO {0} ({1}) SELECT {1} FROM {2} "
+                                "ON CONFLICT (dispositivo, secuencia) DO NOTHING".format(tabla, lista, temporal))
+                    nuevas += cur.rowcount
+            self.conexion.commit()
+        except Exception:
+            self.cerrar()
+            raise
+        return nuevas
+
+    def cerrar(self):
+        if self.conexion is not None:
+            try:
+                self.conexion.close()
+            except Exception:
+                pass
+            self.conexion = None
+
+# ============================================
+# CLASE HUB
+# ============================================
+
+class HubFlota:
+    def __init__(self, escritor=None, intervalo=INTERVALO_HUB, tamano_lote=TAMANO_LOTE_HUB,
+                 max_pendientes=MAX_PENDIENTES_HUB, token=HUB_TOKEN):
+        self.escritor = escritor or EscritorPostgres()
+        self.token = token
+        self.intervalo = intervalo
+        self.tamano_lote = tamano_lote
+        self.max_pendientes = max_pendientes
+
+        # Secuencias ya escritas por dispositivo
+        self.ventanas = {}
+
+        # Lote en armado: filas, claves (dispositivo, secuencia) y quienes esperan el resultado
+        self.lecturas = []
+        self.estados = []
+        self.claves = set()
+        self.esperando = []
+
+        # Lote que se esta escribiendo
+        self.claves_en_vuelo = set()
+        self.esperando_en_vuelo = []
+
+        # Un solo hilo para la base: una conexion y escrituras en orden
+        self.ejecutor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="hub-db")
+        self.hay_lote = None
+        self.servidores = []
+        self.tarea = None
+        self.detenido = False
+
+        # Estadisticas
+        self.mensajes = 0
+        self.escritas = 0
+        self.duplicadas = 0
+        self.duplicadas_base = 0  # Las descarto el indice unico (ya escritas antes de reiniciar)
+        self.no_autorizados = 0
+        self.rechazados = 0
+        self.invalidos = 0
+        self.escrituras = 0
+        self.errores = 0
+        self.ultimo_flush_ms = 0.0
+
+    # ---------- Recepcion ----------
+
+    def recibir(self, mensaje):
+        """Agrega las filas nuevas al lote; devuelve los futures a esperar o None si no hay lugar"""
+        dispositivo, lecturas, estados = decodificar(mensaje)
+        self.mensajes += 1
+        if len(self.lecturas) + len(self.estados) >= self.max_pendientes:
+            self.rechazados += 1
+            return None
+
+        ventana = self.ventanas.get(dispositivo)
+        if ventana is None:
+            ventana = self.ventanas[dispositivo] = VentanaSecuencias()
+
+        esperar_lote = False
+        esperar_en_vuelo = False
+        for filas, destino in ((lecturas, self.lecturas), (estados, self.estados)):
+            for secuencia, fila in filas:
+                clave = (dispositivo, secuencia)
+                if clave in self.claves:
+                    esperar_lote = True  # Reenvio de algo que va en este lote
+                elif clave in self.claves_en_vuelo:
+                    esperar_en_vuelo = True
+                elif ventana.vista(secuencia):
+                    pass
+                else:
+                    self.claves.add(clave)
+                    destino.append(fila)
+                    esperar_lote = True
+                    continue
+                self.duplicadas += 1
+
+        esperas = []
+        if esperar_lote:
+            futuro = asyncio.get_running_loop().create_future()
+            self.esperando.append(futuro)
+            esperas.append(futuro)
+            if len(self.lecturas) + len(self.estados) >= self.tamano_lote:
+                self.hay_lote.set()
+        if esperar_en_vuelo:
+            futuro = asyncio.get_running_loop().create_future()
+            self.esperando_en_vuelo.append(futuro)
+            esperas.append(futuro)
+        return esperas
+
+    async def esperar(self, esperas):
+        """True cuando todas las filas del mensaje quedaron en la base"""
+        if esperas is None:
+            return False
+        resultados = await asyncio.gather(*esperas)
+        return all(resultados)
+
+    # ---------- Escritura ----------
+
+    async def escribir_periodicamente(self):
+        """Escribe el lote cada intervalo o antes si junto tamano_lote filas"""
+        while not self.detenido:
+            try:
+                await asyncio.wait_for(self.hay_lote.wait(), self.intervalo)
+            except asyncio.TimeoutError:
+                pass
+            self.hay_lote.clear()
+            await self.escribir_pendientes()
+
+    async def escribir_pendientes(self):
+        if not self.esperando:
+            return
+        lecturas, estados = self.lecturas, self.estados
+        self.claves_en_vuelo, self.esperando_en_vuelo = self.claves, self.esperando
+        self.lecturas, self.estados, self.claves, self.esperando = [], [], set(), []
+
+        inicio = time.perf_counter()
+        try:
+            nuevas = await asyncio.get_running_loop().run_in_executor(
+                self.ejecutor, self.escritor.escribir, lecturas, estados)
+            ok = True
+        except Exception as e:
+            ok = False
+            self.errores += 1
+            print("ERROR: Escribiendo en la base - " + str(e).strip())
+        self.ultimo_flush_ms = (time.perf_counter() - inicio) * 1000
+
+        if ok:
+            for dispositivo, secuencia in self.claves_en_vuelo:
+                self.ventanas[dispositivo].marcar(secuencia)
+            self.escritas += nuevas
+            self.duplicadas_base += len(lecturas) + len(estados) - nuevas
+            self.escrituras += 1
+        for futuro in self.esperando_en_vuelo:
+            if not futuro.done():
+                futuro.set_result(ok)
+        self.claves_en_vuelo, self.esperando_en_vuelo = set(), []
+
+    # ---------- HTTP ----------
+
+    async def atender_http(self, lector, escritor):
+        """HTTP/1.1 minimo con keep-alive: POST /ingesta y GET /estado"""
+        try:
+            while True:
+                linea = await lector.readline()
+                if not linea:
+                    break
+                partes = linea.decode('latin-1').split()
+                if len(partes) < 2:
+                    break
+                metodo, ruta = partes[0], partes[1]
+
+                encabezados = {}
+                while True:
+                    encabezado = await lector.readline()
+                    if encabezado in (b'\r\n', b'\n', b''):
+                        break
+                    nombre, _, valor = encabezado.decode('latin-1').partition(':')
+                    encabezados[nombre.strip().lower()] = valor.strip()
+
+                largo = int(encabezados.get('content-length', 0))
+                if largo > MAX_CUERPO:
+                    await self.responder(escritor, 413, {"ok": False, "error": "cuerpo demasiado grande"}, True)
+                    break
+                cuerpo = await lector.readexactly(largo) if largo else b''
+
+                codigo, respuesta = await self.procesar_http(metodo, ruta, cuerpo,
+                                                             encabezados.get('authorization', ''))
+                cerrar = encabezados.get('connection', '').lower() == 'close'
+                await self.responder(escritor, codigo, respuesta, cerrar)
+                if cerrar:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError, ValueError):
+            pass
+        finally:
+            escritor.close()
+
+    def autorizado(self, token):
+        """Sin HUB_TOKEN todo pasa; con HUB_TOKEN tiene que coincidir"""
+        if not self.token:
+            return True
+        if isinstance(token, str) and hmac.compare_digest(token.encode('utf-8'), self.token.encode('utf-8')):
+            return True
+        self.no_autorizados += 1
+        return False
+
+    async def procesar_http(self, metodo, ruta, cuerpo, autorizacion=''):
+        ruta = ruta.split('?')[0]
+        if metodo == 'GET' and ruta == '/estado':
+            return 200, self.estadisticas()
+        if metodo != 'POST' or ruta != '/ingesta':
+            return 404, {"ok": False}
+        esquema, _, token = autorizacion.partition(' ')
+        if not self.autorizado(token if esquema.lower() == 'bearer' else None):
+            return 401, {"ok": False}
+
+        try:
+            esperas = self.recibir(json.loads(cuerpo))
+        except ValueError as e:
+            self.invalidos += 1
+            return 400, {"ok": False, "error": str(e)}
+        if await self.esperar(esperas):
+            return 200, {"ok": True}
+        return 503, {"ok": False}
+
+    async def responder(self, escritor, codigo, datos, cerrar):
+        cuerpo = json.dumps(datos, separators=(",", ":")).encode('utf-8')
+        razon = {200: "OK", 400: "Bad Request", 401: "Unauthorized", 404: "Not Found",
+                 413: "Payload Too Large", 503: "Service Unavailable"}[codigo]
+        escritor.write("HTTP/1.1 {} {}\r\nContent-Type: application/json\r\nContent-Length: {}\r\n"
+                       "Connection: {}\r\n\r\n".format(codigo, razon, len(cuerpo),
+                                                       "close" if cerrar else "keep-alive").encode('latin-1'))
+        escritor.write(cuerpo)
+        await escritor.drain()
+
+    # ---------- Ciclo de vida ----------
+
+    async def iniciar(self, host=HUB_HOST, puerto_http=HUB_PUERTO_HTTP, puerto_udp=HUB_PUERTO_UDP):
+        if not self.token and host not in ('127.0.0.1', 'localhost', '::1'):
+            raise RuntimeError("HUB_HOST={} sin HUB_TOKEN: cualquiera en la red podria escribir".format(host))
+        loop = asyncio.get_running_loop()
+        self.hay_lote = asyncio.Event()
+        if puerto_http:
+            servidor = await asyncio.start_server(self.atender_http, host, puerto_http)
+            self.servidores.append(servidor)
+        if puerto_udp:
+            transporte, _ = await loop.create_datagram_endpoint(
+                lambda: ProtocoloUDP(self), local_addr=(host, puerto_udp))
+            self.servidores.append(transporte)
+        self.tarea = asyncio.ensure_future(self.escribir_periodicamente())
+        if DEBUG:
+            print("OK: Hub escuchando en {} (HTTP {}, UDP {})".format(host, puerto_http or "-", puerto_udp or "-"))
+
+    async def detener(self):
+        """Deja de recibir, escribe lo pendiente y cierra la base"""
+        for servidor in self.servidores:
+            servidor.close()
+        self.detenido = True
+        if self.tarea:
+            self.hay_lote.set()
+            await self.tarea
+        await self.escribir_pendientes()
+        await asyncio.get_running_loop().run_in_executor(self.ejecutor, self.escritor.cerrar)
+        self.ejecutor.shutdown()
+
+    def estadisticas(self):
+        return {
+            "dispositivos": len(self.ventanas),
+            "mensajes": self.mensajes,
+            "escritas": self.escritas,
+            "duplicadas": self.duplicadas,
+            "duplicadas_base": self.duplicadas_base,
+            "no_autorizados": self.no_autorizados,
+            "rechazados": self.rechazados,
+            "invalidos": self.invalidos,
+            "escrituras": self.escrituras,
+            "errores": self.errores,
+            "pendientes": len(self.lecturas) + len(self.estados),
+            "ultimo_flush_ms": round(self.ultimo_flush_ms, 1),
+        }
+
+
+class ProtocoloUDP(asyncio.DatagramProtocol):
+    """Un mensaje por datagrama; la confirmacion sale cuando el lote se escribio"""
+
+    def __init__(self, hub):
+        self.hub = hub
+        self.transporte = None
+
+    def connection_made(self, transporte):
+        self.transporte = transporte
+
+    def datagram_received(self, datos, direccion):
+        try:
+            mensaje = json.loads(datos)
+            if not isinstance(mensaje, dict):
+                raise ValueError("mensaje invalido")
+            if not self.hub.autorizado(mensaje.get("t")):
+                return
+            esperas = self.hub.recibir(mensaje)
+        except ValueError:
+            self.hub.invalidos += 1
+            return
+        asyncio.ensure_future(self.confirmar(mensaje.get("m"), esperas, direccion))
+
+    async def confirmar(self, numero, esperas, direccion):
+        if await self.hub.esperar(esperas) and numero is not None:
+            self.transporte.sendto(json.dumps({"m": numero, "ok": True}).encode('utf-8'), direccion)
+
+# ============================================
+# BENCHMARK - Muchas cajas simuladas
+# ============================================
+
+class EscritorDescarte:
+    """Para --sin-base: mide solo el hub (recepcion, duplicados y armado de lotes)"""
+
+    def escribir(self, lecturas, estados):
+        return len(lecturas) + len(estados)
+
+    def cerrar(self):
+        pass
+
+
+def mensaje_simulado(dispositivo, secuencia, filas, azar):
+    ahora = time.time()
+    lecturas = [[round(ahora - (filas - i) * 10, 3), secuencia + i, round(azar.uniform(18, 28), 1),
+                 round(azar.uniform(30, 70), 1), azar.randint(0, 800), azar.randint(400, 1500),
+                 azar.random() < 0.1, azar.random() < 0.3] for i in range(filas)]
+    mensaje = {"d": dispositivo, "l": lecturas}
+    if azar.random() < 0.05:
+        mensaje["e"] = [[round(ahora, 3), secuencia + filas, azar.choice(ESTADOS_VALIDOS), 22.0, 50.0,
+                         600, 300, "bajo"]]
+    return mensaje
+
+
+async def caja_http(numero, puerto, mensajes, filas, reenvios, latencias, azar):
+    """Una caja: una conexion keep-alive, mensajes en serie y algunos reenvios"""
+    lector, escritor = await asyncio.open_connection('127.0.0.1', puerto)
+    dispositivo = "caja-{:04d}".format(numero)
+    secuencia = 1
+    for _ in range(mensajes):
+        mensaje = mensaje_simulado(dispositivo, secuencia, filas, azar)
+        secuencia += filas + 1
+        cuerpo = json.dumps(mensaje, separators=(",", ":")).encode('utf-8')
+        for _ in range(2 if azar.random() < reenvios else 1):
+            inicio = time.perf_counter()
+            escritor.write("POST /ingesta HTTP/1.1\r\nHost: hub\r\nContent-Type: application/json\r\n"
+                           "Content-Length: {}\r\n\r\n".format(len(cuerpo)).encode('latin-1') + cuerpo)
+            await escritor.drain()
+            await lector.readline()
+            largo = 0
+            while True:
+                encabezado = await lector.readline()
+                if encabezado in (b'\r\n', b''):
+                    break
+                if encabezado.lower().startswith(b'content-length:'):
+                    largo = int(encabezado.split(b':')[1])
+            await lector.readexactly(largo)
+            latencias.append(time.perf_counter() - inicio)
+    escritor.close()
+
+
+async def caja_udp(numero, puerto, mensajes, filas, reenvios, latencias, azar):
+    """Una caja por UDP: reenvia si la confirmacion no llega en 2 s"""
+    loop = asyncio.get_running_loop()
+    confirmados = {}
+
+    class Cliente(asyncio.DatagramProtocol):
+        def datagram_received(self, datos, direccion):
+            futuro = confirmados.get(json.loads(datos).get("m"))
+            if futuro and not futuro.done():
+                futuro.set_result(True)
+
+    transporte, _ = await loop.create_datagram_endpoint(Cliente, remote_addr=('127.0.0.1', puerto))
+    dispositivo = "udp-{:04d}".format(numero)
+    secuencia = 1
+    for m in range(mensajes):
+        mensaje = mensaje_simulado(dispositivo, secuencia, filas, azar)
+        mensaje["m"] = m
+        secuencia += filas + 1
+        datos = json.dumps(mensaje, separators=(",", ":")).encode('utf-8')
+        inicio = time.perf_counter()
+        confirmados[m] = loop.create_future()
+        for intento in range(5):
+            transporte.sendto(datos)
+            if azar.random() < reenvios:
+                transporte.sendto(datos)
+            try:
+                await asyncio.wait_for(asyncio.shield(confirmados[m]), 2.0)
+                break
+            except asyncio.TimeoutError:
+                continue
+        latencias.append(time.perf_counter() - inicio)
+    transporte.close()
+
+
+async def benchmark(args):
+    if args.sin_base:
+        escritor = EscritorDescarte()
+    else:
+        import psycopg2
+        conexion = psycopg2.connect(**DB_CONFIG)
+        with conexion.cursor() as cur:
+            cur.execute("DROP TABLE IF EXISTS lecturas_hub_bench, estados_hub_bench")
+            cur.execute("""CREATE TABLE lecturas_hub_bench (
+                id SERIAL PRIMARY KEY, timestamp TIMESTAMP, temperatura REAL, humedad REAL,
+                luz INTEGER, co2_estimado INTEGER, movimiento BOOLEAN, ruido BOOLEAN)""")
+        conexion.commit()
+        escritor = EscritorPostgres(tabla_lecturas="lecturas_hub_bench", tabla_estados="estados_hub_bench")
+        escritor.migrar()
+
+    # Las cajas simuladas no mandan token
+    hub = HubFlota(escritor, token='')
+    await hub.iniciar('127.0.0.1', args.puerto_http, args.puerto_udp)
+
+    latencias = []
+    azar = random.Random(7)
+    cliente = caja_udp if args.udp else caja_http
+    puerto = args.puerto_udp if args.udp else args.puerto_http
+    inicio = time.perf_counter()
+    # Las cajas arrancan escalonadas en el primer segundo, como una flota real
+    async def caja(numero):
+        await asyncio.sleep(azar.random())
+        await cliente(numero, puerto, args.mensajes, args.filas, args.reenvios, latencias,
+                      random.Random(numero))
+    await asyncio.gather(*(caja(n) for n in range(args.dispositivos)))
+    await hub.detener()
+    segundos = time.perf_counter() - inicio
+
+    latencias.sort()
+    e = hub.estadisticas()
+    print("{} cajas por {}, {} mensajes de {} filas cada una ({:.0%} reenviados)".format(
+        args.dispositivos, "UDP" if args.udp else "HTTP", args.mensajes, args.filas, args.reenvios))
+    print("Filas escritas:   {:8d}  ({:.0f} filas/s, {:.0f} mensajes/s)".format(
+        e["escritas"], e["escritas"] / segundos, e["mensajes"] / segundos))
+    print("Duplicadas:       {:8d}   en la base: {}   rechazados: {}   errores: {}".format(
+        e["duplicadas"], e["duplicadas_base"], e["rechazados"], e["errores"]))
+    print("Escrituras:       {:8d}  ({:.0f} filas por escritura)".format(
+        e["escrituras"], e["escritas"] / max(1, e["escrituras"])))
+    print("Latencia hasta confirmar: p50={:.0f}ms p95={:.0f}ms p99={:.0f}ms".format(
+        latencias[len(latencias) // 2] * 1000, latencias[int(len(latencias) * 0.95)] * 1000,
+        latencias[int(len(latencias) * 0.99)] * 1000))
+
+    if not args.sin_base:
+        with conexion.cursor() as cur:
+            cur.execute("SELECT count(*), count(DISTINCT (dispositivo, secuencia)) FROM lecturas_hub_bench")
+            total, distintas = cur.fetchone()
+            print("{}: {} lecturas en la base, {} distintas".format(
+                "OK" if total == distintas else "ERROR", total, distintas))
+            cur.execute("DROP TABLE lecturas_hub_bench, estados_hub_bench")
+        conexion.commit()
+        conexion.close()
+
+# ============================================
+# MAIN
+# ============================================
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Hub de ingesta de la flota")
+    parser.add_argument('--migrar', action='store_true', help="Aplica ESQUEMA_HUB en la base y sale")
+    parser.add_argument('--benchmark', action='store_true', help="Simula cajas contra un PostgreSQL local")
+    parser.add_argument('--dispositivos', type=int, default=1000)
+    parser.add_argument('--mensajes', type=int, default=20, help="Mensajes por caja")
+    parser.add_argument('--filas', type=int, default=30, help="Lecturas por mensaje")
+    parser.add_argument('--reenvios', type=float, default=0.05, help="Fraccion de mensajes repetidos")
+    parser.add_argument('--udp', action='store_true', help="Cajas por UDP en lugar de HTTP")
+    parser.add_argument('--sin-base', action='store_true', help="Descarta las filas (mide solo el hub)")
+    parser.add_argument('--puerto-http', type=int, default=HUB_PUERTO_HTTP)
+    parser.add_argument('--puerto-udp', type=int, default=HUB_PUERTO_UDP)
+    args = parser.parse_args()
+
+    if args.migrar:
+        EscritorPostgres().migrar()
+    elif args.benchmark:
+        asyncio.run(benchmark(args))
+    else:
+        async def servir():
+            hub = HubFlota()
+            await hub.iniciar(HUB_HOST, args.puerto_http, args.puerto_udp)
+            try:
+                await asyncio.Event().wait()
+            finally:
+                await hub.detener()
+
+        try:
+            asyncio.run(servir())
+        except KeyboardInterrupt:
+            print("\nINFO: Hub detenido")
+        except RuntimeError as e:
+            print("ERROR: " + str(e))
@@ -0,0 +1,488 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Memoria Compartida de Sensores - Proyecto Zenalyze
+Segmento multiprocessing.shared_memory con la ultima lectura, un historial
+corto y los flancos de botones y PIR; un escritor (el demonio) y cualquier
+cantidad de lectores sincronizados con un seqlock
+"""
+
+import os
+import struct
+import threading
+import time
+import zlib
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from adquisicion import LecturaSensores
+from entradas import EventoEntrada
+
+# ============================================
+# CONFIGURACION
+# ============================================
+
+# 'local' = cada monitor abre el hardware, 'demonio' = lee lo que publica demonio_sensores.py
+FUENTE_SENSORES = os.getenv('FUENTE_SENSORES', 'local')
+
+NOMBRE_MEMORIA = os.getenv('NOMBRE_MEMORIA_SENSORES', 'zenalyze_sensores')
+
+# Lecturas del historial (a 1 lectura por segundo, 1 hora) y flancos recordados
+CAPACIDAD_COMPARTIDA = 3600
+CAPACIDAD_EVENTOS = 256
+
+# Segundos sin publicar tras los que el demonio se da por caido (mayor que INTERVALO_DEMONIO)
+MAX_EDAD_DEMONIO = float(os.getenv('MAX_EDAD_DEMONIO', 10))
+
+# Intentos de lectura antes de rendirse si el escritor no suelta el seqlock
+REINTENTOS_LECTURA = 1000
+
+DEBUG = True
+
+# ============================================
+# FORMATO DEL SEGMENTO
+# ============================================
+
+MAGICO = b'ZNSM'
+VERSION = 2
+
+ENCABEZADO = np.dtype([
+    ('magico', 'S4'),
+    ('version', '<u4'),
+    ('capacidad', '<u4'),
+    ('capacidad_eventos', '<u4'),
+    ('pid', '<u4'),
+    ('relleno', 'V44'),
+])
+
+# En su propia linea de cache: secuencia impar = el escritor esta a mitad de escritura
+CONTROL = np.dtype([
+    ('secuencia', '<u8'),
+    ('escritos', '<u8'),
+    ('eventos', '<u8'),
+    ('latido', '<f8'),  # time.time() de la ultima publicacion
+    ('relleno', 'V32'),
+])
+
+# Registro de 48 bytes; el crc32 de los 44 anteriores detecta una copia rota
+# aunque el procesador reordene escrituras (ARM no garantiza el orden sin barreras)
+REGISTRO_COMPARTIDO = np.dtype([
+    ('timestamp', '<f8'),
+    ('temp', '<f4'),
+    ('hum', '<f4'),
+    ('ppm_co2', '<f4'),
+    ('lux', '<f4'),
+    ('voltaje_ldr', '<f4'),
+    ('valor_mic', '<f4'),
+    ('diferencia_mic', '<f4'),
+    ('movimiento', 'u1'),
+    ('co2', 'u1'),
+    ('nivel_ruido', 'u1'),
+    ('calidad_aire', 'u1'),
+    ('relleno', 'V4'),
+    ('crc', '<u4'),
+])
+
+# Los flancos llevan su propio crc32 de los 12 bytes anteriores por la misma razon
+EVENTO_COMPARTIDO = np.dtype([
+    ('timestamp', '<f8'),
+    ('pin', '<u2'),
+    ('valor', 'u1'),
+    ('relleno', 'V1'),
+    ('crc', '<u4'),
+])
+
+# Lo mismo para struct: leer y escribir el registro actual sin pasar por escalares de NumPy
+FORMATO_REGISTRO = struct.Struct('<d7f4B4xI')
+FORMATO_EVENTO = struct.Struct('<dHBx')
+FORMATO_LATIDO = struct.Struct('<d')
+OFFSET_CONTROL = ENCABEZADO.itemsize
+OFFSET_ACTUAL = OFFSET_CONTROL + CONTROL.itemsize
+SECUENCIA, ESCRITOS, EVENTOS = 0, 1, 2  # Indices de control como memoryview de u8
+
+NIVELES_RUIDO = ("silencio", "bajo", "medio", "alto")
+CALIDADES_AIRE = ("normal", "excelente", "bueno", "regular", "malo")
+
+
+def tamano_segmento(capacidad, capacidad_eventos):
+    return (ENCABEZADO.itemsize + CONTROL.itemsize + REGISTRO_COMPARTIDO.itemsize * (1 + capacidad)
+            + EVENTO_COMPARTIDO.itemsize * capacidad_eventos)
+
+
+def mapear(buf, capacidad, capacidad_eventos):
+    """Vistas NumPy (encabezado, control, actual, historial, eventos) sobre el segmento"""
+    offset = 0
+    vistas = []
+    for dtype, n in ((ENCABEZADO, 1), (CONTROL, 1), (REGISTRO_COMPARTIDO, 1),
+                     (REGISTRO_COMPARTIDO, capacidad), (EVENTO_COMPARTIDO, capacidad_eventos)):
+        vistas.append(np.ndarray((n,), dtype=dtype, buffer=buf, offset=offset))
+        offset += dtype.itemsize * n
+    return vistas
+
+
+def crc_validos(copia):
+    """Mascara de los registros (o eventos) de la copia cuyo crc32 coincide"""
+    tamano = copia.dtype.itemsize - 4
+    crudos = copia.view(np.uint8).reshape(len(copia), copia.dtype.itemsize)
+    return np.fromiter((zlib.crc32(fila[:tamano]) for fila in crudos), dtype=np.uint32,
+                       count=len(copia)) == copia['crc']
+
+
+def registro_a_lectura(campos):
+    """Campos de FORMATO_REGISTRO (sin el crc) a LecturaSensores"""
+    (timestamp, temp, hum, ppm_co2, lux, voltaje_ldr, valor_mic, diferencia_mic,
+     movimiento, co2, nivel_ruido, calidad_aire) = campos
+    return LecturaSensores(temp=temp, hum=hum, ppm_co2=int(ppm_co2), lux=int(lux),
+                           nivel_ruido=NIVELES_RUIDO[nivel_ruido], movimiento=bool(movimiento),
+                           timestamp=timestamp, voltaje_ldr=voltaje_ldr,
+                           calidad_aire=CALIDADES_AIRE[calidad_aire], valor_mic=int(valor_mic),
+                           diferencia_mic=diferencia_mic, co2=bool(co2))
+
+
+def proceso_vivo(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+# ============================================
+# ESCRITOR (DEMONIO)
+# ============================================
+
+class MemoriaSensores:
+    """Lado del demonio: crea el segmento y es su unico escritor"""
+
+    def __init__(self, nombre=NOMBRE_MEMORIA, capacidad=CAPACIDAD_COMPARTIDA,
+                 capacidad_eventos=CAPACIDAD_EVENTOS):
+        self.nombre = nombre
+        self.capacidad = capacidad
+        self.capacidad_eventos = capacidad_eventos
+        tamano = tamano_segmento(capacidad, capacidad_eventos)
+
+        try:
+            self.shm = shared_memory.SharedMemory(name=nombre, create=True, size=tamano)
+        except FileExistsError:
+            # Si quedo de un demonio que murio sin limpiar se reemplaza; si esta vivo, no.
+            # Sin encabezado valido (otra VERSION, o muerto antes de escribirlo) tambien es viejo
+            try:
+                viejo = LectorMemoria(nombre)
+                pid = viejo.pid
+                viejo.cerrar()
+            except (ValueError, TypeError):
+                pid = None
+            if pid and pid != os.getpid() and proceso_vivo(pid):
+                raise RuntimeError("ya hay un demonio de sensores corriendo (pid {})".format(pid))
+            viejo = shared_memory.SharedMemory(name=nombre)
+            viejo.unlink()
+            viejo.close()
+            self.shm = shared_memory.SharedMemory(name=nombre, create=True, size=tamano)
+
+        self.encabezado, self.control, self.actual, self.historial, self.eventos = mapear(
+            self.shm.buf, capacidad, capacidad_eventos)
+        self.control[0] = np.zeros(1, CONTROL)[0]
+        self.encabezado['magico'] = MAGICO
+        self.encabezado['version'] = VERSION
+        self.encabezado['capacidad'] = capacidad
+        self.encabezado['capacidad_eventos'] = capacidad_eventos
+        self.encabezado['pid'] = os.getpid()
+
+        # Las lecturas y los flancos del GPIO llegan de hilos distintos: el seqlock
+        # admite un solo escritor a la vez
+        self.lock = threading.Lock()
+        self._contador = self.shm.buf[OFFSET_CONTROL:OFFSET_CONTROL + 24].cast('Q')
+        self._registro = bytearray(FORMATO_REGISTRO.size)
+
+        if DEBUG:
+            print("OK: Memoria compartida /dev/shm/{} ({} KB)".format(nombre, tamano // 1024))
+
+    def publicar(self, lectura):
+        """Ultima lectura y una entrada mas del historial"""
+        registro = self._registro
+        FORMATO_REGISTRO.pack_into(
+            registro, 0, lectura.timestamp, lectura.temp, lectura.hum, lectura.ppm_co2, lectura.lux,
+            lectura.voltaje_ldr, lectura.valor_mic, lectura.diferencia_mic, bool(lectura.movimiento),
+            bool(lectura.co2), NIVELES_RUIDO.index(lectura.nivel_ruido),
+            CALIDADES_AIRE.index(lectura.calidad_aire), 0)
+        struct.pack_into('<I', registro, FORMATO_REGISTRO.size - 4, zlib.crc32(memoryview(registro)[:-4]))
+
+        buf = self.shm.buf
+        contador = self._contador
+        tamano = FORMATO_REGISTRO.size
+        with self.lock:
+            escritos = contador[ESCRITOS]
+            contador[SECUENCIA] += 1
+            buf[OFFSET_ACTUAL:OFFSET_ACTUAL + tamano] = registro
+            inicio = OFFSET_ACTUAL + tamano * (1 + escritos % self.capacidad)
+            buf[inicio:inicio + tamano] = registro
+            contador[ESCRITOS] = escritos + 1
+            FORMATO_LATIDO.pack_into(buf, OFFSET_CONTROL + 24, time.time())
+            contador[SECUENCIA] += 1
+
+    def evento(self, evento):
+        """Un flanco de boton o PIR (EventoEntrada) para todos los lectores"""
+        datos = FORMATO_EVENTO.pack(evento.timestamp, evento.pin, evento.valor)
+        contador = self._contador
+        with self.lock:
+            total = contador[EVENTOS]
+            contador[SECUENCIA] += 1
+            self.eventos[total % self.capacidad_eventos] = (evento.timestamp, evento.pin, evento.valor, b'\0',
+                                                            zlib.crc32(datos))
+            contador[EVENTOS] = total + 1
+            contador[SECUENCIA] += 1
+
+    def cerrar(self):
+        """Borra el segmento (los lectores que ya lo tienen abierto siguen viendo lo ultimo)"""
+        self.encabezado = self.control = self.actual = self.historial = self.eventos = None
+        self._contador.release()
+        self.shm.close()
+        try:
+            self.shm.unlink()
+        except FileNotFoundError:
+            pass
+
+# ============================================
+# LECTORES
+# ============================================
+
+class LectorMemoria:
+    """Lado de los monitores: lee sin locks ni acceso al bus; reintenta si la copia salio rota"""
+
+    def __init__(self, nombre=NOMBRE_MEMORIA):
+        try:
+            self.shm = shared_memory.SharedMemory(name=nombre, track=False)
+        except TypeError:
+            # Antes de Python 3.13 el resource_tracker de este proceso borraria el segmento al salir
+            from multiprocessing import resource_tracker
+            self.shm = shared_memory.SharedMemory(name=nombre)
+            resource_tracker.unregister(self.shm._name, "shared_memory")
+
+        encabezado = np.ndarray((1,), dtype=ENCABEZADO, buffer=self.shm.buf)
+        if bytes(encabezado['magico'][0]) != MAGICO or int(encabezado['version'][0]) != VERSION:
+            del encabezado
+            self.shm.close()
+            raise ValueError("/dev/shm/{} no es un segmento de sensores".format(nombre))
+        capacidad = int(encabezado['capacidad'][0])
+        capacidad_eventos = int(encabezado['capacidad_eventos'][0])
+        del encabezado
+
+        self.capacidad = capacidad
+        self.capacidad_eventos = capacidad_eventos
+        self.encabezado, self.control, self.actual, self.historial, self.eventos = mapear(
+            self.shm.buf, capacidad, capacidad_eventos)
+        self._contador = self.shm.buf[OFFSET_CONTROL:OFFSET_CONTROL + 24].cast('Q')
+        self._actual = self.shm.buf[OFFSET_ACTUAL:OFFSET_ACTUAL + FORMATO_REGISTRO.size]
+        self.ultima = None
+
+        # Estadisticas
+        self.lecturas = 0
+        self.reintentos = 0
+        self.corruptos = 0  # Registros o flancos descartados por crc
+
+    @property
+    def pid(self):
+        return int(self.encabezado['pid'][0])
+
+    def _copiar(self, copiar):
+        """Corre copiar() entre dos lecturas iguales y pares de la secuencia"""
+        contador = self._contador
+        for intento in range(REINTENTOS_LECTURA):
+            antes = contador[SECUENCIA]
+            if antes & 1:
+                self.reintentos += 1
+                time.sleep(0)
+                continue
+            resultado = copiar()
+            if contador[SECUENCIA] == antes:
+                return resultado
+            self.reintentos += 1
+        return None
+
+    def leer(self):
+        """Ultima LecturaSensores publicada (None si el demonio todavia no publico)"""
+        contador = self._contador
+        actual = self._actual
+        for intento in range(REINTENTOS_LECTURA):
+            antes = contador[SECUENCIA]
+            if antes & 1:
+                self.reintentos += 1
+                time.sleep(0)
+                continue
+            escritos = contador[ESCRITOS]
+            registro = bytes(actual)
+            if contador[SECUENCIA] == antes and zlib.crc32(registro[:-4]) == int.from_bytes(registro[-4:], 'little'):
+                break
+            self.reintentos += 1
+        else:
+            return self.ultima
+        if escritos == 0:
+            return None
+
+        self.lecturas += 1
+        self.ultima = registro_a_lectura(FORMATO_REGISTRO.unpack(registro)[:-1])
+        return self.ultima
+
+    def validar(self, copia):
+        """La copia sin los registros cuyo crc no coincide"""
+        validos = crc_validos(copia)
+        if validos.all():
+            return copia
+        self.corruptos += int(len(validos) - validos.sum())
+        return copia[validos]
+
+    def leer_historial(self, n=None):
+        """Copia de las ultimas n lecturas en orden (arreglo REGISTRO_COMPARTIDO, sin copias rotas)"""
+        def copiar():
+            escritos = self._contador[ESCRITOS]
+            cantidad = min(n or self.capacidad, escritos, self.capacidad)
+            fin = escritos % self.capacidad
+            if cantidad <= fin:
+                return self.historial[fin - cantidad:fin].copy()
+            return np.concatenate((self.historial[self.capacidad - (cantidad - fin):], self.historial[:fin]))
+        copia = self._copiar(copiar)
+        return self.validar(copia) if copia is not None else np.zeros(0, REGISTRO_COMPARTIDO)
+
+    def total_eventos(self):
+        return self._contador[EVENTOS]
+
+    def eventos_desde(self, visto):
+        """(eventos nuevos, total, perdidos) desde el total visto antes"""
+        def copiar():
+            total = self._contador[EVENTOS]
+            desde = max(visto, total - self.capacidad_eventos)
+            indices = np.arange(desde, total) % self.capacidad_eventos
+            return total, desde - visto, self.eventos[indices]
+        copia = self._copiar(copiar)
+        if copia is None:
+            return [], visto, 0
+        total, perdidos, eventos = copia
+        eventos = self.validar(eventos)
+        return ([EventoEntrada(int(e['pin']), bool(e['valor']), float(e['timestamp'])) for e in eventos],
+                total, perdidos)
+
+    def edad(self):
+        """Segundos desde la ultima publicacion del demonio"""
+        return time.time() - FORMATO_LATIDO.unpack_from(self.shm.buf, OFFSET_CONTROL + 24)[0]
+
+    def reemplazado(self):
+        """True si el segmento ya no esta en /dev/shm (el demonio salio o se reinicio)"""
+        return os.fstat(self.shm._fd).st_nlink == 0
+
+    def al_dia(self, max_edad=MAX_EDAD_DEMONIO):
+        """True si el demonio sigue publicando en este mismo segmento"""
+        return not self.reemplazado() and self.edad() < max_edad
+
+    def cerrar(self):
+        self.encabezado = self.control = self.actual = self.historial = self.eventos = None
+        self._contador.release()
+        self._actual.release()
+        self.shm.close()
+
+
+class EntradaCompartida:
+    """Misma interfaz que EntradaGPIO, con los flancos que publica el demonio"""
+
+    def __init__(self, lector):
+        self.lector = lector
+        self.visto = lector.total_eventos()  # Lo anterior a este proceso no se repite
+        self.descartados = 0
+
+    def leer_eventos(self):
+        """Devuelve los eventos nuevos sin bloquear"""
+        eventos, self.visto, perdidos = self.lector.eventos_desde(self.visto)
+        self.descartados += perdidos
+        return eventos
+
+    def limpiar(self):
+        pass
+
+# ============================================
+# MAIN - Lectores contra un escritor a maxima velocidad
+# ============================================
+
+def _escritor_rapido(nombre, segundos, listo):
+    """Proceso aparte que publica sin pausa lecturas con temp, hum y lux relacionados"""
+    memoria = MemoriaSensores(nombre, capacidad=64)
+    listo.set()
+    fin = time.monotonic() + segundos
+    i = 0
+    while time.monotonic() < fin:
+        i += 1
+        memoria.publicar(LecturaSensores(temp=float(i % 1000), hum=float(i % 1000) + 1, ppm_co2=400 + i % 1000,
+                                         lux=i % 1000, nivel_ruido="bajo", movimiento=bool(i & 1),
+                                         timestamp=float(i)))
+        if i % 100 == 0:
+            memoria.evento(EventoEntrada(16, True, float(i)))
+    memoria.cerrar()
+
+
+if __name__ == '__main__':
+    import multiprocessing
+
+    nombre = "zenalyze_prueba_{}".format(os.getpid())
+    segundos = 3.0
+    listo = multiprocessing.Event()
+    proceso = multiprocessing.Process(target=_escritor_rapido, args=(nombre, segundos, listo))
+    proceso.start()
+    listo.wait()
+
+    lector = LectorMemoria(nombre)
+    entradas = EntradaCompartida(lector)
+    incoherentes = 0
+    eventos = 0
+    anterior = 0.0
+    retrocesos = 0
+    inicio = time.perf_counter()
+    while proceso.is_alive():
+        lectura = lector.leer()
+        if lectura is None:
+            continue
+        # Una copia rota mezclaria campos de dos publicaciones distintas
+        if (lectura.hum != lectura.temp + 1 or lectura.lux != int(lectura.temp)
+                or lectura.ppm_co2 != 400 + lectura.lux or lectura.movimiento != bool(int(lectura.timestamp) & 1)):
+            incoherentes += 1
+        if lectura.timestamp < anterior:
+            retrocesos += 1
+        anterior = lectura.timestamp
+        if lector.lecturas % 50 == 0:
+            eventos += len(entradas.leer_eventos())
+            historial = lector.leer_historial(16)
+            if len(historial) and np.any(np.diff(historial['timestamp']) != 1):
+                incoherentes += 1
+    total = time.perf_counter() - inicio
+    proceso.join()
+
+    estado = "OK" if incoherentes == 0 and retrocesos == 0 else "ERROR"
+    print("{}: {} lecturas en {:.1f} s ({:.1f} us por lectura) con el escritor publicando sin pausa".format(
+        estado, lector.lecturas, total, total / max(1, lector.lecturas) * 1e6))
+    print("Reintentos del seqlock: {}  copias incoherentes: {}  retrocesos: {}  descartadas por crc: {}".format(
+        lector.reintentos, incoherentes, retrocesos, lector.corruptos))
+    print("Eventos recibidos: {}  perdidos por atraso: {}".format(eventos, entradas.descartados))
+
+    # Un bit cambiado en una copia (como una escritura reordenada que el seqlock no vio)
+    rota = lector.leer_historial(16)
+    rota.view(np.uint8)[rota.dtype.itemsize + 9] ^= 1
+    validas = lector.validar(rota)
+    print("{}: registro roto descartado por crc ({} de {} validos)".format(
+        "OK" if len(validas) == len(rota) - 1 else "ERROR", len(validas), len(rota)))
+
+    # Con el escritor quieto (el demonio publica una vez por segundo)
+    n = 100000
+    inicio = time.perf_counter()
+    for _ in range(n):
+        lector.leer()
+    print("Lectura sin escritor activo: {:.2f} us".format((time.perf_counter() - inicio) / n * 1e6))
+    lector.cerrar()
+
+    # Referencia: el mismo dato por un proxy de multiprocessing.Manager
+    with multiprocessing.Manager() as manager:
+        compartido = manager.dict(temp=21.5, hum=48.0, lux=300)
+        n = 2000
+        inicio = time.perf_counter()
+        for _ in range(n):
+            compartido.copy()
+        print("Manager.dict (proxy por socket): {:.1f} us por lectura".format(
+            (time.perf_counter() - inicio) / n * 1e6))
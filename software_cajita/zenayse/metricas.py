@@ -0,0 +1,264 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Metricas del Loop - Proyecto Zenalyze
+Histogramas de cubetas fijas y contadores por etapa, expuestos en formato
+de texto de Prometheus en un endpoint HTTP local
+"""
+
+import bisect
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# ============================================
+# CONFIGURACION
+# ============================================
+
+# 0 = desactivadas (los instrumentos no hacen nada)
+METRICAS_PUERTO = int(os.getenv('METRICAS_PUERTO', 0))
+METRICAS_HOST = os.getenv('METRICAS_HOST', '127.0.0.1')
+METRICAS_ACTIVAS = METRICAS_PUERTO > 0
+
+PREFIJO = "zenalyze_"
+
+# Limites (segundos) de las cubetas de tiempo: 0.25 ms a 1 s
+LIMITES_TIEMPO = (0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0)
+
+DEBUG = True
+
+# ============================================
+# INSTRUMENTOS
+# ============================================
+
+class Histograma:
+    """Cuentas por cubeta fija; observar() no reserva memoria"""
+
+    __slots__ = ('nombre', 'ayuda', 'limites', 'cuentas', 'suma', 'total')
+
+    def __init__(self, nombre, ayuda, limites=LIMITES_TIEMPO):
+        self.nombre = nombre
+        self.ayuda = ayuda
+        self.limites = tuple(limites)
+        self.cuentas = [0] * (len(self.limites) + 1)  # La ultima es +Inf
+        self.suma = 0.0
+        self.total = 0
+
+    def observar(self, valor):
+        self.cuentas[bisect.bisect_left(self.limites, valor)] += 1
+        self.suma += valor
+        self.total += 1
+
+    def texto(self):
+        lineas = ["# HELP {} {}".format(self.nombre, self.ayuda),
+                  "# TYPE {} histogram".format(self.nombre)]
+        acumulado = 0
+        for limite, cuenta in zip(self.limites + (float('inf'),), self.cuentas):
+            acumulado += cuenta
+            le = "+Inf" if limite == float('inf') else repr(limite)
+            lineas.append('{}_bucket{{le="{}"}} {}'.format(self.nombre, le, acumulado))
+        lineas.append("{}_sum {!r}".format(self.nombre, self.suma))
+        lineas.append("{}_count {}".format(self.nombre, self.total))
+        return lineas
+
+
+class Contador:
+    """Contador con una etiqueta opcional (p. ej. sensor="dht11")"""
+
+    __slots__ = ('nombre', 'ayuda', 'etiqueta', 'valores')
+
+    def __init__(self, nombre, ayuda, etiqueta=None):
+        self.nombre = nombre
+        self.ayuda = ayuda
+        self.etiqueta = etiqueta
+        self.valores = {}
+
+    def incrementar(self, valor_etiqueta=None, n=1):
+        self.valores[valor_etiqueta] = self.valores.get(valor_etiqueta, 0) + n
+
+    def texto(self):
+        lineas = ["# HELP {} {}".format(self.nombre, self.ayuda),
+                  "# TYPE {} counter".format(self.nombre)]
+        for valor_etiqueta, cuenta in sorted(self.valores.items(), key=lambda x: str(x[0])):
+            if self.etiqueta and valor_etiqueta is not None:
+                lineas.append('{}{{{}="{}"}} {}'.format(self.nombre, self.etiqueta, valor_etiqueta, cuenta))
+            else:
+                lineas.append("{} {}".format(self.nombre, cuenta))
+        return lineas
+
+
+class Funcion:
+    """Valor leido al momento de exportar (contadores que ya lleva otro objeto)"""
+
+    __slots__ = ('nombre', 'ayuda', 'tipo', 'funcion')
+
+    def __init__(self, nombre, ayuda, funcion, tipo="gauge"):
+        self.nombre = nombre
+        self.ayuda = ayuda
+        self.tipo = tipo
+        self.funcion = funcion
+
+    def texto(self):
+        try:
+            valor = self.funcion()
+        except Exception:
+            return []
+        if valor is None:
+            return []
+        return ["# HELP {} {}".format(self.nombre, self.ayuda),
+                "# TYPE {} {}".format(self.nombre, self.tipo),
+                "{} {}".format(self.nombre, float(valor))]
+
+
+class _Nulo:
+    """Instrumento desactivado: cada llamada es un metodo vacio"""
+
+    __slots__ = ()
+
+    def observar(self, valor):
+        pass
+
+    def incrementar(self, valor_etiqueta=None, n=1):
+        pass
+
+
+NULO = _Nulo()
+
+# ============================================
+# REGISTRO Y SERVIDOR
+# ============================================
+
+class Metricas:
+    def __init__(self, activas=METRICAS_ACTIVAS, prefijo=PREFIJO):
+        self.activas = activas
+        self.prefijo = prefijo
+        self.instrumentos = []
+        self.servidor = None
+
+    def histograma(self, nombre, ayuda, limites=LIMITES_TIEMPO):
+        if not self.activas:
+            return NULO
+        h = Histograma(self.prefijo + nombre, ayuda, limites)
+        self.instrumentos.append(h)
+        return h
+
+    def contador(self, nombre, ayuda, etiqueta=None):
+        if not self.activas:
+            return NULO
+        c = Contador(self.prefijo + nombre, ayuda, etiqueta)
+        self.instrumentos.append(c)
+        return c
+
+    def funcion(self, nombre, ayuda, funcion, tipo="gauge"):
+        if self.activas:
+            self.instrumentos.append(Funcion(self.prefijo + nombre, ayuda, funcion, tipo))
+
+    def texto(self):
+        """Todas las metricas en formato de texto de Prometheus"""
+        lineas = []
+        for instrumento in self.instrumentos:
+            lineas.extend(instrumento.texto())
+        return "\n".join(lineas) + "\n"
+
+    def iniciar_servidor(self, puerto=METRICAS_PUERTO, host=METRICAS_HOST):
+        """Sirve /metrics en un hilo aparte"""
+        if not self.activas or self.servidor:
+            return
+        metricas = self
+
+        class Manejador(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] not in ("/metrics", "/"):
+                    self.send_error(404)
+                    return
+                cuerpo = metricas.texto().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(cuerpo)))
+                self.end_headers()
+                self.wfile.write(cuerpo)
+
+            def log_message(self, formato, *args):
+                pass
+
+        try:
+            self.servidor = ThreadingHTTPServer((host, puerto), Manejador)
+            self.servidor.daemon_threads = True
+        except OSError as e:
+            print("ERROR: Metricas no disponibles en {}:{} - {}".format(host, puerto, e))
+            return
+        threading.Thread(target=self.servidor.serve_forever, name="metricas", daemon=True).start()
+        if DEBUG:
+            print("OK: Metricas en http://{}:{}/metrics".format(host, puerto))
+
+    def detener(self):
+        if self.servidor:
+            self.servidor.shutdown()
+            self.servidor.server_close()
+            self.servidor = None
+
+# ============================================
+# METRICAS DE UN MONITOR
+# ============================================
+
+class MetricasMonitor:
+    """Instrumentos del loop de ejecutar() comunes a ambos monitores"""
+
+    def __init__(self, monitor, metricas=None):
+        self.registro = metricas or Metricas()
+        r = self.registro
+
+        # Etapas del loop
+        self.lectura = r.histograma("lectura_sensores_segundos", "Duracion de una lectura de todos los sensores")
+        self.entrada = r.histograma("entrada_segundos", "Procesamiento de eventos de botones y PIR")
+        self.dibujo = r.histograma("dibujo_segundos", "Dibujo del cuadro sin contar el envio por SPI")
+        self.spi = r.histograma("spi_segundos", "Envio del cuadro al display")
+        self.cuadro = r.histograma("cuadro_segundos", "Trabajo total por cuadro (sin la espera)")
+
+        # Fallos
+        self.errores = r.contador("errores_sensor_total", "Lecturas fallidas por sensor", "sensor")
+        self.respaldos = r.contador("valor_anterior_total", "Veces que se mostro el ultimo valor valido", "valor")
+
+        # Lo que ya cuentan otros objetos se lee al exportar
+        r.funcion("cuadros_total", "Cuadros dibujados", lambda: monitor.planificador.cuadros, "counter")
+        r.funcion("cuadros_perdidos_total", "Deadlines de cuadro saltados",
+                  lambda: monitor.planificador.perdidos, "counter")
+        r.funcion("spi_bytes_total", "Bytes enviados al display",
+                  lambda: monitor.salida.bytes_enviados if monitor.salida else None, "counter")
+        r.funcion("cuadros_omitidos_total", "Cuadros sin cambios que no se enviaron",
+                  lambda: monitor.salida.cuadros_omitidos if monitor.salida else None, "counter")
+        r.funcion("microfono_errores_total", "Lecturas fallidas del microfono",
+                  lambda: monitor.muestreador.errores if monitor.muestreador else None, "counter")
+        r.funcion("microfono_muestras_por_segundo", "Tasa real de muestreo del microfono",
+                  lambda: monitor.muestreador.tasa if monitor.muestreador else None)
+        r.funcion("subida_filas_total", "Lecturas subidas a PostgreSQL",
+                  lambda: monitor.subidor.subidas if monitor.subidor else None, "counter")
+        r.funcion("subida_spool_total", "Lecturas guardadas en el spool por falta de base",
+                  lambda: monitor.subidor.en_spool if monitor.subidor else None, "counter")
+
+    def iniciar(self):
+        self.registro.iniciar_servidor()
+
+    def detener(self):
+        self.registro.detener()
+
+# ============================================
+# MAIN - Costo de observar() activo y desactivado
+# ============================================
+
+if __name__ == '__main__':
+    n = 200000
+    for activas in (False, True):
+        r = Metricas(activas=activas)
+        h = r.histograma("prueba_segundos", "Prueba")
+        c = r.contador("prueba_total", "Prueba", "sensor")
+        inicio = time.perf_counter()
+        for i in range(n):
+            h.observar(0.003)
+            c.incrementar("dht11")
+        costo = (time.perf_counter() - inicio) / n
+        print("{:<12} observar()+incrementar(): {:.0f} ns".format(
+            "activas" if activas else "desactivadas", costo * 1e9))
+    print()
+    print(r.texto())
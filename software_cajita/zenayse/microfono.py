@@ -0,0 +1,284 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Muestreo del Microfono - Proyecto Zenalyze
+Lee el canal del microfono del ADS1115 lo mas rapido posible en un buffer
+circular y calcula RMS, pico y factor de cresta por ventana
+"""
+
+import json
+import math
+import os
+import random
+import threading
+import time
+from array import array
+from collections import namedtuple
+
+import numpy as np
+
+# ============================================
+# CONFIGURACION
+# ============================================
+
+# Maxima tasa del ADS1115 (muestras por segundo)
+TASA_ADS1115 = 860
+
+# Muestras por ventana de estadisticas (~0.3-0.5 s a la tasa real por I2C)
+VENTANA_MIC = int(os.getenv('VENTANA_MIC', 256))
+
+# Capacidad del buffer circular (muestras)
+CAPACIDAD_MIC = 4096
+
+# Linea base adaptativa (se guarda al salir y se carga al arrancar)
+ARCHIVO_LINEA_BASE = os.getenv('ARCHIVO_LINEA_BASE_MIC', 'data/linea_base_mic.json')
+ALFA_NIVEL = 0.01   # Por ventana: ~100 ventanas (~1 min) de constante de tiempo
+ALFA_RUIDO = 0.005
+
+# Derivar umbral_bajo/medio/alto del ruido observado en lugar de los fijos
+UMBRALES_ADAPTATIVOS = os.getenv('UMBRALES_ADAPTATIVOS', '0') == '1'
+
+DEBUG = True
+
+# ============================================
+# ESTADISTICAS DE VENTANA
+# ============================================
+
+# rms y pico son respecto al nivel base; media es el nivel DC de la ventana
+EstadisticasMic = namedtuple('EstadisticasMic', [
+    'rms', 'pico', 'cresta', 'media', 'valor', 'muestras', 'timestamp',
+])
+
+ESTADISTICAS_VACIAS = EstadisticasMic(0.0, 0.0, 0.0, 0.0, 0, 0, 0.0)
+
+# ============================================
+# CLASE MUESTREADOR
+# ============================================
+
+class MuestreadorMicrofono(threading.Thread):
+    def __init__(self, fuente, linea_base=None, lock_bus=None,
+                 ventana=VENTANA_MIC, capacidad=CAPACIDAD_MIC):
+        super().__init__(name="microfono", daemon=True)
+        self.fuente = fuente  # AnalogIn del ADS1115 o FuenteADCSimulada
+        self.linea_base = linea_base or LineaBaseMicrofono()
+        self.lock_bus = lock_bus or threading.Lock()
+        self.ventana = ventana
+        self.capacidad = capacidad
+        self.pausa = 0.0  # Segundos de descanso entre ventanas (modo reposo)
+        self.detener_evento = threading.Event()
+
+        # Buffer circular preasignado; la vista NumPy comparte la memoria
+        self.anillo = array('h', bytes(2 * capacidad))
+        self.vista = np.frombuffer(self.anillo, dtype=np.int16)
+        self.escritos = 0
+
+        # Ultimas estadisticas publicadas (inmutables)
+        self.estadisticas = ESTADISTICAS_VACIAS
+        self.errores = 0
+        self.tasa = 0.0
+
+    def run(self):
+        """Lee muestras sin pausa y calcula estadisticas por ventana"""
+        anillo = self.anillo
+        capacidad = self.capacidad
+        inicio_ventana = time.monotonic()
+
+        while not self.detener_evento.is_set():
+            try:
+                with self.lock_bus:
+                    valor = self.fuente.value
+            except Exception:
+                self.errores += 1
+                if DEBUG and self.errores % 100 == 1:
+                    print("DEBUG: Microfono error en lectura")
+                time.sleep(0.01)
+                continue
+
+            anillo[self.escritos % capacidad] = valor
+            self.escritos += 1
+            time.sleep(0)  # Ceder el bus al hilo de sensores
+
+            if self.escritos % self.ventana == 0:
+                ahora = time.monotonic()
+                self.tasa = self.ventana / max(ahora - inicio_ventana, 1e-6)
+                inicio_ventana = ahora
+                self.estadisticas = self.calcular_ventana()
+                if self.pausa:
+                    self.detener_evento.wait(self.pausa)
+                    inicio_ventana = time.monotonic()
+
+    def ultimas(self, n):
+        """Vista de las ultimas n muestras en orden (copia solo si da la vuelta)"""
+        n = min(n, self.escritos, self.capacidad)
+        fin = self.escritos % self.capacidad
+        if n <= fin:
+            return self.vista[fin - n:fin]
+        return np.concatenate((self.vista[self.capacidad - (n - fin):], self.vista[:fin]))
+
+    def calcular_ventana(self):
+        """RMS, pico y factor de cresta de la ultima ventana"""
+        x = self.ultimas(self.ventana).astype(np.float32)
+        media = float(np.mean(x))
+
+        # El nivel DC se sigue en linea; no hace falta calibrar al arrancar
+        nivel_base = self.linea_base.actualizar_nivel(media)
+        desviacion = x - np.float32(nivel_base)
+
+        rms = float(np.sqrt(np.mean(desviacion * desviacion)))
+        pico = float(np.max(np.abs(desviacion)))
+        cresta = pico / rms if rms > 0 else 0.0
+        self.linea_base.actualizar_ruido(rms)
+
+        return EstadisticasMic(rms=rms, pico=pico, cresta=cresta, media=media,
+                               valor=int(x[-1]), muestras=len(x), timestamp=time.time())
+
+    def detener(self, espera=1.0):
+        """Pide al hilo que termine y lo espera"""
+        self.detener_evento.set()
+        if self.is_alive():
+            self.join(espera)
+
+
+def clasificar_ruido(nivel, umbral_bajo, umbral_medio, umbral_alto):
+    """Nivel de ruido segun el RMS de la ventana"""
+    if nivel < umbral_bajo:
+        return "silencio"
+    elif nivel < umbral_medio:
+        return "bajo"
+    elif nivel < umbral_alto:
+        return "medio"
+    else:
+        return "alto"
+
+# ============================================
+# LINEA BASE ADAPTATIVA
+# ============================================
+
+class LineaBaseMicrofono:
+    """Nivel DC del microfono (EWMA) y distribucion del ruido de fondo"""
+
+    def __init__(self, alfa_nivel=ALFA_NIVEL, alfa_ruido=ALFA_RUIDO):
+        self.alfa_nivel = alfa_nivel
+        self.alfa_ruido = alfa_ruido
+        self.nivel = None
+        self.media_ruido = None
+        self.varianza_ruido = 0.0
+        self.ventanas = 0
+
+    def actualizar_nivel(self, media):
+        """Actualiza el nivel base con la media de una ventana y lo devuelve"""
+        if self.nivel is None:
+            self.nivel = media
+        else:
+            self.nivel += self.alfa_nivel * (media - self.nivel)
+        self.ventanas += 1
+        return self.nivel
+
+    def actualizar_ruido(self, rms):
+        """Media y varianza exponenciales del RMS de las ventanas"""
+        if self.media_ruido is None:
+            self.media_ruido = rms
+            return
+        diferencia = rms - self.media_ruido
+        incremento = self.alfa_ruido * diferencia
+        self.media_ruido += incremento
+        self.varianza_ruido = (1 - self.alfa_ruido) * (self.varianza_ruido + diferencia * incremento)
+
+    def umbrales(self, fijos):
+        """(bajo, medio, alto) derivados del ruido observado, o los fijos si aun no hay datos"""
+        if self.media_ruido is None or self.ventanas < 20:
+            return fijos
+        bajo = self.media_ruido + 3 * math.sqrt(self.varianza_ruido)
+        # Misma proporcion que los umbrales fijos 300/800/1500
+        return (bajo, bajo * 2.7, bajo * 5)
+
+    def guardar(self, ruta=ARCHIVO_LINEA_BASE):
+        """Guarda el estado en disco (escritura atomica)"""
+        try:
+            directorio = os.path.dirname(ruta)
+            if directorio and not os.path.exists(directorio):
+                os.makedirs(directorio)
+            temporal = ruta + ".tmp"
+            with open(temporal, 'w', encoding='utf-8') as f:
+                json.dump({"nivel": self.nivel, "media_ruido": self.media_ruido,
+                           "varianza_ruido": self.varianza_ruido,
+                           "ventanas": self.ventanas}, f)
+            os.replace(temporal, ruta)
+            return True
+        except Exception as e:
+            print("ERROR: No se pudo guardar la linea base del microfono - " + str(e))
+            return False
+
+    @classmethod
+    def cargar(cls, ruta=ARCHIVO_LINEA_BASE):
+        """Carga el estado guardado; si no existe empieza vacio"""
+        linea_base = cls()
+        try:
+            with open(ruta, encoding='utf-8') as f:
+                datos = json.load(f)
+            linea_base.nivel = datos.get("nivel")
+            linea_base.media_ruido = datos.get("media_ruido")
+            linea_base.varianza_ruido = datos.get("varianza_ruido", 0.0)
+            linea_base.ventanas = datos.get("ventanas", 0)
+            if DEBUG and linea_base.nivel is not None:
+                print("OK: Linea base del microfono cargada: {}".format(int(linea_base.nivel)))
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            print("ERROR: Linea base del microfono invalida, se recalcula - " + str(e))
+        return linea_base
+
+# ============================================
+# FUENTE SIMULADA
+# ============================================
+
+class FuenteADCSimulada:
+    """Imita un AnalogIn del ADS1115: nivel DC + ruido + rafagas de sonido"""
+
+    def __init__(self, nivel_base=13000, ruido=60, tasa=TASA_ADS1115, prob_rafaga=0.002):
+        self.nivel_base = nivel_base
+        self.ruido = ruido
+        self.periodo = 1.0 / tasa
+        self.prob_rafaga = prob_rafaga
+        self.rafaga_restante = 0
+        self.amplitud = 0
+        self.fase = 0.0
+
+    @property
+    def value(self):
+        time.sleep(self.periodo)  # Tiempo de conversion del ADC
+        valor = random.gauss(self.nivel_base, self.ruido)
+
+        if self.rafaga_restante == 0 and random.random() < self.prob_rafaga:
+            self.rafaga_restante = random.randint(100, 800)
+            self.amplitud = random.uniform(300, 3000)
+        if self.rafaga_restante:
+            self.rafaga_restante -= 1
+            self.fase += 0.7
+            valor += self.amplitud * math.sin(self.fase)
+
+        return int(max(-32768, min(32767, valor)))
+
+    @property
+    def voltage(self):
+        return self.value * 4.096 / 32767
+
+# ============================================
+# MAIN - Prueba con ADC simulado
+# ============================================
+
+if __name__ == '__main__':
+    fuente = FuenteADCSimulada()
+    muestreador = MuestreadorMicrofono(fuente)
+    muestreador.start()
+
+    try:
+        for i in range(10):
+            time.sleep(0.5)
+            e = muestreador.estadisticas
+            umbrales = muestreador.linea_base.umbrales((300, 800, 1500))
+            print("tasa={:4.0f} SPS  base={:7.1f}  rms={:7.1f}  pico={:7.1f}  cresta={:4.1f}  nivel={}".format(
+                muestreador.tasa, muestreador.linea_base.nivel or 0, e.rms, e.pico, e.cresta,
+                clasificar_ruido(e.rms, *umbrales)))
+    finally:
+        muestreador.detener()
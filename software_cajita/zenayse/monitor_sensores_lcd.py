@@ -7,32 +7,44 @@ Mandala interactiva con registro de estados de animo
 
 import time
 import sys
+import threading
 import os
 import socket
-import math
 from datetime import datetime
 from dotenv import load_dotenv
-import RPi.GPIO as GPIO
-import board
-import adafruit_dht
-import busio
-import adafruit_ads1x15.ads1115 as ADS
-from adafruit_ads1x15.analog_in import AnalogIn
-from luma.core.interface.serial import spi
-from luma.lcd.device import st7789
-from luma.core.render import canvas
 from PIL import Image, ImageDraw, ImageFont
 
-# Cargar configuracion
+# Cargar configuracion antes de los modulos que leen variables de entorno
 load_dotenv()
 
+from geometria_mandala import (GeometriaMandala, color_aire, color_luz, SIMETRIA,
+                               COLOR_MORADO, COLOR_AZUL_ANILLO, COLOR_BLANCO)
+from cache_cuadros import CacheCuadros
+from render_mandala import RenderMandala, RENDER_MANDALA
+from salida_lcd import SalidaLCD
+from atlas_texto import atlas_de
+from adquisicion import (LecturaSensores, HiloAdquisicion, RegistroTiempos, SENSORES_EN_HILO,
+                         voltaje_a_ppm)
+from entradas import EntradaGPIO
+from hardware import crear_hardware, MODO_HARDWARE
+from memoria_sensores import LectorMemoria, EntradaCompartida, FUENTE_SENSORES
+from metricas import MetricasMonitor
+from servidor_vivo import ServidorVivo
+from planificador import PlanificadorCuadros, FPS_OBJETIVO
+from reposo import MaquinaReposo, MODO_REPOSO
+from registro_animo import EscritorEstados, ENCABEZADO_ESTADOS
+from ventanas import ContextoAmbiental, ENCABEZADO_CONTEXTO, fila_contexto
+from microfono import (MuestreadorMicrofono, LineaBaseMicrofono, clasificar_ruido,
+                       TASA_ADS1115, UMBRALES_ADAPTATIVOS)
+from subida_db import SubidorLecturas, SUBIR_LECTURAS
+from compresion_lecturas import CompresorLecturas, COMPRIMIR_LECTURAS
+from almacen_lecturas import AlmacenLecturas, GUARDAR_HISTORIAL
+from agregados import Agregador, fila_csv, GUARDAR_AGREGADOS, ARCHIVO_AGREGADOS, ENCABEZADO_AGREGADOS
+
 # ============================================
 # CONFIGURACION
 # ============================================
 
-i2c = board.I2C()
-ads = ADS.ADS1115(i2c)
-
 # GPIO Sensores
 PIN_DHT11 = int(os.getenv('PIN_DHT11', 23))
 PIN_MQ135 = int(os.getenv('PIN_MQ135', 26))
@@ -51,6 +63,9 @@ PIN_RST = int(os.getenv('PIN_DISPLAY_RST', 25))
 # Microfono
 CANAL_MIC = 1
 
+# Animacion: grados por segundo (1 grado por cuadro a 40 FPS)
+VELOCIDAD_ROTACION = float(os.getenv('VELOCIDAD_ROTACION', 40))
+
 DEBUG = True
 
 # ============================================
@@ -59,13 +74,23 @@ DEBUG = True
 
 class MandalaAvanzada:
     def __init__(self):
+        self.hw = crear_hardware()  # Real o simulado segun MODO_HARDWARE
+        self.gpio = None
         self.device = None
+        self.salida = None
         self.dht = None
         self.ldr = None
         self.mic = None
+        self.muestreador = None
+        self.lector = None  # LectorMemoria si FUENTE_SENSORES=demonio
+        self.desde_demonio = False  # Sin canales locales: el demonio lee los sensores
+        self.demonio_caido = False  # El demonio dejo de publicar (lecturas congeladas)
+        self.lectores_viejos = []  # Segmentos de un demonio anterior; se cierran al salir
+        self.lock_ads = threading.Lock()  # El ADS1115 lo comparten dos hilos
         self.mq135_channel = None
         self.font_ip = None
         self.font_estado = None
+        self.atlas = {}  # id(fuente) -> AtlasTexto
         
         # Sensores
         self.temp = 22.0
@@ -74,21 +99,59 @@ class MandalaAvanzada:
         self.lux = 300
         self.nivel_ruido = "silencio"
         self.valor_mic = 0
-        self.nivel_base_mic = 0
+        self.linea_base_mic = None
         self.diferencia_mic = 0
         self.movimiento = False
         
+        # Ultima lectura publicada (el dibujo solo lee esta referencia)
+        self.lectura = self.crear_lectura()
+        self.hilo_sensores = None
+        self.tiempos_cuadro = RegistroTiempos()
+        
+        # Reposo por PIR, botones y luz (None si MODO_REPOSO=0); un flanco corta la espera del cuadro
+        self.reposo = MaquinaReposo() if MODO_REPOSO else None
+        self.planificador = PlanificadorCuadros(despertador=self.reposo.despertador if self.reposo else None)
+        self.pantalla_encendida = True
+        
+        # Tiempos por etapa y contadores (sin costo si METRICAS_PUERTO=0)
+        self.metricas = MetricasMonitor(self)
+        self.tiempo_spi = 0.0
+        
+        # Ultima lectura por HTTP y SSE para el dashboard (desactivado si VIVO_PUERTO=0)
+        self.vivo = ServidorVivo()
+        
+        # Banda muerta antes de subir a la base o al hub (None = pasan todas las lecturas)
+        self.compresor = CompresorLecturas() if COMPRIMIR_LECTURAS else None
+        
+        # Subida a PostgreSQL en segundo plano (None si esta desactivada);
+        # con compresion no se espacian las filas: ya decide la banda muerta
+        self.subidor = None
+        if SUBIR_LECTURAS:
+            self.subidor = SubidorLecturas(intervalo_lecturas=0) if self.compresor else SubidorLecturas()
+        
+        # Historial local de todas las lecturas (archivo circular mapeado)
+        self.historial = None
+        
+        # Agregados por minuto/hora/dia, escritos en segundo plano
+        self.agregador = None
+        self.escritor_agregados = None
+        if GUARDAR_AGREGADOS:
+            self.escritor_agregados = EscritorEstados(ARCHIVO_AGREGADOS, ENCABEZADO_AGREGADOS)
+            self.agregador = Agregador(
+                lambda bloque: self.escritor_agregados.registrar(fila_csv(bloque)))
+        
         # Estados de animo
         self.estado_actual = None  # "bien", "neutral", "mal"
         self.tiempo_mostrar_estado = 0
         self.duracion_mostrar_estado = 3.0  # segundos
-        self.ultimo_check_botones = 0
-        self.debounce_time = 0.3  # Anti-rebote
+        self.escritor_estados = EscritorEstados(encabezado=ENCABEZADO_ESTADOS + ENCABEZADO_CONTEXTO)
+        
+        # Medias, extremos y movimiento de los ultimos minutos para cada estado
+        self.contexto = ContextoAmbiental()
         
-        # Estados de los botones
-        self.btn1 = False
-        self.btn2 = False
-        self.btn3 = False
+        # Botones y PIR por interrupcion (anti-rebote por pin)
+        self.entradas = None
+        self.estados_boton = {PIN_BTN1: "bien", PIN_BTN2: "neutral", PIN_BTN3: "mal"}
         
         # Cache de valores
         self.temp_anterior = 22.0
@@ -105,7 +168,10 @@ class MandalaAvanzada:
         self.umbral_alto = 1500
         
         # Estado
-        self.rotation = 0
+        self.rotation = 0.0
+        self.geometria = GeometriaMandala()
+        self.render_mandala = RenderMandala(self.geometria) if RENDER_MANDALA == 'numpy' else None
+        self.cache_cuadros = CacheCuadros()
         self.tiempo_inicio = 0
         self.mostrando_splash = True
         self.ip_address = self.obtener_ip()
@@ -114,6 +180,7 @@ class MandalaAvanzada:
         # Control de tiempo
         self.ultimo_update_sensores = 0
         self.intervalo_sensores = 0.3
+        self.intervalo_sensores_base = self.intervalo_sensores  # El reposo lo estira
         
     def obtener_ip(self):
         """Obtiene la IP del dispositivo"""
@@ -134,66 +201,42 @@ class MandalaAvanzada:
         except:
             self.font_ip = ImageFont.load_default()
             self.font_estado = ImageFont.load_default()
+        
+        # Textos del estado de animo pre-rasterizados con sus medidas
+        atlas_de(self.atlas, self.font_estado, textos_fijos=("BIEN", "NEUTRAL", "MAL"))
     
     def guardar_estado_animo(self, estado):
-        """Guarda el estado de animo en la base de datos"""
-        try:
-            timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-            
-            # Crear directorio si no existe
-            if not os.path.exists('data'):
-                os.makedirs('data')
-            
-            # Guardar en archivo CSV
-            filename = 'data/estados_animo.csv'
-            file_exists = os.path.exists(filename)
-            
-            with open(filename, 'a', encoding='utf-8') as f:
-                if not file_exists:
-                    f.write("timestamp,estado,temperatura,humedad,co2,luz,ruido\n")
-                
-                f.write(f"{timestamp},{estado},{self.temp:.1f},{self.hum:.1f},{self.ppm_co2},{self.lux},{self.nivel_ruido}\n")
-            
-            print(f"Estado '{estado}' guardado: {timestamp}")
-            return True
-            
-        except Exception as e:
-            print(f"ERROR: No se pudo guardar estado - {str(e)}")
+        """Encola el estado de animo; el escritor lo guarda en segundo plano"""
+        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        lectura = self.lectura
+        
+        fila = f"{timestamp},{estado},{lectura.temp:.1f},{lectura.hum:.1f},{lectura.ppm_co2},{lectura.lux},{lectura.nivel_ruido}"
+        fila += fila_contexto(self.contexto.resumen(time.time()))
+        if not self.escritor_estados.registrar(fila):
+            print("ERROR: Cola de estados llena, estado descartado")
             return False
-    
-    def verificar_botones(self):
-        """Verifica el estado de los botones"""
-        ahora = time.time()
         
-        # Anti-rebote
-        if ahora - self.ultimo_check_botones < self.debounce_time:
-            return
+        # Con METODO_SUBIDA=hub el estado tambien va a la base de la flota
+        if self.subidor:
+            self.subidor.agregar_estado(estado, lectura)
+        self.vivo.publicar_estado(estado)
         
+        if DEBUG:
+            print(f"Estado '{estado}' encolado: {timestamp}")
+        return True
+    
+    def verificar_botones(self):
+        """Procesa los eventos de botones y PIR pendientes (no bloquea)"""
         try:
-            # Leer botones (invertir porque usan pull-up)
-            btn1_actual = not GPIO.input(PIN_BTN1)
-            btn2_actual = not GPIO.input(PIN_BTN2)
-            btn3_actual = not GPIO.input(PIN_BTN3)
-            
-            # BTN1 - BIEN
-            if btn1_actual and not self.btn1:
-                self.registrar_estado("bien")
-                self.ultimo_check_botones = ahora
-            
-            # BTN2 - NEUTRAL
-            if btn2_actual and not self.btn2:
-                self.registrar_estado("neutral")
-                self.ultimo_check_botones = ahora
-            
-            # BTN3 - MAL
-            if btn3_actual and not self.btn3:
-                self.registrar_estado("mal")
-                self.ultimo_check_botones = ahora
-            
-            # Actualizar estados
-            self.btn1 = btn1_actual
-            self.btn2 = btn2_actual
-            self.btn3 = btn3_actual
+            for evento in self.entradas.leer_eventos():
+                if self.reposo:
+                    self.reposo.actividad()  # Sin GPIO propio (demonio) el aviso llega por aca
+                if evento.pin == PIN_PIR:
+                    self.movimiento = evento.valor
+                    if DEBUG:
+                        print("DEBUG: PIR " + ("movimiento" if evento.valor else "reposo"))
+                elif evento.pin in self.estados_boton:
+                    self.registrar_estado(self.estados_boton[evento.pin])
             
         except Exception as e:
             if DEBUG:
@@ -204,34 +247,65 @@ class MandalaAvanzada:
         self.estado_actual = estado
         self.tiempo_mostrar_estado = time.time()
         
-        # Guardar en base de datos
+        # Guardar (solo encola, no toca la SD en este hilo)
         self.guardar_estado_animo(estado)
         
         # Feedback en consola
         print(f"\nEstado registrado: {estado.upper()}\n")
     
-    def calibrar_microfono(self):
-        """Calibra el microfono"""
-        if DEBUG:
-            print("INFO: Calibrando microfono...")
-        
-        valores = []
-        for i in range(50):
-            if self.mic:
-                valores.append(self.mic.value)
-            time.sleep(0.02)
-        
-        if valores:
-            self.nivel_base_mic = sum(valores) / len(valores)
-    
     def inicializar(self):
         """Inicializa todos los componentes"""
         print("CONFIG: Inicializando componentes...\n")
+        self.metricas.iniciar()
+        self.vivo.iniciar()
         
         self.cargar_fuentes()
+        self.escritor_estados.start()
+        if self.subidor:
+            self.subidor.start()
+        if self.escritor_agregados:
+            self.escritor_agregados.start()
+        if GUARDAR_HISTORIAL:
+            try:
+                self.historial = AlmacenLecturas()
+            except Exception as e:
+                print("ERROR: Historial no disponible - " + str(e))
+        
+        # Sensores: propios o los del demonio por memoria compartida
+        if FUENTE_SENSORES == 'demonio':
+            if not self.conectar_demonio():
+                return False
+        else:
+            self.inicializar_sensores()
         
+        # Display
+        print("INFO: Inicializando Display...", end=" ")
+        try:
+            self.device = self.hw.display(PIN_DC, PIN_RST)
+            self.salida = SalidaLCD(self.device)
+            self.sensores_ok['Display'] = True
+            print("OK\n")
+        except Exception as e:
+            self.sensores_ok['Display'] = False
+            print("ERROR - " + str(e))
+            return False
+        
+        self.tiempo_inicio = time.time()
+        print("="*60)
+        print("OK: INICIALIZACION COMPLETADA")
+        print("="*60)
+        print("\nBotones de Estado de Animo:")
+        print("  - BTN1 (GPIO 16): BIEN")
+        print("  - BTN2 (GPIO 20): NEUTRAL")
+        print("  - BTN3 (GPIO 21): MAL")
+        print("="*60 + "\n")
+        return True
+    
+    def inicializar_sensores(self):
+        """Abre el GPIO, el DHT11, el ADS1115 y el microfono"""
         # GPIO
         print("INFO: Configurando GPIO...")
+        GPIO = self.gpio = self.hw.gpio()
         GPIO.setwarnings(False)
         GPIO.setmode(GPIO.BCM)
         GPIO.setup(PIN_MQ135, GPIO.IN)
@@ -241,12 +315,21 @@ class MandalaAvanzada:
         GPIO.setup(PIN_BTN1, GPIO.IN, pull_up_down=GPIO.PUD_UP)
         GPIO.setup(PIN_BTN2, GPIO.IN, pull_up_down=GPIO.PUD_UP)
         GPIO.setup(PIN_BTN3, GPIO.IN, pull_up_down=GPIO.PUD_UP)
+        
+        # Deteccion de flancos en lugar de leer los pines cada cuadro
+        self.movimiento = bool(GPIO.input(PIN_PIR))
+        self.entradas = EntradaGPIO(GPIO, al_encolar=self.reposo.actividad if self.reposo else None)
+        self.entradas.agregar_boton(PIN_BTN1)
+        self.entradas.agregar_boton(PIN_BTN2)
+        self.entradas.agregar_boton(PIN_BTN3)
+        self.entradas.agregar_sensor(PIN_PIR)
+        self.hw.iniciar_actividad(PIN_PIR, [PIN_BTN1, PIN_BTN2, PIN_BTN3])
         print("OK: GPIO y botones configurados\n")
         
         # DHT11
         print("INFO: Inicializando DHT11...", end=" ")
         try:
-            self.dht = adafruit_dht.DHT11(board.D23, use_pulseio=False)
+            self.dht = self.hw.dht11(PIN_DHT11)
             self.sensores_ok['DHT11'] = True
             print("OK")
         except Exception as e:
@@ -256,50 +339,61 @@ class MandalaAvanzada:
         # ADS1115
         print("INFO: Inicializando ADS1115...", end=" ")
         try:
-            self.ldr = AnalogIn(ads, 0)
-            self.mq135_channel = AnalogIn(ads, 2)
-            self.mic = AnalogIn(ads, CANAL_MIC)
+            self.ldr = self.hw.canal_analogico(0)
+            self.mq135_channel = self.hw.canal_analogico(2)
+            self.mic = self.hw.canal_analogico(CANAL_MIC)
+            self.hw.configurar_tasa_adc(TASA_ADS1115)  # Conversiones rapidas para el microfono
             self.sensores_ok['ADS1115'] = True
             print("OK")
         except Exception as e:
             self.sensores_ok['ADS1115'] = False
             print("ERROR - " + str(e))
         
-        # Calibrar microfono
+        # Sin calibracion bloqueante: la linea base guardada se sigue ajustando en linea
         if self.mic:
-            self.calibrar_microfono()
-        
-        # Display
-        print("INFO: Inicializando Display...", end=" ")
+            self.linea_base_mic = LineaBaseMicrofono.cargar()
+            self.muestreador = MuestreadorMicrofono(self.mic, self.linea_base_mic, self.lock_ads)
+            self.muestreador.start()
+    
+    def conectar_demonio(self):
+        """Lecturas y flancos desde demonio_sensores.py, sin tocar el bus"""
         try:
-            serial = spi(port=0, device=0, gpio_DC=PIN_DC, gpio_RST=PIN_RST)
-            self.device = st7789(serial, width=240, height=240, rotate=3)
-            self.sensores_ok['Display'] = True
-            print("OK\n")
-        except Exception as e:
-            self.sensores_ok['Display'] = False
-            print("ERROR - " + str(e))
+            self.lector = LectorMemoria()
+        except (FileNotFoundError, ValueError) as e:
+            print("ERROR: Demonio de sensores no disponible - " + str(e))
             return False
-        
-        self.tiempo_inicio = time.time()
-        print("="*60)
-        print("OK: INICIALIZACION COMPLETADA")
-        print("="*60)
-        print("\nBotones de Estado de Animo:")
-        print("  - BTN1 (GPIO 16): BIEN")
-        print("  - BTN2 (GPIO 20): NEUTRAL")
-        print("  - BTN3 (GPIO 21): MAL")
-        print("="*60 + "\n")
+        self.entradas = EntradaCompartida(self.lector)
+        self.desde_demonio = True
+        # El demonio abre el DHT11 y el ADS1115: estan bien si sigue publicando
+        self.demonio_caido = not self.lector.al_dia()
+        self.sensores_ok['DHT11'] = not self.demonio_caido
+        self.sensores_ok['ADS1115'] = not self.demonio_caido
+        print("OK: Sensores desde el demonio (memoria compartida)\n")
         return True
     
     def leer_sensores(self):
-        """Lee todos los sensores"""
+        """Lee los sensores si paso el intervalo (modo sin hilo)"""
         ahora = time.time()
         
         if ahora - self.ultimo_update_sensores < self.intervalo_sensores:
             return
         
         self.ultimo_update_sensores = ahora
+        self.muestrear_sensores()
+    
+    def crear_lectura(self):
+        """Foto inmutable del estado actual de los sensores"""
+        return LecturaSensores(temp=self.temp, hum=self.hum, ppm_co2=self.ppm_co2,
+                               lux=self.lux, nivel_ruido=self.nivel_ruido,
+                               movimiento=self.movimiento, timestamp=time.time(),
+                               valor_mic=self.valor_mic, diferencia_mic=self.diferencia_mic)
+    
+    def muestrear_sensores(self):
+        """Lee todos los sensores y publica la lectura"""
+        if self.lector:
+            self.muestrear_memoria()
+            return
+        inicio = time.perf_counter()
         
         # DHT11
         if self.dht:
@@ -314,65 +408,118 @@ class MandalaAvanzada:
                 else:
                     self.temp = self.temp_anterior
                     self.hum = self.hum_anterior
+                    self.metricas.respaldos.incrementar("temp")
             except:
                 self.temp = self.temp_anterior
                 self.hum = self.hum_anterior
+                self.metricas.errores.incrementar("dht11")
+                self.metricas.respaldos.incrementar("temp")
         
-        # PIR
-        try:
-            self.movimiento = bool(GPIO.input(PIN_PIR))
-        except:
-            pass
+        # PIR: lo actualizan los eventos de flanco en verificar_botones
         
         # LDR
         if self.ldr:
             try:
-                voltaje = self.ldr.voltage
+                with self.lock_ads:
+                    voltaje = self.ldr.voltage
                 if voltaje > 0:
                     self.lux = int((voltaje / 3.3) * 1000)
                     self.lux_anterior = self.lux
                 else:
                     self.lux = self.lux_anterior
+                    self.metricas.respaldos.incrementar("lux")
             except:
                 self.lux = self.lux_anterior
+                self.metricas.errores.incrementar("ldr")
+                self.metricas.respaldos.incrementar("lux")
         
         # MQ-135
         if self.mq135_channel:
             try:
-                voltaje = self.mq135_channel.voltage
+                with self.lock_ads:
+                    voltaje = self.mq135_channel.voltage
                 if voltaje > 0:
                     self.ppm_co2 = self.voltaje_a_ppm(voltaje)
             except:
-                pass
-        
-        # Microfono
-        if self.mic:
+                self.metricas.errores.incrementar("mq135")
+        
+        # Microfono: estadisticas de la ultima ventana del muestreador
+        if self.muestreador:
+            estadisticas = self.muestreador.estadisticas
+            if estadisticas.muestras:
+                self.valor_mic = estadisticas.valor
+                self.diferencia_mic = estadisticas.rms
+                self.nivel_ruido = clasificar_ruido(estadisticas.rms, *self.umbrales_ruido())
+        
+        self.publicar_lectura(self.crear_lectura())
+        self.metricas.lectura.observar(time.perf_counter() - inicio)
+    
+    def revisar_demonio(self):
+        """Marca los sensores caidos si el demonio dejo de publicar; si se reinicio, reabre el segmento"""
+        if self.lector.reemplazado():
             try:
-                self.valor_mic = self.mic.value
-                self.diferencia_mic = abs(self.valor_mic - self.nivel_base_mic)
-                
-                if self.diferencia_mic < self.umbral_bajo:
-                    self.nivel_ruido = "silencio"
-                elif self.diferencia_mic < self.umbral_medio:
-                    self.nivel_ruido = "bajo"
-                elif self.diferencia_mic < self.umbral_alto:
-                    self.nivel_ruido = "medio"
-                else:
-                    self.nivel_ruido = "alto"
-            except:
-                pass
+                nuevo = LectorMemoria()
+            except (FileNotFoundError, ValueError):
+                nuevo = None
+            if nuevo:
+                # Otro hilo puede estar leyendo el segmento anterior: se cierra al salir
+                self.lectores_viejos.append(self.lector)
+                self.lector = nuevo
+                self.entradas = EntradaCompartida(nuevo)
+                print("INFO: Demonio de sensores reiniciado (pid {}), segmento reabierto".format(nuevo.pid))
+        
+        caido = not self.lector.al_dia()
+        if caido != self.demonio_caido:
+            if caido:
+                print("ERROR: Demonio de sensores sin publicar, lecturas congeladas")
+            else:
+                print("OK: Demonio de sensores publicando de nuevo")
+            self.demonio_caido = caido
+            self.sensores_ok['DHT11'] = not caido
+            self.sensores_ok['ADS1115'] = not caido
+        return not caido
+    
+    def muestrear_memoria(self):
+        """Toma la ultima lectura del demonio de sensores (solo si es nueva)"""
+        if not self.revisar_demonio():
+            return
+        inicio = time.perf_counter()
+        lectura = self.lector.leer()
+        if lectura is None or lectura.timestamp == self.lectura.timestamp:
+            return
+        self.publicar_lectura(lectura)
+        self.metricas.lectura.observar(time.perf_counter() - inicio)
+    
+    def publicar_lectura(self, lectura):
+        """Publica la lectura para el dibujo y para los que la guardan o la suben"""
+        # Asignar la referencia es atomico
+        self.lectura = lectura
+        self.vivo.publicar(lectura)
+        # Los promedios usan todas las muestras
+        self.contexto.agregar(lectura)
+        if self.agregador:
+            self.agregador.agregar(lectura)
+        if self.historial is not None:
+            self.historial.agregar(lectura)  # Resolucion completa, sin banda muerta
+        if self.compresor and not self.compresor.filtrar(lectura):
+            return
+        if self.subidor:
+            self.subidor.agregar(lectura)
+    
+    def umbrales_ruido(self):
+        """Umbrales fijos o derivados del ruido observado"""
+        fijos = (self.umbral_bajo, self.umbral_medio, self.umbral_alto)
+        if UMBRALES_ADAPTATIVOS and self.linea_base_mic:
+            return self.linea_base_mic.umbrales(fijos)
+        return fijos
     
     def voltaje_a_ppm(self, voltaje):
         """Convierte voltaje a PPM"""
-        if voltaje <= self.voltaje_aire_limpio:
-            return 400
-        ppm = 400 + ((voltaje - self.voltaje_aire_limpio) / 
-                     (self.voltaje_max - self.voltaje_aire_limpio)) * 2100
-        return int(min(ppm, 3000))
+        return voltaje_a_ppm(voltaje, self.voltaje_aire_limpio, self.voltaje_max)
     
-    def obtener_color_temperatura(self):
+    def obtener_color_temperatura(self, lectura):
         """Obtiene color RGB segun temperatura"""
-        temp = self.temp
+        temp = lectura.temp
         if temp < 18:
             return (100, 150, 220)  # Azul
         elif temp < 22:
@@ -384,13 +531,13 @@ class MandalaAvanzada:
         else:
             return (220, 100, 150)  # Rosa/Magenta
     
-    def obtener_color_ruido(self):
+    def obtener_color_ruido(self, lectura):
         """Obtiene color segun nivel de ruido"""
-        if self.nivel_ruido == "silencio":
+        if lectura.nivel_ruido == "silencio":
             return (100, 220, 180)  # Verde
-        elif self.nivel_ruido == "bajo":
+        elif lectura.nivel_ruido == "bajo":
             return (150, 200, 255)  # Azul claro
-        elif self.nivel_ruido == "medio":
+        elif lectura.nivel_ruido == "medio":
             return (200, 150, 255)  # Morado
         else:
             return (255, 150, 150)  # Rosa
@@ -438,14 +585,15 @@ class MandalaAvanzada:
         
         # Dibujar texto centrado
         try:
-            bbox = draw.textbbox((0, 0), texto, font=self.font_estado)
+            atlas = atlas_de(self.atlas, self.font_estado)
+            bbox = atlas.caja(texto)
             text_width = bbox[2] - bbox[0]
             text_height = bbox[3] - bbox[1]
             
             text_x = cx - text_width // 2
             text_y = cy - text_height // 2
             
-            draw.text((text_x, text_y), texto, fill="white", font=self.font_estado)
+            atlas.dibujar(draw, (text_x, text_y), texto, "white")
         except:
             # Fallback
             draw.text((cx - 25, cy - 10), texto, fill="white", font=self.font_ip)
@@ -484,116 +632,175 @@ class MandalaAvanzada:
         y += 18
         draw.text((25, y), "BTN3: Mal", fill="red", font=self.font_ip)
     
-    def dibujar_mandala(self, draw):
+    def dibujar_mandala(self, draw, lectura):
         """Dibuja la mandala interactiva"""
-        w, h = 240, 240
-        cx, cy = w // 2, h // 2
-        maxR = min(w, h) // 2 - 20
+        g = self.geometria
+        rot = int(self.rotation) % SIMETRIA
         
         # Colores
-        color_temp = self.obtener_color_temperatura()
-        color_ruido = self.obtener_color_ruido()
-        temp_hex = "#{:02x}{:02x}{:02x}".format(*color_temp)
-        ruido_hex = "#{:02x}{:02x}{:02x}".format(*color_ruido)
-        
-        # Color del aire (verde, amarillo, rojo)
-        if self.ppm_co2 < 600:
-            air_hex = "#10B981"  # Verde
-        elif self.ppm_co2 < 1000:
-            air_hex = "#F59E0B"  # Amarillo
-        else:
-            air_hex = "#EF4444"  # Rojo
+        color_temp = self.obtener_color_temperatura(lectura)
+        color_ruido = self.obtener_color_ruido(lectura)
         
         # Circulo exterior (temperatura) - Rosa/Morado/Azul
-        ext_radius = int(maxR * 0.90)
-        draw.ellipse([(cx - ext_radius, cy - ext_radius),
-                      (cx + ext_radius, cy + ext_radius)],
-                     outline=temp_hex, width=3)
+        draw.ellipse(g.caja_exterior, outline=color_temp, width=3)
         
         # Triangulos (humedad) - Morado
-        triangles = 6
-        for i in range(triangles):
-            angle = (i / triangles) * math.pi * 2 + (self.rotation * math.pi / 180)
-            r1 = maxR * 0.75
-            r2 = maxR * 0.85
-            
-            x1 = cx + math.cos(angle) * r1
-            y1 = cy + math.sin(angle) * r1
-            x2 = cx + math.cos(angle + 0.35) * r2
-            y2 = cy + math.sin(angle + 0.35) * r2
-            x3 = cx + math.cos(angle + 0.70) * r1
-            y3 = cy + math.sin(angle + 0.70) * r1
-            
-            morado = "#A855F7"
-            draw.polygon([(int(x1), int(y1)), (int(x2), int(y2)), (int(x3), int(y3))],
-                         outline=morado, fill=None)
+        for poligono in g.triangulos[rot]:
+            draw.polygon(poligono, outline=COLOR_MORADO, fill=None)
         
         # Petales (CO2/Aire) - Verdes/Amarillos/Rojos
-        petals = 12
-        for i in range(petals):
-            angle = (i / petals) * math.pi * 2 + (self.rotation * math.pi / 180)
-            petal_len = maxR * 0.70
-            
-            x1 = cx + math.cos(angle) * petal_len
-            y1 = cy + math.sin(angle) * petal_len
-            x2 = cx + math.cos(angle) * (petal_len * 0.3)
-            y2 = cy + math.sin(angle) * (petal_len * 0.3)
-            
-            draw.line([(int(x2), int(y2)), (int(x1), int(y1))],
-                     fill=air_hex, width=2)
+        air_color = color_aire(lectura.ppm_co2)
+        for linea in g.petalos[rot]:
+            draw.line(linea, fill=air_color, width=2)
         
         # Anillos de humedad - Azul
-        rings = max(3, min(8, int(self.hum / 15)))
-        for i in range(1, rings + 1):
-            ring_r = int(maxR * (0.3 + (i / rings) * 0.25))
-            draw.ellipse([(cx - ring_r, cy - ring_r),
-                         (cx + ring_r, cy + ring_r)],
-                        outline="#60A5FA", width=1)
+        for caja in g.anillos[g.cantidad_anillos(lectura.hum)]:
+            draw.ellipse(caja, outline=COLOR_AZUL_ANILLO, width=1)
         
         # Circulo central (ruido) - Rosa/Morado
-        central_r = int(maxR * 0.20)
-        draw.ellipse([(cx - central_r, cy - central_r),
-                     (cx + central_r, cy + central_r)],
-                    outline=ruido_hex, fill=None, width=3)
+        draw.ellipse(g.caja_central, outline=color_ruido, fill=None, width=3)
         
         # Punto central - Blanco
-        punto_r = 3
-        draw.ellipse([(cx - punto_r, cy - punto_r),
-                     (cx + punto_r, cy + punto_r)],
-                    fill="white")
+        draw.ellipse(g.caja_punto, fill=COLOR_BLANCO)
         
         # Luz (circulos internos) - Amarillo/Azul
-        if self.lux > 200:
-            luz_color = "#FDE047"  # Amarillo
-        else:
-            luz_color = "#3B82F6"  # Azul
-        
-        luz_r = int(maxR * 0.08)
-        draw.ellipse([(cx - luz_r, cy - luz_r),
-                     (cx + luz_r, cy + luz_r)],
-                    outline=luz_color, width=2)
-        
-        # Dibujar texto de estado si esta activo
-        self.dibujar_texto_estado(draw)
+        draw.ellipse(g.caja_luz, outline=color_luz(lectura.lux), width=2)
+    
+    def dibujar_mandala_numpy(self, lectura):
+        """Igual que dibujar_mandala pero con el render NumPy; devuelve una imagen nueva"""
+        self.render_mandala.dibujar(int(self.rotation),
+                                    self.geometria.cantidad_anillos(lectura.hum),
+                                    self.obtener_color_temperatura(lectura),
+                                    color_aire(lectura.ppm_co2),
+                                    self.obtener_color_ruido(lectura),
+                                    color_luz(lectura.lux))
+        return self.render_mandala.imagen()
+    
+    def clave_cuadro(self, lectura):
+        """Clave del cache: rotacion reducida por simetria y estado cuantizado"""
+        return (int(self.rotation) % SIMETRIA,
+                self.obtener_color_temperatura(lectura),
+                lectura.nivel_ruido,
+                color_aire(lectura.ppm_co2),
+                self.geometria.cantidad_anillos(lectura.hum),
+                color_luz(lectura.lux))
+    
+    def obtener_cuadro_mandala(self, lectura):
+        """Devuelve el cuadro de la mandala, del cache o dibujandolo"""
+        clave = self.clave_cuadro(lectura)
+        imagen = self.cache_cuadros.obtener(clave)
+        
+        if imagen is None:
+            if self.render_mandala:
+                imagen = self.dibujar_mandala_numpy(lectura)
+            else:
+                imagen = Image.new(self.device.mode, self.device.size, "black")
+                self.dibujar_mandala(ImageDraw.Draw(imagen), lectura)
+            self.cache_cuadros.guardar(clave, imagen)
+        
+        return imagen
+    
+    def enviar_cuadro(self, imagen):
+        """Manda el cuadro al display y mide el tiempo de SPI"""
+        inicio = time.perf_counter()
+        self.salida.mostrar(imagen)
+        self.tiempo_spi = time.perf_counter() - inicio
+        self.metricas.spi.observar(self.tiempo_spi)
     
     def dibujar_pantalla(self):
         """Dibuja la pantalla"""
         try:
-            with canvas(self.device) as draw:
-                tiempo_transcurrido = time.time() - self.tiempo_inicio
-                
-                if self.mostrando_splash and tiempo_transcurrido < 4:
-                    self.dibujar_splash(draw)
-                else:
-                    self.mostrando_splash = False
-                    draw.rectangle([(0, 0), (240, 240)], fill="black")
-                    self.dibujar_mandala(draw)
+            tiempo_transcurrido = time.time() - self.tiempo_inicio
+            
+            if self.mostrando_splash and tiempo_transcurrido < 4:
+                imagen = Image.new(self.device.mode, self.device.size, "black")
+                self.dibujar_splash(ImageDraw.Draw(imagen))
+                self.enviar_cuadro(imagen)
+                return
+            
+            self.mostrando_splash = False
+            imagen = self.obtener_cuadro_mandala(self.lectura)
+            
+            # El texto de estado va encima de una copia para no ensuciar el cache
+            if self.estado_actual:
+                imagen = imagen.copy()
+                self.dibujar_texto_estado(ImageDraw.Draw(imagen))
+            
+            self.enviar_cuadro(imagen)
         except Exception as e:
             print("ERROR: Dibujando pantalla - " + str(e))
     
-    def ejecutar(self):
-        """Loop principal"""
+    def actualizar_reposo(self):
+        """Cambia de estado de reposo segun PIR, botones y luz y aplica sus ajustes"""
+        if not self.reposo or self.reposo.actualizar(self.lectura) is None:
+            return
+        fps, intervalo, pausa_mic, pantalla = self.reposo.ajustes(FPS_OBJETIVO, self.intervalo_sensores_base)
+        if fps:
+            self.planificador.cambiar_fps(fps)
+        self.intervalo_sensores = intervalo
+        if self.hilo_sensores:
+            self.hilo_sensores.cambiar_intervalo(intervalo)
+        if self.muestreador:
+            self.muestreador.pausa = pausa_mic
+        
+        if pantalla == self.pantalla_encendida:
+            return
+        self.pantalla_encendida = pantalla
+        try:
+            if pantalla:
+                self.device.show()
+            else:
+                self.device.hide()
+        except Exception as e:
+            print("ERROR: Encendiendo/apagando display - " + str(e))
+        if pantalla:
+            self.salida.forzar_completo()
+            self.planificador.reanudar()
+    
+    def limpiar(self):
+        """Detiene hilos y servidores y libera el hardware (tambien si inicializar fallo)"""
+        print("INFO: Limpiando recursos...")
+        if self.hilo_sensores:
+            self.hilo_sensores.detener()
+        if self.muestreador:
+            self.muestreador.detener()
+            self.linea_base_mic.guardar()
+        if self.subidor:
+            self.subidor.detener()
+        if self.historial is not None:
+            self.historial.cerrar()
+        if self.compresor:
+            print("INFO: Compresion: " + self.compresor.resumen())
+        if self.agregador:
+            self.agregador.cerrar()
+            self.escritor_agregados.detener()
+        self.escritor_estados.detener()
+        modo = "hilo" if self.hilo_sensores else "en loop"
+        print("INFO: Tiempo por cuadro (sensores {}): {}".format(modo, self.tiempos_cuadro.resumen()))
+        print("INFO: Planificador: " + self.planificador.resumen())
+        if self.reposo:
+            print("INFO: Reposo: " + self.reposo.resumen())
+        self.metricas.detener()
+        self.vivo.detener()
+        if self.entradas:
+            self.entradas.limpiar()
+        if self.dht:
+            self.dht.exit()
+        if self.lector:
+            self.lector.cerrar()
+        for lector in self.lectores_viejos:
+            lector.cerrar()
+        if self.salida:
+            self.salida.cerrar()
+        if self.gpio:
+            self.gpio.cleanup()
+        print("OK: Finalizado")
+    
+    def ejecutar(self, duracion=None):
+        """Loop principal (duracion en segundos, None = hasta Ctrl+C)"""
         if not self.inicializar():
+            # Los escritores, servidores y el GPIO ya pudieron arrancar
+            self.limpiar()
             return
         
         print("\nOK: Monitor Mandala iniciado")
@@ -601,30 +808,50 @@ class MandalaAvanzada:
         print("   Presiona los botones para registrar tu estado de animo")
         print("   Ctrl+C para salir\n")
         
+        if SENSORES_EN_HILO:
+            self.hilo_sensores = HiloAdquisicion(self.muestrear_sensores, self.intervalo_sensores)
+            self.hilo_sensores.start()
+        
+        self.planificador.iniciar()
+        fin = time.monotonic() + duracion if duracion else None
+        
         try:
-            while True:
-                self.leer_sensores()
+            while fin is None or time.monotonic() < fin:
+                inicio_cuadro = time.perf_counter()
+                if not self.hilo_sensores:
+                    self.leer_sensores()
+                inicio_entrada = time.perf_counter()
                 self.verificar_botones()  # Verificar botones en cada ciclo
+                self.actualizar_reposo()
+                if not self.pantalla_encendida:
+                    # Pantalla apagada: nada que dibujar hasta un flanco o la proxima revision
+                    self.reposo.dormir()
+                    continue
+                inicio_dibujo = time.perf_counter()
+                self.tiempo_spi = 0.0
                 self.dibujar_pantalla()
-                self.rotation = (self.rotation + 1) % 360
-                time.sleep(0.025)  # 40 FPS
+                fin_cuadro = time.perf_counter()
+                self.metricas.entrada.observar(inicio_dibujo - inicio_entrada)
+                self.metricas.dibujo.observar(fin_cuadro - inicio_dibujo - self.tiempo_spi)
+                self.metricas.cuadro.observar(fin_cuadro - inicio_cuadro)
+                self.tiempos_cuadro.registrar(fin_cuadro - inicio_cuadro)
+                
+                # La rotacion avanza por tiempo, no por cuadro
+                transcurrido = self.planificador.esperar()
+                self.rotation = (self.rotation + VELOCIDAD_ROTACION * transcurrido) % 360
         
         except KeyboardInterrupt:
             print("\n\nINFO: Monitor detenido por usuario")
         
         finally:
-            print("INFO: Limpiando recursos...")
-            if self.dht:
-                self.dht.exit()
-            GPIO.cleanup()
-            print("OK: Finalizado")
+            self.limpiar()
 
 # ============================================
 # MAIN
 # ============================================
 
 if __name__ == '__main__':
-    if not os.path.exists('.env'):
+    if MODO_HARDWARE != 'simulado' and not os.path.exists('.env'):
         print("ERROR: Archivo .env no encontrado")
         sys.exit(1)
     
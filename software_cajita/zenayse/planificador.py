@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Planificador de Cuadros - Proyecto Zenalyze
+Espera hasta deadlines absolutos (reloj monotonic) en lugar de un sleep fijo,
+y salta cuadros si el dibujo va atrasado
+"""
+
+import os
+import time
+
+from adquisicion import RegistroTiempos
+
+# ============================================
+# CONFIGURACION
+# ============================================
+
+FPS_OBJETIVO = float(os.getenv('FPS_OBJETIVO', 40))
+
+# ============================================
+# CLASE PLANIFICADOR
+# ============================================
+
+class PlanificadorCuadros:
+    def __init__(self, fps=FPS_OBJETIVO, despertador=None):
+        self.periodo = 1.0 / fps
+        self.despertador = despertador  # threading.Event que corta la espera (modo reposo)
+        self.siguiente = None
+        self.ultimo = None
+
+        # Estadisticas
+        self.cuadros = 0
+        self.perdidos = 0
+        self.inicio = None
+        self.suma_jitter = 0.0
+        self.intervalos = RegistroTiempos()
+
+    def iniciar(self):
+        """Arranca el reloj del planificador"""
+        ahora = time.monotonic()
+        self.inicio = ahora
+        self.ultimo = ahora
+        self.siguiente = ahora + self.periodo
+
+    def cambiar_fps(self, fps):
+        """Cambia el FPS objetivo a partir del proximo cuadro"""
+        self.periodo = 1.0 / fps
+        if self.ultimo is not None:
+            self.siguiente = self.ultimo + self.periodo
+
+    def reanudar(self):
+        """Tras una pausa (pantalla apagada): el proximo cuadro sale ya, sin contar perdidos"""
+        ahora = time.monotonic()
+        self.ultimo = ahora
+        self.siguiente = ahora
+
+    def esperar(self):
+        """Duerme hasta el proximo deadline y devuelve los segundos desde el cuadro anterior"""
+        if self.siguiente is None:
+            self.iniciar()
+
+        ahora = time.monotonic()
+        if ahora < self.siguiente:
+            if self.despertador is None:
+                time.sleep(self.siguiente - ahora)
+            elif self.despertador.wait(self.siguiente - ahora):
+                # Un flanco corta el cuadro lento: el siguiente sale ya
+                self.despertador.clear()
+                self.siguiente = time.monotonic()
+            ahora = time.monotonic()
+        else:
+            # Sobrecarga: se saltan los deadlines vencidos en vez de recuperarlos de golpe
+            saltados = int((ahora - self.siguiente) / self.periodo)
+            if saltados:
+                self.perdidos += saltados
+                self.siguiente += saltados * self.periodo
+
+        self.siguiente += self.periodo
+
+        transcurrido = ahora - self.ultimo
+        self.ultimo = ahora
+        self.cuadros += 1
+        self.suma_jitter += abs(transcurrido - self.periodo)
+        self.intervalos.registrar(transcurrido)
+        return transcurrido
+
+    def fps_logrado(self):
+        """Cuadros por segundo reales desde iniciar()"""
+        if not self.cuadros:
+            return 0.0
+        return self.cuadros / (self.ultimo - self.inicio)
+
+    def jitter_ms(self):
+        """Desviacion media del intervalo respecto al periodo objetivo"""
+        if not self.cuadros:
+            return 0.0
+        return self.suma_jitter / self.cuadros * 1000
+
+    def resumen(self):
+        """Texto con FPS logrado, jitter y deadlines perdidos"""
+        return "FPS={:.1f}/{:.0f} jitter={:.2f}ms perdidos={} cuadros={}".format(
+            self.fps_logrado(), 1.0 / self.periodo, self.jitter_ms(), self.perdidos, self.cuadros)
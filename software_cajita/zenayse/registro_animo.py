@@ -0,0 +1,244 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Registro de Estados de Animo - Proyecto Zenalyze
+Escritor en segundo plano: el hilo de dibujo solo encola la fila y un hilo
+aparte la escribe en lotes, con fsync configurable y rotacion del CSV
+"""
+
+import os
+import queue
+import threading
+import time
+from datetime import datetime
+
+# ============================================
+# CONFIGURACION
+# ============================================
+
+ARCHIVO_ESTADOS = 'data/estados_animo.csv'
+ENCABEZADO_ESTADOS = "timestamp,estado,temperatura,humedad,co2,luz,ruido"
+
+# 'nunca' = lo decide el sistema, 'lote' = fsync por lote, 'siempre' = fsync por fila
+POLITICA_FSYNC = os.getenv('FSYNC_ESTADOS', 'lote')
+
+# Rotacion: por tamano (bytes) y al cambiar el dia
+TAMANO_MAX_ESTADOS = int(os.getenv('TAMANO_MAX_ESTADOS', 1024 * 1024))
+ROTAR_DIARIO = os.getenv('ROTAR_ESTADOS_DIARIO', '0') == '1'
+
+# Filas pendientes maximas y agrupacion
+CAPACIDAD_COLA = 1024
+TAMANO_LOTE = 64
+INTERVALO_LOTE = 1.0  # segundos que se espera para juntar un lote
+
+DEBUG = True
+
+_FIN = object()
+
+# ============================================
+# CLASE ESCRITOR
+# ============================================
+
+class EscritorEstados(threading.Thread):
+    def __init__(self, ruta=ARCHIVO_ESTADOS, encabezado=ENCABEZADO_ESTADOS,
+                 fsync=POLITICA_FSYNC, tamano_max=TAMANO_MAX_ESTADOS, rotar_diario=ROTAR_DIARIO,
+                 capacidad=CAPACIDAD_COLA, tamano_lote=TAMANO_LOTE, intervalo_lote=INTERVALO_LOTE):
+        super().__init__(name="estados-animo", daemon=True)
+        self.ruta = ruta
+        self.encabezado = encabezado
+        self.fsync = fsync
+        self.tamano_max = tamano_max
+        self.rotar_diario = rotar_diario
+        self.tamano_lote = tamano_lote
+        self.intervalo_lote = intervalo_lote
+        self.cola = queue.Queue(maxsize=capacidad)
+
+        self.archivo = None
+        self.fecha_archivo = None
+
+        # Estadisticas
+        self.escritas = 0
+        self.lotes = 0
+        self.descartadas = 0
+        self.errores = 0
+
+    def registrar(self, fila):
+        """Encola una fila CSV (sin salto de linea); nunca bloquea"""
+        try:
+            self.cola.put_nowait(fila)
+            return True
+        except queue.Full:
+            self.descartadas += 1
+            return False
+
+    def run(self):
+        """Junta filas en lotes y las escribe"""
+        terminar = False
+        while not terminar:
+            try:
+                primera = self.cola.get(timeout=self.intervalo_lote)
+            except queue.Empty:
+                continue
+
+            lote = []
+            if primera is _FIN:
+                terminar = True
+            else:
+                lote.append(primera)
+
+            # Vaciar lo que ya este encolado sin esperar mas
+            while len(lote) < self.tamano_lote and not terminar:
+                try:
+                    fila = self.cola.get_nowait()
+                except queue.Empty:
+                    break
+                if fila is _FIN:
+                    terminar = True
+                else:
+                    lote.append(fila)
+
+            if lote:
+                self.escribir_lote(lote)
+
+        self.cerrar()
+
+    def escribir_lote(self, filas):
+        """Escribe un lote de filas en el CSV"""
+        try:
+            self.preparar_archivo()
+            if self.fsync == 'siempre':
+                for fila in filas:
+                    self.archivo.write(fila + "\n")
+                    self.archivo.flush()
+                    os.fsync(self.archivo.fileno())
+            else:
+                self.archivo.write("\n".join(filas) + "\n")
+                self.archivo.flush()
+                if self.fsync == 'lote':
+                    os.fsync(self.archivo.fileno())
+
+            self.escritas += len(filas)
+            self.lotes += 1
+        except Exception as e:
+            self.errores += 1
+            print(f"ERROR: No se pudo guardar estado - {str(e)}")
+            self.cerrar()
+
+    def preparar_archivo(self):
+        """Abre el CSV si hace falta y lo rota por tamano o por dia"""
+        hoy = datetime.now().date()
+
+        if self.archivo is not None:
+            if self.archivo.tell() >= self.tamano_max:
+                self.rotar()
+            elif self.rotar_diario and self.fecha_archivo != hoy:
+                self.rotar()
+
+        if self.archivo is None:
+            self.abrir()
+
+    def abrir(self):
+        """Abre el CSV en modo append y asegura un encabezado valido"""
+        directorio = os.path.dirname(self.ruta)
+        if directorio and not os.path.exists(directorio):
+            os.makedirs(directorio)
+
+        # Si el archivo existente tiene otro encabezado se rota antes de escribir
+        termina_en_linea = True
+        if os.path.exists(self.ruta) and os.path.getsize(self.ruta) > 0:
+            with open(self.ruta, 'rb') as f:
+                encabezado_actual = f.readline().decode('utf-8', 'replace').rstrip("\r\n")
+                f.seek(-1, os.SEEK_END)
+                termina_en_linea = f.read(1) == b"\n"
+            if encabezado_actual != self.encabezado:
+                self.mover_a_rotado(datetime.fromtimestamp(os.path.getmtime(self.ruta)).date())
+                termina_en_linea = True
+
+        self.archivo = open(self.ruta, 'a', encoding='utf-8')
+        self.fecha_archivo = datetime.fromtimestamp(os.path.getmtime(self.ruta)).date()
+
+        if self.archivo.tell() == 0:
+            self.archivo.write(self.encabezado + "\n")
+            self.fecha_archivo = datetime.now().date()
+        elif not termina_en_linea:
+            # Un corte de luz puede dejar la ultima fila a medias: empezar en linea nueva
+            self.archivo.write("\n")
+
+        self.archivo.flush()
+        if self.fsync != 'nunca':
+            os.fsync(self.archivo.fileno())
+
+    def rotar(self):
+        """Cierra el CSV actual y lo renombra con su fecha"""
+        fecha = self.fecha_archivo or datetime.now().date()
+        self.cerrar()
+        self.mover_a_rotado(fecha)
+
+    def mover_a_rotado(self, fecha):
+        """Renombra el CSV a base-AAAA-MM-DD[.N].csv sin pisar otros"""
+        base, extension = os.path.splitext(self.ruta)
+        destino = "{}-{}{}".format(base, fecha.isoformat(), extension)
+        n = 1
+        while os.path.exists(destino):
+            destino = "{}-{}.{}{}".format(base, fecha.isoformat(), n, extension)
+            n += 1
+        os.replace(self.ruta, destino)
+        if DEBUG:
+            print("INFO: Registro de estados rotado a " + destino)
+
+    def cerrar(self):
+        """Cierra el archivo si esta abierto"""
+        if self.archivo is not None:
+            try:
+                self.archivo.flush()
+                if self.fsync != 'nunca':
+                    os.fsync(self.archivo.fileno())
+                self.archivo.close()
+            except Exception:
+                pass
+            self.archivo = None
+
+    def detener(self, espera=5.0):
+        """Escribe lo pendiente y termina el hilo"""
+        if not self.is_alive():
+            return
+        try:
+            self.cola.put(_FIN, timeout=espera)
+        except queue.Full:
+            pass
+        self.join(espera)
+
+# ============================================
+# MAIN - Costo de registrar() contra la escritura directa
+# ============================================
+
+if __name__ == '__main__':
+    import tempfile
+
+    filas = 2000
+    directorio = tempfile.mkdtemp()
+
+    # Antes: abrir, escribir una linea y cerrar en cada presion
+    ruta_directa = os.path.join(directorio, 'directo.csv')
+    inicio = time.perf_counter()
+    for i in range(filas):
+        existe = os.path.exists(ruta_directa)
+        with open(ruta_directa, 'a', encoding='utf-8') as f:
+            if not existe:
+                f.write(ENCABEZADO_ESTADOS + "\n")
+            f.write("2026-01-01 00:00:00,bien,22.0,50.0,400,300,silencio\n")
+    directo = (time.perf_counter() - inicio) / filas
+
+    # Despues: solo encolar
+    escritor = EscritorEstados(os.path.join(directorio, 'estados.csv'), capacidad=filas)
+    escritor.start()
+    inicio = time.perf_counter()
+    for i in range(filas):
+        escritor.registrar("2026-01-01 00:00:00,bien,22.0,50.0,400,300,silencio")
+    encolar = (time.perf_counter() - inicio) / filas
+    escritor.detener()
+
+    print("Escritura directa por fila: {:.1f} us".format(directo * 1e6))
+    print("registrar() por fila:       {:.1f} us".format(encolar * 1e6))
+    print("Filas escritas: {} en {} lotes, descartadas: {}".format(
+        escritor.escritas, escritor.lotes, escritor.descartadas))
@@ -0,0 +1,213 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Render NumPy de la Mandala - Proyecto Zenalyze
+Rasteriza todos los circulos desde un campo de distancias precalculado y
+todas las lineas en una sola pasada vectorizada, sobre un buffer RGBX fijo
+"""
+
+import os
+import time
+
+import numpy as np
+from PIL import Image, ImageDraw
+
+from geometria_mandala import (ANCHO, ALTO, ANILLOS_MIN, ANILLOS_MAX, SIMETRIA,
+                               COLOR_MORADO, COLOR_AZUL_ANILLO, COLOR_BLANCO)
+
+# ============================================
+# CONFIGURACION
+# ============================================
+
+# 'pil' = ImageDraw (ellipse/polygon/line), 'numpy' = este render
+RENDER_MANDALA = os.getenv('RENDER_MANDALA', 'pil')
+
+# Fraccion maxima de pixeles distintos a PIL en un cuadro
+TOLERANCIA_PIXELES = 0.01
+
+# Capas en el orden en que dibujar_mandala llama a PIL (la ultima queda encima)
+EXTERIOR = 0
+TRIANGULO = 1
+PETALO = 2
+ANILLO = 3
+CENTRAL = 4
+PUNTO = 5
+LUZ = 6
+CAPAS = 7
+
+# ============================================
+# CLASE RENDER
+# ============================================
+
+class RenderMandala:
+    def __init__(self, geometria, ancho=ANCHO, alto=ALTO):
+        self.g = geometria
+        self.ancho = ancho
+        self.alto = alto
+        g = geometria
+
+        # Distancia al centro al cuadrado por pixel (entera, exacta)
+        yy, xx = np.mgrid[0:alto, 0:ancho]
+        self.r2 = ((xx - g.cx) ** 2 + (yy - g.cy) ** 2).ravel()
+
+        # Pixeles de cada circulo; los anillos de humedad por cantidad de anillos
+        self.circulos = {
+            EXTERIOR: self._circulo(g.caja_exterior, 3),
+            CENTRAL: self._circulo(g.caja_central, 3),
+            PUNTO: self._circulo(g.caja_punto, 0),
+            LUZ: self._circulo(g.caja_luz, 2),
+        }
+        self.anillos = {}
+        for anillos in range(ANILLOS_MIN, ANILLOS_MAX + 1):
+            self.anillos[anillos] = np.unique(np.concatenate(
+                [self._circulo(caja, 1) for caja in g.anillos[anillos]]))
+
+        # Segmentos por rotacion (rot, segmento, extremo, xy): 18 lados y despues 12 petalos
+        lados = [[(p[i], p[(i + 1) % 3]) for p in rot for i in range(3)] for rot in g.triangulos]
+        self.cantidad_lados = len(lados[0])
+        self.segmentos = np.concatenate(
+            (np.array(lados, dtype=np.float32), np.array(g.petalos, dtype=np.float32)), axis=1)
+        largo = int(np.abs(self.segmentos[:, :, 1] - self.segmentos[:, :, 0]).max())
+        self.pasos = np.arange(largo + 1, dtype=np.float32)
+
+        # Buffer fijo: un uint32 por pixel (R, G, B, relleno)
+        self.rgbx = np.zeros((alto, ancho, 4), dtype=np.uint8)
+        self._rgbx32 = self.rgbx.view(np.uint32).ravel()
+        self.colores = np.zeros((CAPAS, 4), dtype=np.uint8)
+        self.colores[TRIANGULO, :3] = COLOR_MORADO
+        self.colores[ANILLO, :3] = COLOR_AZUL_ANILLO
+        self.colores[PUNTO, :3] = COLOR_BLANCO
+        self._colores32 = self.colores.view(np.uint32).ravel()
+
+    def _circulo(self, caja, ancho):
+        """Pixeles de ellipse() de PIL (ancho=0: relleno) tomados del campo de distancias"""
+        mascara = Image.new("L", (self.ancho, self.alto), 0)
+        if ancho:
+            ImageDraw.Draw(mascara).ellipse(caja, outline=255, width=ancho)
+        else:
+            ImageDraw.Draw(mascara).ellipse(caja, fill=255)
+
+        # El circulo se rasteriza una vez con PIL para fijar que distancias cubre:
+        # una distancia queda cubierta si lo esta la mayoria de sus pixeles
+        dentro = np.asarray(mascara).ravel() > 0
+        total = np.bincount(self.r2)
+        cubiertos = np.bincount(self.r2, weights=dentro, minlength=len(total))
+        return np.flatnonzero((cubiertos * 2 > total)[self.r2])
+
+    def _lineas(self, segmentos):
+        """Pixeles de todas las lineas a la vez (DDA por el eje mayor), una fila por segmento"""
+        a = segmentos[:, 0, :]
+        ab = segmentos[:, 1, :] - a
+        pasos = np.maximum(np.abs(ab).max(axis=1), 1.0)
+        t = np.minimum(self.pasos / pasos[:, None], 1.0)
+        x = np.floor(a[:, 0, None] + t * ab[:, 0, None] + 0.5).astype(np.intp)
+        y = np.floor(a[:, 1, None] + t * ab[:, 1, None] + 0.5).astype(np.intp)
+        return y * self.ancho + x
+
+    def _ensanchar(self, pixeles, segmentos):
+        """width=2: PIL rellena entre la linea movida un pixel en x y la movida en y
+        (ImagingDrawWideLine); aqui se marcan esas dos lineas y la original"""
+        ab = segmentos[:, 1, :] - segmentos[:, 0, :]
+        unitario = ab / np.hypot(ab[:, 0], ab[:, 1])[:, None]
+        mover = (np.sign(unitario) * np.ceil(np.abs(unitario) - 0.5)).astype(np.intp)
+        return np.concatenate((pixeles, pixeles + mover[:, 1, None], pixeles + mover[:, 0, None] * self.ancho))
+
+    def dibujar(self, rot, anillos, color_exterior, color_petalos, color_central, color_luz):
+        """Dibuja un cuadro en self.rgbx y lo devuelve"""
+        segmentos = self.segmentos[int(rot) % SIMETRIA]
+        self.colores[EXTERIOR, :3] = color_exterior
+        self.colores[PETALO, :3] = color_petalos
+        self.colores[CENTRAL, :3] = color_central
+        self.colores[LUZ, :3] = color_luz
+        colores = self._colores32
+
+        cuadro = self._rgbx32
+        cuadro.fill(0)
+        lineas = self._lineas(segmentos)
+        cuadro[self.circulos[EXTERIOR]] = colores[EXTERIOR]
+        cuadro[lineas[:self.cantidad_lados]] = colores[TRIANGULO]
+        cuadro[self._ensanchar(lineas[self.cantidad_lados:], segmentos[self.cantidad_lados:])] = colores[PETALO]
+        cuadro[self.anillos[anillos]] = colores[ANILLO]
+        cuadro[self.circulos[CENTRAL]] = colores[CENTRAL]
+        cuadro[self.circulos[PUNTO]] = colores[PUNTO]
+        cuadro[self.circulos[LUZ]] = colores[LUZ]
+        return self.rgbx
+
+    def imagen(self):
+        """Copia del ultimo cuadro como imagen PIL RGB (el buffer se reusa)"""
+        return Image.frombytes("RGB", (self.ancho, self.alto), self.rgbx, "raw", "RGBX")
+
+# ============================================
+# COMPARACION CONTRA PIL
+# ============================================
+
+def dibujar_pil(g, rot, anillos, color_exterior, color_petalos, color_central, color_luz):
+    """Los mismos llamados que MandalaAvanzada.dibujar_mandala"""
+    imagen = Image.new("RGB", (ANCHO, ALTO), "black")
+    draw = ImageDraw.Draw(imagen)
+    draw.ellipse(g.caja_exterior, outline=color_exterior, width=3)
+    for poligono in g.triangulos[rot]:
+        draw.polygon(poligono, outline=COLOR_MORADO, fill=None)
+    for linea in g.petalos[rot]:
+        draw.line(linea, fill=color_petalos, width=2)
+    for caja in g.anillos[anillos]:
+        draw.ellipse(caja, outline=COLOR_AZUL_ANILLO, width=1)
+    draw.ellipse(g.caja_central, outline=color_central, fill=None, width=3)
+    draw.ellipse(g.caja_punto, fill=COLOR_BLANCO)
+    draw.ellipse(g.caja_luz, outline=color_luz, width=2)
+    return imagen
+
+
+def diferencia_con_pil(render, colores=((150, 220, 100), (16, 185, 129), (100, 220, 180), (253, 224, 71)),
+                       rotaciones=range(SIMETRIA), cantidades_anillos=range(ANILLOS_MIN, ANILLOS_MAX + 1)):
+    """Peor y media fraccion de pixeles distintos a PIL (por defecto todas las rotaciones y anillos)"""
+    fracciones = []
+    for anillos in cantidades_anillos:
+        for rot in rotaciones:
+            referencia = np.asarray(dibujar_pil(render.g, rot, anillos, *colores))
+            cuadro = render.dibujar(rot, anillos, *colores)[:, :, :3]
+            fracciones.append(np.count_nonzero((referencia != cuadro).any(axis=2)) / float(ANCHO * ALTO))
+    return max(fracciones), sum(fracciones) / len(fracciones)
+
+# ============================================
+# MAIN - Diferencia y tiempos contra PIL
+# ============================================
+
+if __name__ == '__main__':
+    import sys
+    from geometria_mandala import GeometriaMandala
+
+    geometria = GeometriaMandala()
+    inicio = time.perf_counter()
+    render = RenderMandala(geometria)
+    creacion = time.perf_counter() - inicio
+
+    peor, media = diferencia_con_pil(render)
+    ok = peor <= TOLERANCIA_PIXELES
+    estado = "OK" if ok else "ERROR"
+    print("{}: pixeles distintos a PIL: peor {:.2%}  media {:.2%}  (tolerancia {:.2%})".format(
+        estado, peor, media, TOLERANCIA_PIXELES))
+
+    colores = ((150, 220, 100), (16, 185, 129), (100, 220, 180), (253, 224, 71))
+    n = 1000
+    inicio = time.perf_counter()
+    for i in range(n):
+        dibujar_pil(geometria, i % SIMETRIA, 5, *colores)
+    pil = (time.perf_counter() - inicio) / n
+
+    inicio = time.perf_counter()
+    for i in range(n):
+        render.dibujar(i % SIMETRIA, 5, *colores)
+    numpy_buffer = (time.perf_counter() - inicio) / n
+
+    inicio = time.perf_counter()
+    for i in range(n):
+        render.dibujar(i % SIMETRIA, 5, *colores)
+        render.imagen()
+    numpy_imagen = (time.perf_counter() - inicio) / n
+
+    print("Render creado en {:.1f} ms".format(creacion * 1000))
+    print("PIL (imagen nueva):        {:6.1f} us".format(pil * 1e6))
+    print("NumPy (buffer fijo):       {:6.1f} us".format(numpy_buffer * 1e6))
+    print("NumPy + copia a imagen:    {:6.1f} us".format(numpy_imagen * 1e6))
+    sys.exit(0 if ok else 1)
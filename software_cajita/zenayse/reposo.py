@@ -0,0 +1,216 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Modo Reposo - Proyecto Zenalyze
+Maquina de estados por PIR, botones y luz: baja los FPS, apaga el ST7789 y
+espacia las lecturas cuando nadie se mueve; un flanco despierta al instante
+"""
+
+import os
+import threading
+import time
+from collections import namedtuple
+
+# ============================================
+# CONFIGURACION
+# ============================================
+
+MODO_REPOSO = os.getenv('MODO_REPOSO', '1') == '1'
+
+# Segundos sin PIR ni botones hasta bajar los FPS, y hasta apagar la pantalla si esta oscuro
+ESPERA_TENUE = float(os.getenv('ESPERA_TENUE', 300))
+ESPERA_APAGADO = float(os.getenv('ESPERA_APAGADO', 1800))
+
+# Lux por debajo de los cuales la pieza esta a oscuras (se sale con el doble)
+LUX_OSCURO = float(os.getenv('LUX_OSCURO', 30))
+
+# Reposo tenue: FPS y factor del intervalo de sensores
+FPS_TENUE = float(os.getenv('FPS_TENUE', 5))
+FACTOR_SENSORES_TENUE = 3
+
+# Pantalla apagada: intervalo de sensores y descanso del microfono entre ventanas (segundos)
+INTERVALO_SENSORES_APAGADO = float(os.getenv('INTERVALO_SENSORES_APAGADO', 10))
+PAUSA_MIC_APAGADO = float(os.getenv('PAUSA_MIC_APAGADO', 5))
+
+# Con la pantalla apagada el loop revisa eventos del demonio y la luz cada tanto
+REVISION_APAGADO = 1.0
+
+DEBUG = True
+
+# ============================================
+# ESTADOS
+# ============================================
+
+ACTIVO = "activo"
+TENUE = "tenue"
+APAGADO = "apagado"
+ESTADOS = (ACTIVO, TENUE, APAGADO)
+
+# Lo que cada estado pide al monitor (fps 0 = no dibujar)
+AjustesReposo = namedtuple('AjustesReposo', ['fps', 'intervalo_sensores', 'pausa_mic', 'pantalla'])
+
+# ============================================
+# CLASE MAQUINA DE REPOSO
+# ============================================
+
+class MaquinaReposo:
+    def __init__(self, espera_tenue=ESPERA_TENUE, espera_apagado=ESPERA_APAGADO, lux_oscuro=LUX_OSCURO):
+        self.espera_tenue = espera_tenue
+        self.espera_apagado = espera_apagado
+        self.lux_oscuro = lux_oscuro
+        self.estado = ACTIVO
+        self.ultima_actividad = time.monotonic()
+
+        # Lo activa un flanco desde el hilo del GPIO; corta la espera del loop
+        self.despertador = threading.Event()
+
+        # Estadisticas
+        self.desde = time.monotonic()
+        self.tiempo_por_estado = dict.fromkeys(ESTADOS, 0.0)
+        self.despertares = 0
+
+    def actividad(self):
+        """Flanco de PIR o boton (desde cualquier hilo): despierta el loop si estaba en reposo"""
+        self.ultima_actividad = time.monotonic()
+        if self.estado != ACTIVO:
+            self.despertador.set()
+
+    def siguiente_estado(self, lectura, ahora):
+        """Estado que corresponde a la lectura y al tiempo sin actividad"""
+        if lectura.movimiento:
+            self.ultima_actividad = ahora  # PIR sostenido en alto
+        quieto = ahora - self.ultima_actividad
+        if quieto < self.espera_tenue:
+            return ACTIVO
+        if self.estado == APAGADO:
+            # Histeresis: un reflejo o una nube no prenden la pantalla
+            return APAGADO if lectura.lux < 2 * self.lux_oscuro else TENUE
+        if quieto >= self.espera_apagado and lectura.lux < self.lux_oscuro:
+            return APAGADO
+        return TENUE
+
+    def actualizar(self, lectura):
+        """Avanza la maquina; devuelve el estado nuevo si cambio (None si sigue igual)"""
+        ahora = time.monotonic()
+        estado = self.siguiente_estado(lectura, ahora)
+        if estado == self.estado:
+            return None
+
+        self.tiempo_por_estado[self.estado] += ahora - self.desde
+        self.desde = ahora
+        if estado == ACTIVO:
+            self.despertares += 1
+        if DEBUG:
+            print("DEBUG: Reposo {} -> {}".format(self.estado, estado))
+        self.estado = estado
+        return estado
+
+    def ajustes(self, fps, intervalo_sensores):
+        """FPS, intervalo de sensores, pausa del microfono y pantalla del estado actual"""
+        if self.estado == ACTIVO:
+            return AjustesReposo(fps, intervalo_sensores, 0.0, True)
+        if self.estado == TENUE:
+            return AjustesReposo(min(fps, FPS_TENUE), intervalo_sensores * FACTOR_SENSORES_TENUE, 0.0, True)
+        return AjustesReposo(0.0, max(intervalo_sensores, INTERVALO_SENSORES_APAGADO), PAUSA_MIC_APAGADO, False)
+
+    def dormir(self, espera=REVISION_APAGADO):
+        """Con la pantalla apagada: espera un flanco o la proxima revision"""
+        if self.despertador.wait(espera):
+            self.despertador.clear()
+
+    def resumen(self):
+        """Segundos en cada estado y despertares"""
+        tiempos = dict(self.tiempo_por_estado)
+        tiempos[self.estado] += time.monotonic() - self.desde
+        return "activo {:.0f}s, tenue {:.0f}s, apagado {:.0f}s, {} despertares".format(
+            tiempos[ACTIVO], tiempos[TENUE], tiempos[APAGADO], self.despertares)
+
+# ============================================
+# MAIN - Noche simulada (CPU por estado)
+# ============================================
+
+def _noche(duracion, despertar_en):
+    """En un proceso aparte: corre el monitor de noche, mide CPU por estado y un despertar por PIR"""
+    import json
+    import sys
+    import monitor_sensores_lcd as m
+
+    monitor = m.MandalaAvanzada()
+    hilo = threading.Thread(target=monitor.ejecutar, kwargs={"duracion": duracion}, daemon=True)
+    inicio = time.monotonic()
+    hilo.start()
+
+    cpu = dict.fromkeys(ESTADOS, 0.0)
+    segundos = dict.fromkeys(ESTADOS, 0.0)
+    latencia = None
+    estado = ACTIVO
+    ultimo_cpu, ultimo_t = time.process_time(), time.monotonic()
+    while hilo.is_alive():
+        time.sleep(0.05)
+        ahora = time.monotonic()
+        if ahora - inicio < 5:
+            # Pantalla de inicio y arranque de hilos: no cuentan
+            ultimo_cpu, ultimo_t = time.process_time(), ahora
+            continue
+        if despertar_en and latencia is None and ahora - inicio >= despertar_en:
+            cuadros = monitor.planificador.cuadros
+            flanco = time.monotonic()
+            monitor.hw.gpio().cambiar(m.PIN_PIR, True)
+            while monitor.planificador.cuadros == cuadros and time.monotonic() - flanco < 5:
+                time.sleep(0.0005)
+            latencia = time.monotonic() - flanco
+        actual = monitor.reposo.estado if monitor.reposo else ACTIVO
+        cpu[estado] += time.process_time() - ultimo_cpu
+        segundos[estado] += ahora - ultimo_t
+        ultimo_cpu, ultimo_t, estado = time.process_time(), ahora, actual
+    hilo.join()
+    sys.stdout.flush()
+    print("RESULTADO " + json.dumps({"cpu": cpu, "segundos": segundos, "latencia": latencia}))
+
+
+if __name__ == '__main__':
+    import json
+    import subprocess
+    import sys
+
+    if '--noche' in sys.argv:
+        _noche(float(sys.argv[2]), float(sys.argv[3]))
+        sys.exit(0)
+
+    # Noche comprimida: tenue a los 10 s, apagado a los 20 s, PIR a los 34 s
+    comun = dict(os.environ, MODO_HARDWARE='simulado', ESCENA_SIMULADA='noche', SUBIR_LECTURAS='0',
+                 GUARDAR_HISTORIAL='0', GUARDAR_AGREGADOS='0', SEMILLA_SIMULACION='1')
+    corridas = {
+        "sin reposo": (dict(comun, MODO_REPOSO='0'), 25, 0),
+        "con reposo": (dict(comun, MODO_REPOSO='1', ESPERA_TENUE='10', ESPERA_APAGADO='20'), 40, 34),
+    }
+    resultados = {}
+    for nombre, (entorno, duracion, despertar) in corridas.items():
+        salida = subprocess.run([sys.executable, __file__, '--noche', str(duracion), str(despertar)],
+                                env=entorno, capture_output=True, text=True)
+        lineas = [l for l in salida.stdout.splitlines() if l.startswith("RESULTADO ")]
+        if not lineas:
+            print("ERROR: {} - {}".format(nombre, (salida.stderr or salida.stdout).strip()[-500:]))
+            sys.exit(1)
+        resultados[nombre] = json.loads(lineas[-1][len("RESULTADO "):])
+
+    def porcentaje(resultado, estado):
+        return 100 * resultado["cpu"][estado] / resultado["segundos"][estado] if resultado["segundos"][estado] else 0.0
+
+    base = porcentaje(resultados["sin reposo"], ACTIVO)
+    print("INFO: CPU sin reposo:          {:5.1f} %".format(base))
+    for estado in ESTADOS:
+        print("INFO: CPU con reposo {:8s}: {:5.1f} % ({:.0f} s medidos)".format(
+            estado, porcentaje(resultados["con reposo"], estado), resultados["con reposo"]["segundos"][estado]))
+
+    # Noche real de 8 h con la configuracion por defecto: 5 min activo, 25 min tenue, el resto apagado
+    noche = 8 * 3600
+    por_estado = {ACTIVO: ESPERA_TENUE, TENUE: ESPERA_APAGADO - ESPERA_TENUE}
+    por_estado[APAGADO] = noche - sum(por_estado.values())
+    sin = base / 100 * noche
+    con = sum(porcentaje(resultados["con reposo"], e) / 100 * s for e, s in por_estado.items())
+    print("INFO: Noche de 8 h: {:.0f} s de CPU sin reposo, {:.0f} s con reposo ({:.0%} menos)".format(
+        sin, con, 1 - con / sin if sin else 0))
+    latencia = resultados["con reposo"]["latencia"]
+    print("INFO: Despertar por PIR con la pantalla apagada: " +
+          ("{:.1f} ms hasta el primer cuadro".format(latencia * 1000) if latencia is not None else "sin medir"))
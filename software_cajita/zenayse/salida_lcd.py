@@ -0,0 +1,251 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Salida al Display ST7789 - Proyecto Zenalyze
+Convierte cada cuadro a RGB565 sobre buffers fijos, lo compara con el ultimo
+enviado y solo manda por SPI las ventanas que cambiaron, sin copias intermedias
+"""
+
+import os
+
+import numpy as np
+
+# ============================================
+# CONFIGURACION
+# ============================================
+
+# Tamano del bloque (pixeles) con el que se buscan cambios
+TAMANO_BLOQUE = 16
+
+# Si cambia mas de esta fraccion de la pantalla se manda el cuadro completo
+FRACCION_COMPLETA = 0.5
+
+# Bytes por escritura SPI (el bufsiz de spidev es 4096 salvo que se aumente)
+TAMANO_TRANSFERENCIA = int(os.getenv('SPI_TRANSFERENCIA', 4096))
+
+# Comandos del ST7789
+CMD_CASET = 0x2A  # Rango de columnas
+CMD_RASET = 0x2B  # Rango de filas
+CMD_RAMWR = 0x2C  # Escritura en memoria
+CMD_COLMOD = 0x3A  # Formato de pixel
+COLMOD_RGB565 = 0x05  # 16 bits por pixel
+COLMOD_RGB666 = 0x06  # 18 bits (3 bytes), el que deja luma.lcd
+
+# ============================================
+# CLASE SALIDA
+# ============================================
+
+class SalidaLCD:
+    def __init__(self, device, tamano_bloque=TAMANO_BLOQUE, fraccion_completa=FRACCION_COMPLETA,
+                 tamano_transferencia=TAMANO_TRANSFERENCIA):
+        self.device = device
+        self.tamano_bloque = tamano_bloque
+        self.fraccion_completa = fraccion_completa
+        self.tamano_transferencia = tamano_transferencia
+        self.rotacion = getattr(device, "rotate", 0)
+
+        # Buffers fijos en coordenadas del panel: cuadro actual y anterior en RGB565
+        # (big-endian, el orden en que lo lee el ST7789), temporales y ventana contigua
+        ancho, alto = device.size if self.rotacion % 2 == 0 else device.size[::-1]
+        self.actual = np.zeros((alto, ancho), dtype='>u2')
+        self.anterior = np.zeros((alto, ancho), dtype='>u2')
+        self._canal = np.zeros((alto, ancho), dtype=np.uint16)
+        self._color = np.zeros((alto, ancho), dtype=np.uint16)
+        self._distinto = np.zeros((alto, ancho), dtype=bool)
+        self._ventana = np.zeros(alto * ancho, dtype='>u2')
+        self.hay_anterior = False
+
+        # SPI directo con spidev.writebytes2 (acepta memoryview); si no, device.data
+        serial = getattr(device, "_serial_interface", None)
+        spi = getattr(serial, "_spi", None)
+        self._serial = serial if hasattr(spi, "writebytes2") else None
+
+        self.device.command(CMD_COLMOD, COLMOD_RGB565)
+
+        # Estadisticas
+        self.cuadros_completos = 0
+        self.cuadros_parciales = 0
+        self.cuadros_omitidos = 0
+        self.bytes_enviados = 0
+
+    def convertir(self, imagen):
+        """RGB888 (imagen PIL o arreglo) a RGB565 en self.actual, rotado al panel"""
+        rgb = imagen if isinstance(imagen, np.ndarray) else np.asarray(imagen)
+        if self.rotacion:
+            # Igual a device.preprocess (rotate(-90 * rotate)) pero como vista, sin copiar
+            rgb = np.rot90(rgb, -self.rotacion)
+
+        canal, color = self._canal, self._color
+        np.copyto(color, rgb[:, :, 0], casting='unsafe')
+        color &= 0xF8
+        color <<= 8
+        np.copyto(canal, rgb[:, :, 1], casting='unsafe')
+        canal &= 0xFC
+        canal <<= 3
+        color |= canal
+        np.copyto(canal, rgb[:, :, 2], casting='unsafe')
+        canal >>= 3
+        color |= canal
+        np.copyto(self.actual, color)
+
+    def mostrar(self, imagen):
+        """Envia un cuadro al display, solo las partes que cambiaron"""
+        self.convertir(imagen)
+        alto, ancho = self.actual.shape
+
+        if not self.hay_anterior:
+            self.enviar_ventana((0, 0, ancho, alto))
+            self.cuadros_completos += 1
+            self.intercambiar()
+            return
+
+        cajas = self.calcular_cambios(self.anterior, self.actual)
+
+        if not cajas:
+            self.cuadros_omitidos += 1
+            return
+
+        area = sum((der - izq) * (aba - arr) for izq, arr, der, aba in cajas)
+        if area > self.fraccion_completa * ancho * alto:
+            self.enviar_ventana((0, 0, ancho, alto))
+            self.cuadros_completos += 1
+        else:
+            for caja in cajas:
+                self.enviar_ventana(caja)
+            self.cuadros_parciales += 1
+        self.intercambiar()
+
+    def intercambiar(self):
+        """El cuadro enviado pasa a ser el anterior (sin copiar)"""
+        self.actual, self.anterior = self.anterior, self.actual
+        self.hay_anterior = True
+
+    def calcular_cambios(self, anterior, actual):
+        """Cajas (izq, arr, der, aba) que cubren los pixeles que cambiaron"""
+        alto, ancho = actual.shape[:2]
+        b = self.tamano_bloque
+
+        # Mapa de bloques con algun pixel distinto
+        distinto = np.not_equal(anterior, actual, out=self._distinto)
+        filas_b = -(-alto // b)
+        cols_b = -(-ancho // b)
+        if filas_b * b == alto and cols_b * b == ancho:
+            relleno = distinto
+        else:
+            relleno = np.zeros((filas_b * b, cols_b * b), dtype=bool)
+            relleno[:alto, :ancho] = distinto
+        bloques = relleno.reshape(filas_b, b, cols_b, b).any(axis=(1, 3))
+
+        filas = np.flatnonzero(bloques.any(axis=1))
+        if filas.size == 0:
+            return []
+
+        # Una caja por fila de bloques, unida con la fila siguiente si se tocan
+        cajas = []
+        abierta = None
+        for fila in filas:
+            columnas = np.flatnonzero(bloques[fila])
+            izq, der = int(columnas[0]), int(columnas[-1]) + 1
+            if abierta and abierta[3] == fila and izq <= abierta[2] and der >= abierta[0]:
+                abierta = [min(izq, abierta[0]), abierta[1], max(der, abierta[2]), fila + 1]
+            else:
+                if abierta:
+                    cajas.append(abierta)
+                abierta = [izq, int(fila), der, int(fila) + 1]
+        cajas.append(abierta)
+
+        return [(izq * b, arr * b, min(der * b, ancho), min(aba * b, alto))
+                for izq, arr, der, aba in cajas]
+
+    def enviar_ventana(self, caja):
+        """Manda una ventana rectangular del cuadro actual al ST7789"""
+        izq, arr, der, aba = caja
+        alto, ancho = self.actual.shape
+        if caja == (0, 0, ancho, alto):
+            datos = memoryview(self.actual).cast('B')
+        else:
+            # Las filas de una ventana angosta no son contiguas: se juntan en el buffer fijo
+            n = (der - izq) * (aba - arr)
+            ventana = self._ventana[:n].reshape(aba - arr, der - izq)
+            np.copyto(ventana, self.actual[arr:aba, izq:der])
+            datos = memoryview(self._ventana[:n]).cast('B')
+
+        if hasattr(self.device, "_apply_offsets"):
+            izq, arr, der, aba = self.device._apply_offsets(caja)
+
+        self.device.command(CMD_CASET, izq >> 8, izq & 0xFF, (der - 1) >> 8, (der - 1) & 0xFF)
+        self.device.command(CMD_RASET, arr >> 8, arr & 0xFF, (aba - 1) >> 8, (aba - 1) & 0xFF)
+        self.device.command(CMD_RAMWR)
+        self.escribir(datos)
+        self.bytes_enviados += len(datos)
+
+    def escribir(self, datos):
+        """Manda bytes de datos al display en trozos de memoryview (sin listas ni copias)"""
+        if self._serial is None:
+            self.device.data(datos)
+            return
+
+        serial = self._serial
+        if serial._DC:
+            serial._gpio.output(serial._DC, serial._data_mode)
+        escribir = serial._spi.writebytes2
+        paso = self.tamano_transferencia
+        for inicio in range(0, len(datos), paso):
+            escribir(datos[inicio:inicio + paso])
+
+    def forzar_completo(self):
+        """El proximo cuadro se envia completo"""
+        self.hay_anterior = False
+
+    def cerrar(self):
+        """Vuelve al formato de 18 bits para que luma.lcd pueda limpiar la pantalla al salir"""
+        self.device.command(CMD_COLMOD, COLMOD_RGB666)
+
+# ============================================
+# MAIN - Memoria por cuadro
+# ============================================
+
+if __name__ == '__main__':
+    import time
+    import tracemalloc
+    from PIL import Image, ImageDraw
+    from luma.core.device import dummy
+
+    device = dummy(width=240, height=240, rotate=3, mode="RGB")
+    salida = SalidaLCD(device)
+
+    # Cuadros que cambian en una zona chica (parcial) y en toda la pantalla (completo)
+    cuadros = []
+    for i in range(8):
+        imagen = Image.new("RGB", device.size, "black")
+        draw = ImageDraw.Draw(imagen)
+        draw.ellipse((60, 60, 180, 180), outline=(0, 200, 100), width=3)
+        draw.text((100 + i, 110), str(i), fill="white")
+        cuadros.append(imagen)
+    completos = [Image.new("RGB", device.size, (i * 30, 255 - i * 30, 80)) for i in range(8)]
+
+    # La rotacion sin copiar tiene que dar lo mismo que device.preprocess
+    salida.convertir(cuadros[3])
+    referencia = np.asarray(device.preprocess(cuadros[3])).astype(np.uint16)
+    esperado = ((referencia[:, :, 0] & 0xF8) << 8) | ((referencia[:, :, 1] & 0xFC) << 3) | (referencia[:, :, 2] >> 3)
+    print("Conversion igual a preprocess + RGB565: {}".format(np.array_equal(salida.actual, esperado)))
+
+    for nombre, lista in (("parcial", cuadros), ("completo", completos)):
+        for imagen in lista:
+            salida.mostrar(imagen)
+        n = 200
+        tracemalloc.start()
+        picos = []
+        inicio = time.perf_counter()
+        for i in range(n):
+            antes, _ = tracemalloc.get_traced_memory()
+            tracemalloc.reset_peak()
+            salida.mostrar(lista[i % len(lista)])
+            _, pico = tracemalloc.get_traced_memory()
+            picos.append(pico - antes)
+        total = time.perf_counter() - inicio
+        tracemalloc.stop()
+        picos.sort()
+        print("{:<9} {:6.2f} ms por cuadro  pico {:6.1f} KB por cuadro".format(
+            nombre, total / n * 1000, picos[len(picos) // 2] / 1024))
+    print("Bytes enviados: {}".format(salida.bytes_enviados))
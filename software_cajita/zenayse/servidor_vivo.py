@@ -0,0 +1,331 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Servidor en Vivo - Proyecto Zenalyze
+Servidor asyncio dentro del monitor: la ultima lectura como JSON y cada
+lectura nueva empujada por Server-Sent Events a todos los clientes
+"""
+
+import asyncio
+import json
+import os
+import threading
+import time
+from datetime import datetime
+
+# ============================================
+# CONFIGURACION
+# ============================================
+
+# 0 = desactivado (publicar() no hace nada)
+VIVO_PUERTO = int(os.getenv('VIVO_PUERTO', 0))
+# Solo local por defecto: los eventos dicen si hay alguien (PIR) y como se siente
+VIVO_HOST = os.getenv('VIVO_HOST', '127.0.0.1')
+
+MAX_CLIENTES_VIVO = 1000
+LIMITE_BUFFER_CLIENTE = 64 * 1024  # Bytes sin leer por cliente antes de cortarlo
+LATIDO_SSE = 15.0         # Segundos entre comentarios para que los proxies no corten
+NICE_VIVO = 10            # Prioridad del hilo del servidor (Linux: nice por hilo)
+ESPERA_CLIENTE = 5.0      # Segundos para mandar el pedido o aceptar una respuesta
+
+DEBUG = True
+
+# ============================================
+# FORMATO
+# ============================================
+
+def lectura_a_dict(lectura):
+    """Mismos campos que /api/sensores/current del dashboard, mas el nivel de ruido"""
+    return {
+        "temperatura": round(float(lectura.temp), 1),
+        "humedad": round(float(lectura.hum), 1),
+        "co2": int(lectura.ppm_co2),
+        "luz": int(lectura.lux),
+        "movimiento": bool(lectura.movimiento),
+        "ruido": lectura.nivel_ruido != "silencio",
+        "nivel_ruido": lectura.nivel_ruido,
+        "timestamp": datetime.fromtimestamp(lectura.timestamp).isoformat(timespec='milliseconds'),
+    }
+
+# ============================================
+# CLASE SERVIDOR
+# ============================================
+
+class ServidorVivo:
+    def __init__(self, puerto=VIVO_PUERTO, host=VIVO_HOST, max_clientes=MAX_CLIENTES_VIVO):
+        self.puerto = puerto
+        self.host = host
+        self.max_clientes = max_clientes
+        self.activo = puerto > 0
+
+        self.loop = None
+        self.hilo = None
+        self.servidor = None
+
+        # Todo esto lo toca solo el hilo del loop
+        self.actual = None        # JSON de la ultima lectura
+        self.suscriptores = set()  # Transportes de los streams SSE abiertos
+
+        # Estadisticas
+        self.publicados = 0
+        self.envios = 0
+        self.lentos = 0
+        self.rechazados = 0
+        self.ultima_difusion_ms = 0.0
+
+    @property
+    def clientes(self):
+        return len(self.suscriptores)
+
+    # ---------- Lado del monitor ----------
+
+    def iniciar(self):
+        """Arranca el loop asyncio en un hilo aparte"""
+        if not self.activo or self.hilo:
+            return
+        listo = threading.Event()
+        self.hilo = threading.Thread(target=self._correr, args=(listo,), name="servidor-vivo", daemon=True)
+        self.hilo.start()
+        listo.wait(5.0)
+
+    def publicar(self, lectura):
+        """Nueva LecturaSensores (desde cualquier hilo: no serializa ni bloquea)"""
+        self._encolar("lectura", lectura)
+
+    def publicar_estado(self, estado):
+        """Estado de animo registrado con los botones"""
+        self._encolar("estado", estado)
+
+    def _encolar(self, tipo, dato):
+        loop = self.loop
+        if loop is None:
+            return
+        try:
+            loop.call_soon_threadsafe(self._difundir, tipo, dato)
+        except RuntimeError:
+            pass  # detener() cerro el loop entre la revision y la llamada
+
+    def detener(self):
+        """Cierra el servidor y las conexiones abiertas"""
+        loop = self.loop
+        if loop is not None:
+            # Primero sin loop: los callbacks del GPIO que sigan vivos ya no encolan
+            self.loop = None
+            loop.call_soon_threadsafe(loop.stop)
+            self.hilo.join(5.0)
+            self.hilo = None
+
+    # ---------- Hilo del loop ----------
+
+    def _correr(self, listo):
+        # Menos prioridad que el hilo de dibujo: repartir a cientos de clientes puede esperar
+        try:
+            os.setpriority(os.PRIO_PROCESS, threading.get_native_id(), NICE_VIVO)
+        except (AttributeError, OSError):
+            pass
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        try:
+            self.servidor = loop.run_until_complete(
+                asyncio.start_server(self.atender, self.host, self.puerto, backlog=self.max_clientes))
+        except OSError as e:
+            print("ERROR: Servidor en vivo no disponible en {}:{} - {}".format(self.host, self.puerto, e))
+            loop.close()
+            listo.set()
+            return
+
+        self.loop = loop
+        latido = loop.create_task(self.latir())
+        listo.set()
+        if DEBUG:
+            print("OK: Lecturas en vivo en http://{}:{}/eventos".format(self.host, self.puerto))
+        try:
+            loop.run_forever()
+        finally:
+            # Cerrar los streams hace que cada atender() termine solo
+            latido.cancel()
+            self.servidor.close()
+            for transporte in list(self.suscriptores):
+                transporte.close()
+            tareas = [t for t in asyncio.all_tasks(loop) if not t.done()]
+            if tareas:
+                loop.run_until_complete(asyncio.wait(tareas, timeout=1.0))
+            loop.close()
+
+    def _difundir(self, tipo, dato):
+        """Serializa una sola vez y deja el mismo mensaje en el buffer de cada cliente"""
+        inicio = time.perf_counter()
+        if tipo == "lectura":
+            datos = json.dumps(lectura_a_dict(dato), separators=(",", ":")).encode("utf-8")
+            self.actual = datos
+        else:
+            datos = json.dumps({"estado": dato, "timestamp": datetime.now().isoformat(timespec='milliseconds')},
+                               separators=(",", ":")).encode("utf-8")
+        self.publicados += 1
+        self._escribir_a_todos(b"event: " + tipo.encode("ascii") + b"\ndata: " + datos + b"\n\n")
+        self.ultima_difusion_ms = (time.perf_counter() - inicio) * 1000
+
+    def _escribir_a_todos(self, mensaje):
+        for transporte in list(self.suscriptores):
+            # Un cliente que no lee acumula en su buffer: se corta en vez de crecer sin limite
+            if transporte.get_write_buffer_size() > LIMITE_BUFFER_CLIENTE:
+                self.lentos += 1
+                self.suscriptores.discard(transporte)
+                transporte.abort()
+                continue
+            transporte.write(mensaje)
+            self.envios += 1
+
+    async def latir(self):
+        """Comentario SSE periodico para que los proxies no corten los streams quietos"""
+        while True:
+            await asyncio.sleep(LATIDO_SSE)
+            self._escribir_a_todos(b": latido\n\n")
+
+    # ---------- HTTP ----------
+
+    async def atender(self, lector, escritor):
+        try:
+            linea = await asyncio.wait_for(lector.readline(), ESPERA_CLIENTE)
+            partes = linea.decode("latin-1").split()
+            while True:
+                encabezado = await asyncio.wait_for(lector.readline(), ESPERA_CLIENTE)
+                if encabezado in (b"\r\n", b"\n", b""):
+                    break
+            if len(partes) < 2 or partes[0] != "GET":
+                await self.responder(escritor, 404, b'{"error":"no encontrado"}')
+                return
+
+            ruta = partes[1].split("?")[0]
+            if ruta == "/api/sensores/current":
+                if self.actual is None:
+                    await self.responder(escritor, 503, b'{"error":"sin lecturas todavia"}')
+                else:
+                    await self.responder(escritor, 200, self.actual)
+            elif ruta == "/eventos":
+                await self.suscribir(lector, escritor)
+            else:
+                await self.responder(escritor, 404, b'{"error":"no encontrado"}')
+        except (asyncio.TimeoutError, ConnectionError):
+            pass
+        finally:
+            escritor.close()
+
+    async def responder(self, escritor, codigo, cuerpo):
+        razon = {200: "OK", 404: "Not Found", 503: "Service Unavailable"}[codigo]
+        escritor.write("HTTP/1.1 {} {}\r\nContent-Type: application/json\r\nContent-Length: {}\r\n"
+                       "Access-Control-Allow-Origin: *\r\nConnection: close\r\n\r\n".format(
+                           codigo, razon, len(cuerpo)).encode("latin-1") + cuerpo)
+        await asyncio.wait_for(escritor.drain(), ESPERA_CLIENTE)
+
+    async def suscribir(self, lector, escritor):
+        """Stream SSE: la lectura actual y despues lo que mande _difundir"""
+        if self.clientes >= self.max_clientes:
+            self.rechazados += 1
+            await self.responder(escritor, 503, b'{"error":"demasiados clientes"}')
+            return
+
+        escritor.write(b"HTTP/1.1 200 OK\r\nContent-Type: text/event-stream\r\nCache-Control: no-cache\r\n"
+                       b"Access-Control-Allow-Origin: *\r\nConnection: keep-alive\r\n\r\n")
+        if self.actual is not None:
+            escritor.write(b"event: lectura\ndata: " + self.actual + b"\n\n")
+        transporte = escritor.transport
+        self.suscriptores.add(transporte)
+        try:
+            # El cliente no manda nada mas: se espera a que cierre
+            while await lector.read(1024):
+                pass
+        finally:
+            self.suscriptores.discard(transporte)
+
+# ============================================
+# MAIN - Cientos de clientes y tiempo por cuadro
+# ============================================
+
+def _clientes_sse(puerto, cantidad, segundos, resultado):
+    """Proceso aparte: abre los clientes SSE; el primero mide cuanto tarda cada evento"""
+    async def cliente(numero, demoras, contador):
+        lector, escritor = await asyncio.open_connection("127.0.0.1", puerto)
+        escritor.write(b"GET /eventos HTTP/1.1\r\nHost: caja\r\n\r\n")
+        fin = time.time() + segundos
+        try:
+            while time.time() < fin:
+                if numero == 0:
+                    linea = await asyncio.wait_for(lector.readline(), segundos)
+                    if linea.startswith(b"data: "):
+                        datos = json.loads(linea[6:])
+                        demoras.append(time.time() - datetime.fromisoformat(datos["timestamp"]).timestamp())
+                        contador[0] += 1
+                else:
+                    # Los demas solo cuentan eventos (en una sola CPU compiten con el monitor)
+                    datos = await asyncio.wait_for(lector.read(65536), segundos)
+                    contador[0] += datos.count(b"\ndata: ")
+        except asyncio.TimeoutError:
+            pass
+        escritor.close()
+
+    async def todos():
+        demoras = []
+        contador = [0]
+        await asyncio.gather(*(cliente(n, demoras, contador) for n in range(cantidad)))
+        demoras.sort()
+        resultado.put((contador[0], demoras[len(demoras) // 2] if demoras else 0,
+                       demoras[int(len(demoras) * 0.99)] if demoras else 0))
+
+    asyncio.run(todos())
+
+
+if __name__ == '__main__':
+    import multiprocessing
+    import sys
+    from geometria_mandala import GeometriaMandala
+    from render_mandala import dibujar_pil
+    from adquisicion import LecturaSensores, RegistroTiempos
+
+    cantidad = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    puerto = 8766
+    segundos = 8.0
+    publicacion = 0.1  # 10 lecturas por segundo (el monitor publica 1)
+
+    servidor = ServidorVivo(puerto=puerto, host="127.0.0.1")
+    servidor.iniciar()
+    geometria = GeometriaMandala()
+    colores = ((150, 220, 100), (16, 185, 129), (100, 220, 180), (253, 224, 71))
+
+    def cuadros(duracion):
+        """Loop de dibujo a 40 FPS publicando lecturas como el hilo de sensores"""
+        tiempos = RegistroTiempos()
+        fin = time.monotonic() + duracion
+        proxima = 0.0
+        i = 0
+        while time.monotonic() < fin:
+            inicio = time.perf_counter()
+            if time.monotonic() >= proxima:
+                proxima = time.monotonic() + publicacion
+                servidor.publicar(LecturaSensores(temp=21.5 + i % 10 / 10, hum=48, ppm_co2=620, lux=300,
+                                                  nivel_ruido="bajo", movimiento=False, timestamp=time.time()))
+            dibujar_pil(geometria, i % 12, 5, *colores)
+            tiempos.registrar(time.perf_counter() - inicio)
+            i += 1
+            time.sleep(max(0.0, 0.025 - (time.perf_counter() - inicio)))
+        return tiempos
+
+    print("Sin clientes:      " + cuadros(4.0).resumen())
+
+    resultado = multiprocessing.Queue()
+    proceso = multiprocessing.Process(target=_clientes_sse, args=(puerto, cantidad, segundos, resultado))
+    proceso.start()
+    time.sleep(1.5)
+    print("Clientes conectados: {}".format(servidor.clientes))
+    servidor.publicar(LecturaSensores(temp=21.5, hum=48, ppm_co2=620, lux=300, nivel_ruido="bajo",
+                                      movimiento=False, timestamp=time.time()))
+    time.sleep(0.2)
+    print("Difusion de una lectura a todos: {:.2f} ms".format(servidor.ultima_difusion_ms))
+    print("Con {} clientes:  ".format(cantidad) + cuadros(segundos - 2.5).resumen())
+    recibidos, p50, p99 = resultado.get()
+    proceso.join()
+    servidor.detener()
+
+    print("Eventos publicados: {}  recibidos: {}  lentos desconectados: {}".format(
+        servidor.publicados, recibidos, servidor.lentos))
+    print("Demora hasta el cliente: p50={:.1f}ms p99={:.1f}ms".format(p50 * 1000, p99 * 1000))
@@ -0,0 +1,403 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Subida de Lecturas a PostgreSQL - Proyecto Zenalyze
+Un hilo mantiene una conexion abierta, junta lecturas y las inserta en lotes
+en la tabla lecturas (o las manda al hub de la flota); si la base no responde
+las guarda en disco y las reenvia al reconectar
+"""
+
+import io
+import json
+import os
+import socket
+import sys
+import threading
+import time
+import urllib.request
+from datetime import datetime
+
+from compresion_lecturas import codificar_filas_texto, COMPRIMIR_LECTURAS, ESCALAS_HUB
+
+# ============================================
+# CONFIGURACION
+# ============================================
+
+DB_CONFIG = {
+    'host': os.getenv('DB_HOST', 'localhost'),
+    'port': int(os.getenv('DB_PORT', 5432)),
+    'user': os.getenv('DB_USER', 'proyecto_iot'),
+    'password': os.getenv('DB_PASSWORD', ''),
+    'dbname': os.getenv('DB_NAME', 'bienestar_db'),
+    'connect_timeout': 5,
+}
+
+# Subir lecturas (por defecto si hay DB_HOST configurado)
+SUBIR_LECTURAS = os.getenv('SUBIR_LECTURAS', '1' if os.getenv('DB_HOST') else '0') == '1'
+
+# 'values' = execute_values, 'copy' = COPY FROM STDIN, 'hub' = POST al hub de la flota
+METODO_SUBIDA = os.getenv('METODO_SUBIDA', 'values')
+
+# Hub de la flota (hub_flota.py) y nombre de esta caja
+HUB_URL = os.getenv('HUB_URL', 'http://localhost:8740/ingesta')
+DISPOSITIVO = os.getenv('DISPOSITIVO', socket.gethostname())
+HUB_TOKEN = os.getenv('HUB_TOKEN', '')  # El mismo que tiene el hub (vacio = sin token)
+
+INTERVALO_FLUSH = float(os.getenv('INTERVALO_FLUSH', 5))  # segundos entre lotes
+INTERVALO_LECTURAS_DB = float(os.getenv('INTERVALO_LECTURAS_DB', 10))  # segundos entre filas guardadas
+TAMANO_LOTE_DB = 500           # lecturas por lote
+MAX_BUFFER_DB = 20000          # lecturas en memoria antes de mandar a disco
+
+# Spool en disco para cuando la base no responde
+ARCHIVO_SPOOL = 'data/spool_lecturas.jsonl'
+MAX_SPOOL_MB = 50
+
+COLUMNAS = ("timestamp", "temperatura", "humedad", "luz", "co2_estimado", "movimiento", "ruido")
+
+DEBUG = True
+
+# ============================================
+# CLASE SUBIDOR
+# ============================================
+
+class SubidorLecturas(threading.Thread):
+    def __init__(self, config=None, tabla="lecturas", metodo=METODO_SUBIDA,
+                 intervalo=INTERVALO_FLUSH, intervalo_lecturas=INTERVALO_LECTURAS_DB,
+                 tamano_lote=TAMANO_LOTE_DB,
+                 archivo_spool=ARCHIVO_SPOOL, max_spool_mb=MAX_SPOOL_MB):
+        super().__init__(name="subida-db", daemon=True)
+        self.config = config or DB_CONFIG
+        self.tabla = tabla
+        self.metodo = metodo
+        self.intervalo = intervalo
+        self.intervalo_lecturas = intervalo_lecturas
+        self.ultima_agregada = 0.0
+        self.tamano_lote = tamano_lote
+        self.archivo_spool = archivo_spool
+        self.max_spool = int(max_spool_mb * 1024 * 1024)
+
+        self.conexion = None
+        self.espera_reconexion = 1.0
+        # Numero de secuencia por fila para el hub: arranca en milisegundos desde epoch
+        # para que siga creciendo despues de reiniciar la caja
+        self.secuencia = int(time.time() * 1000)
+        self.proxima_reconexion = 0.0
+
+        self.lock = threading.Lock()
+        self.buffer = []
+        self.detener_evento = threading.Event()
+
+        # Estadisticas
+        self.subidas = 0
+        self.lotes = 0
+        self.en_spool = 0
+        self.descartadas = 0
+        self.errores = 0
+        self.ultimo_flush_ms = 0.0
+
+    # ---------- Lado del monitor ----------
+
+    def agregar(self, lectura):
+        """Agrega una LecturaSensores al buffer (no bloquea)"""
+        if lectura.timestamp - self.ultima_agregada < self.intervalo_lecturas:
+            return
+        self.ultima_agregada = lectura.timestamp
+
+        valores = (float(lectura.temp), float(lectura.hum), int(lectura.lux), int(lectura.ppm_co2),
+                   bool(lectura.movimiento), lectura.nivel_ruido != "silencio")
+        if self.metodo == 'hub':
+            self.encolar(lectura.timestamp, 'l', valores)
+        else:
+            self.encolar(lectura.timestamp, None, valores)
+
+    def agregar_estado(self, estado, lectura):
+        """Agrega un estado de animo (solo se suben al hub; la base no tiene tabla para ellos)"""
+        if self.metodo != 'hub':
+            return
+        self.encolar(time.time(), 'e', (estado, float(lectura.temp), float(lectura.hum),
+                                        int(lectura.ppm_co2), int(lectura.lux), lectura.nivel_ruido))
+
+    def encolar(self, timestamp, tipo, valores):
+        """Fila al buffer; para el hub lleva secuencia y tipo ('l' lectura, 'e' estado)"""
+        if tipo is None:
+            fila = (datetime.fromtimestamp(timestamp),) + valores
+        else:
+            fila = (datetime.fromtimestamp(timestamp), 0, tipo) + valores
+        with self.lock:
+            if len(self.buffer) >= MAX_BUFFER_DB:
+                self.descartadas += 1
+                return
+            if tipo is not None:
+                self.secuencia += 1
+                fila = fila[:1] + (self.secuencia,) + fila[2:]
+            self.buffer.append(fila)
+
+    # ---------- Hilo de subida ----------
+
+    def run(self):
+        """Sube el buffer cada intervalo; al terminar sube lo pendiente"""
+        while not self.detener_evento.wait(self.intervalo):
+            self.flush()
+        self.flush()
+        self.desconectar()
+
+    def flush(self):
+        """Sube todo lo pendiente: primero el spool, despues el buffer"""
+        with self.lock:
+            filas, self.buffer = self.buffer, []
+
+        if not self.conectar():
+            self.guardar_spool(filas)
+            return
+
+        if not self.reenviar_spool():
+            self.guardar_spool(filas)
+            return
+
+        for i in range(0, len(filas), self.tamano_lote):
+            lote = filas[i:i + self.tamano_lote]
+            if not self.subir_lote(lote):
+                self.guardar_spool(filas[i:])
+                return
+
+    def conectar(self):
+        """Conexion persistente con reintentos espaciados"""
+        if self.metodo == 'hub':
+            return time.monotonic() >= self.proxima_reconexion  # HTTP sin conexion fija
+        if self.conexion is not None and not self.conexion.closed:
+            return True
+        if time.monotonic() < self.proxima_reconexion:
+            return False
+
+        try:
+            import psycopg2
+            self.conexion = psycopg2.connect(**self.config)
+            self.espera_reconexion = 1.0
+            if DEBUG:
+                print("OK: Conectado a PostgreSQL ({})".format(self.config['host']))
+            return True
+        except Exception as e:
+            self.conexion = None
+            self.proxima_reconexion = time.monotonic() + self.espera_reconexion
+            self.espera_reconexion = min(self.espera_reconexion * 2, 60.0)
+            if DEBUG:
+                print("DEBUG: PostgreSQL no disponible - " + str(e).strip())
+            return False
+
+    def desconectar(self):
+        if self.conexion is not None:
+            try:
+                self.conexion.close()
+            except Exception:
+                pass
+            self.conexion = None
+
+    def subir_lote(self, filas):
+        """Inserta un lote en una transaccion; False si hay que reintentar despues"""
+        if not filas:
+            return True
+
+        inicio = time.perf_counter()
+        if self.metodo == 'hub':
+            if not self.enviar_hub(filas):
+                return False
+            self.ultimo_flush_ms = (time.perf_counter() - inicio) * 1000
+            self.subidas += len(filas)
+            self.lotes += 1
+            return True
+
+        try:
+            with self.conexion.cursor() as cur:
+                if self.metodo == 'copy':
+                    self.copiar(cur, filas)
+                else:
+                    from psycopg2.extras import execute_values
+                    execute_values(cur, "INSERT INTO {} ({}) VALUES %s".format(
+                        self.tabla, ", ".join(COLUMNAS)), filas, page_size=len(filas))
+            self.conexion.commit()
+        except Exception as e:
+            self.errores += 1
+            print("ERROR: Subiendo lecturas - " + str(e).strip())
+            try:
+                self.conexion.rollback()
+            except Exception:
+                pass
+            self.desconectar()
+            return False
+
+        self.ultimo_flush_ms = (time.perf_counter() - inicio) * 1000
+        self.subidas += len(filas)
+        self.lotes += 1
+        return True
+
+    def copiar(self, cur, filas):
+        """COPY FROM STDIN en formato texto"""
+        copiar_filas(cur, self.tabla, COLUMNAS, filas)
+
+    def enviar_hub(self, filas):
+        """Manda un lote al hub; True solo si el hub confirma que quedo en la base"""
+        lecturas = []
+        estados = []
+        for fila in filas:
+            compacta = [round(fila[0].timestamp(), 3), fila[1]] + list(fila[3:])
+            (lecturas if fila[2] == 'l' else estados).append(compacta)
+        mensaje = {"d": DISPOSITIVO, "l": lecturas, "e": estados}
+        if COMPRIMIR_LECTURAS and lecturas:
+            # Lecturas en deltas cuantizados (ESCALAS_HUB) en vez de JSON
+            mensaje["lz"] = codificar_filas_texto(lecturas, ESCALAS_HUB)
+            mensaje["l"] = []
+        cuerpo = json.dumps(mensaje, separators=(",", ":")).encode("utf-8")
+
+        encabezados = {"Content-Type": "application/json"}
+        if HUB_TOKEN:
+            encabezados["Authorization"] = "Bearer " + HUB_TOKEN
+        pedido = urllib.request.Request(HUB_URL, data=cuerpo, method="POST", headers=encabezados)
+        try:
+            with urllib.request.urlopen(pedido, timeout=10) as respuesta:
+                ok = respuesta.status == 200 and json.loads(respuesta.read()).get("ok")
+        except Exception as e:
+            ok = False
+            print("ERROR: Enviando al hub - " + str(e).strip())
+
+        if not ok:
+            # Mismo espaciado de reintentos que la conexion a PostgreSQL
+            self.errores += 1
+            self.proxima_reconexion = time.monotonic() + self.espera_reconexion
+            self.espera_reconexion = min(self.espera_reconexion * 2, 60.0)
+            return False
+        self.espera_reconexion = 1.0
+        return True
+
+    # ---------- Spool en disco ----------
+
+    def guardar_spool(self, filas):
+        """Guarda filas en el spool para reenviarlas despues"""
+        if not filas:
+            return
+        try:
+            if os.path.exists(self.archivo_spool) and os.path.getsize(self.archivo_spool) > self.max_spool:
+                self.descartadas += len(filas)
+                return
+            directorio = os.path.dirname(self.archivo_spool)
+            if directorio and not os.path.exists(directorio):
+                os.makedirs(directorio)
+            with open(self.archivo_spool, 'a', encoding='utf-8') as f:
+                for fila in filas:
+                    f.write(json.dumps([fila[0].isoformat()] + list(fila[1:])) + "\n")
+            self.en_spool += len(filas)
+        except Exception as e:
+            self.descartadas += len(filas)
+            print("ERROR: No se pudo escribir el spool - " + str(e))
+
+    def reenviar_spool(self):
+        """Sube lo que quedo en disco; False si la base fallo a mitad"""
+        if not os.path.exists(self.archivo_spool):
+            return True
+
+        # Se mueve antes de leer para que lo nuevo vaya a un spool limpio
+        pendiente = self.archivo_spool + ".reenvio"
+        if not os.path.exists(pendiente):
+            os.replace(self.archivo_spool, pendiente)
+
+        filas = []
+        with open(pendiente, encoding='utf-8') as f:
+            for linea in f:
+                try:
+                    datos = json.loads(linea)
+                    filas.append(tuple([datetime.fromisoformat(datos[0])] + datos[1:]))
+                except ValueError:
+                    continue  # Linea cortada por un apagon
+
+        for i in range(0, len(filas), self.tamano_lote):
+            if not self.subir_lote(filas[i:i + self.tamano_lote]):
+                self.guardar_spool(filas[i:])
+                os.remove(pendiente)
+                return False
+
+        os.remove(pendiente)
+        if DEBUG and filas:
+            print("OK: {} lecturas reenviadas desde el spool".format(len(filas)))
+        return True
+
+    def detener(self, espera=10.0):
+        """Sube lo pendiente y termina el hilo"""
+        self.detener_evento.set()
+        if self.is_alive():
+            self.join(espera)
+
+def copiar_filas(cur, tabla, columnas, filas):
+    """COPY FROM STDIN en formato texto de una lista de tuplas"""
+    buffer = io.StringIO()
+    for fila in filas:
+        buffer.write("\t".join("\\N" if v is None else
+                               ("t" if v is True else "f" if v is False else str(v))
+                               for v in fila))
+        buffer.write("\n")
+    buffer.seek(0)
+    cur.copy_expert("COPY {} ({}) FROM STDIN".format(tabla, ", ".join(columnas)), buffer)
+
+# ============================================
+# MAIN - Benchmark contra un PostgreSQL local
+# ============================================
+
+if __name__ == '__main__':
+    import psycopg2
+    from adquisicion import LecturaSensores
+
+    total = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    config = dict(DB_CONFIG)
+
+    conexion = psycopg2.connect(**config)
+    with conexion.cursor() as cur:
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS lecturas_bench (
+                id SERIAL PRIMARY KEY, timestamp TIMESTAMP, temperatura REAL, humedad REAL,
+                luz INTEGER, co2_estimado INTEGER, movimiento BOOLEAN, ruido BOOLEAN)
+        """)
+    conexion.commit()
+
+    def lecturas(n):
+        ahora = time.time()
+        return [LecturaSensores(temp=22.0 + i % 10 * 0.1, hum=50.0, ppm_co2=400 + i % 50, lux=300,
+                                nivel_ruido="silencio", movimiento=bool(i % 7 == 0),
+                                timestamp=ahora + i * 0.3) for i in range(n)]
+
+    # Antes: conectar, insertar una fila y desconectar
+    muestra = min(total, 200)
+    inicio = time.perf_counter()
+    for lectura in lecturas(muestra):
+        c = psycopg2.connect(**config)
+        with c.cursor() as cur:
+            cur.execute("INSERT INTO lecturas_bench ({}) VALUES (%s, %s, %s, %s, %s, %s, %s)".format(
+                ", ".join(COLUMNAS)), (datetime.fromtimestamp(lectura.timestamp), lectura.temp,
+                                       lectura.hum, lectura.lux, lectura.ppm_co2,
+                                       lectura.movimiento, False))
+        c.commit()
+        c.close()
+    segundos = time.perf_counter() - inicio
+    print("fila por conexion: {:8.0f} filas/s".format(muestra / segundos))
+
+    for metodo in ('values', 'copy'):
+        subidor = SubidorLecturas(config=config, tabla="lecturas_bench", metodo=metodo,
+                                  intervalo_lecturas=0)
+        for lectura in lecturas(total):
+            subidor.agregar(lectura)
+        latencias = []
+        inicio = time.perf_counter()
+        with subidor.lock:
+            filas, subidor.buffer = subidor.buffer, []
+        subidor.conectar()
+        for i in range(0, len(filas), subidor.tamano_lote):
+            subidor.subir_lote(filas[i:i + subidor.tamano_lote])
+            latencias.append(subidor.ultimo_flush_ms)
+        segundos = time.perf_counter() - inicio
+        subidor.desconectar()
+        latencias.sort()
+        print("{:>6} lote {}: {:8.0f} filas/s  flush p50={:.1f}ms p95={:.1f}ms".format(
+            metodo, subidor.tamano_lote, total / segundos,
+            latencias[len(latencias) // 2], latencias[int(len(latencias) * 0.95)]))
+
+    with conexion.cursor() as cur:
+        cur.execute("DROP TABLE lecturas_bench")
+    conexion.commit()
+    conexion.close()
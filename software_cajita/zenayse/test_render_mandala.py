@@ -0,0 +1,51 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Pruebas del Render NumPy - Proyecto Zenalyze
+Cada cuadro de render_mandala.py contra el mismo cuadro dibujado con PIL
+"""
+
+import numpy as np
+import pytest
+
+from geometria_mandala import GeometriaMandala, ANILLOS_MIN, ANILLOS_MAX, SIMETRIA, ANCHO, ALTO
+from render_mandala import RenderMandala, diferencia_con_pil, dibujar_pil, TOLERANCIA_PIXELES
+
+ROTACIONES = (0, 1, SIMETRIA // 4, SIMETRIA // 2 + 3, SIMETRIA - 1)
+
+# Colores de los monitores (calmo) y uno con todos los canales distintos
+COLORES = (
+    ((150, 220, 100), (16, 185, 129), (100, 220, 180), (253, 224, 71)),
+    ((239, 68, 68), (59, 130, 246), (250, 204, 21), (255, 255, 255)),
+)
+
+
+@pytest.fixture(scope="module")
+def render():
+    return RenderMandala(GeometriaMandala())
+
+
+@pytest.mark.parametrize("anillos", range(ANILLOS_MIN, ANILLOS_MAX + 1))
+@pytest.mark.parametrize("colores", COLORES)
+def test_igual_a_pil(render, anillos, colores):
+    peor, media = diferencia_con_pil(render, colores, rotaciones=ROTACIONES, cantidades_anillos=(anillos,))
+    assert peor <= TOLERANCIA_PIXELES, "peor {:.2%}, media {:.2%}".format(peor, media)
+
+
+def test_buffer_sin_restos_del_cuadro_anterior(render):
+    # El buffer es fijo: un cuadro con menos anillos no puede conservar los del anterior
+    colores = COLORES[0]
+    render.dibujar(0, ANILLOS_MAX, *colores)
+    cuadro = render.dibujar(5, ANILLOS_MIN, *colores)[:, :, :3]
+    referencia = np.asarray(dibujar_pil(render.g, 5, ANILLOS_MIN, *colores))
+    distintos = np.count_nonzero((referencia != cuadro).any(axis=2)) / float(ANCHO * ALTO)
+    assert distintos <= TOLERANCIA_PIXELES
+
+
+def test_rotaciones_distintas_se_distinguen(render):
+    # La comparacion no es trivial: dos rotaciones distintas no pasan por iguales
+    colores = COLORES[0]
+    referencia = np.asarray(dibujar_pil(render.g, 0, ANILLOS_MIN, *colores))
+    cuadro = render.dibujar(SIMETRIA // 4, ANILLOS_MIN, *colores)[:, :, :3]
+    distintos = np.count_nonzero((referencia != cuadro).any(axis=2)) / float(ANCHO * ALTO)
+    assert distintos > TOLERANCIA_PIXELES
@@ -7,31 +7,38 @@ Version con DEBUG para botones y Medidor de Ruido
 
 import time
 import sys
+import threading
 import os
 from datetime import datetime
 from dotenv import load_dotenv
-import RPi.GPIO as GPIO
-import board
-import adafruit_dht
-import busio
-import adafruit_ads1x15.ads1115 as ADS
-from adafruit_ads1x15.analog_in import AnalogIn
-from luma.core.interface.serial import spi
-from luma.lcd.device import st7789
-from luma.core.render import canvas
 from PIL import Image, ImageDraw, ImageFont, ImageOps
 
-# Cargar configuracion
+# Cargar configuracion antes de los modulos que leen variables de entorno
 load_dotenv()
 
+from salida_lcd import SalidaLCD
+from atlas_texto import atlas_de
+from adquisicion import (LecturaSensores, HiloAdquisicion, RegistroTiempos, SENSORES_EN_HILO,
+                         voltaje_a_ppm, clasificar_calidad)
+from entradas import EntradaGPIO
+from hardware import crear_hardware, MODO_HARDWARE
+from memoria_sensores import LectorMemoria, EntradaCompartida, FUENTE_SENSORES
+from metricas import MetricasMonitor
+from servidor_vivo import ServidorVivo
+from planificador import PlanificadorCuadros, FPS_OBJETIVO
+from reposo import MaquinaReposo, MODO_REPOSO
+from microfono import (MuestreadorMicrofono, LineaBaseMicrofono, clasificar_ruido,
+                       TASA_ADS1115, UMBRALES_ADAPTATIVOS)
+from subida_db import SubidorLecturas, SUBIR_LECTURAS
+from compresion_lecturas import CompresorLecturas, COMPRIMIR_LECTURAS
+from almacen_lecturas import AlmacenLecturas, GUARDAR_HISTORIAL
+from agregados import Agregador, fila_csv, GUARDAR_AGREGADOS, ARCHIVO_AGREGADOS, ENCABEZADO_AGREGADOS
+from registro_animo import EscritorEstados
+
 # ============================================
 # CONFIGURACION
 # ============================================
 
-# Inicializar I2C y ADS1115 primero
-i2c = board.I2C()
-ads = ADS.ADS1115(i2c)
-
 # GPIO Sensores
 PIN_DHT11 = int(os.getenv('PIN_DHT11', 23))
 PIN_MQ135 = int(os.getenv('PIN_MQ135', 26))
@@ -50,6 +57,14 @@ PIN_RST = int(os.getenv('PIN_DISPLAY_RST', 25))
 # Microfono - Canal ADS1115
 CANAL_MIC = 1
 
+# Subtitulo de cada pagina (parte del fondo fijo)
+SUBTITULOS_PAGINA = ["Pag 1/3: Clima & Luz", "Pag 2/3: Movimiento & Aire", "Pag 3/3: Ruido (Microfono)"]
+
+# Textos completos que se pre-rasterizan (el resto se arma con glifos)
+TEXTOS_FIJOS_PAGINAS = ("MOVIMIENTO", "Reposo", "Temp/Hum: ERROR", "LDR: NO CONECTADO", "MQ-135: ERROR",
+                        "Microfono: ERROR", "Estado: SILENCIO", "Estado: BAJO", "Estado: MEDIO",
+                        "Estado: ALTO", "Aire: EXCELENTE", "Aire: BUENO", "Aire: REGULAR", "Aire: MALO")
+
 # DEBUG
 DEBUG = True
 
@@ -59,15 +74,25 @@ DEBUG = True
 
 class SensorLCDMonitor:
     def __init__(self):
+        self.hw = crear_hardware()  # Real o simulado segun MODO_HARDWARE
+        self.gpio = None
         self.device = None
+        self.salida = None
         self.dht = None
         self.ldr = None
         self.mic = None
+        self.muestreador = None
+        self.lector = None  # LectorMemoria si FUENTE_SENSORES=demonio
+        self.desde_demonio = False  # Sin canales locales: el demonio lee los sensores
+        self.demonio_caido = False  # El demonio dejo de publicar (lecturas congeladas)
+        self.lectores_viejos = []  # Segmentos de un demonio anterior; se cierran al salir
+        self.lock_ads = threading.Lock()  # El ADS1115 lo comparten dos hilos
         
         # Fuentes
         self.font_titulo = None
         self.font_normal = None
         self.font_pequena = None
+        self.atlas = {}  # id(fuente) -> AtlasTexto
         
         # Estado de sensores
         self.temp = 0
@@ -94,7 +119,7 @@ class SensorLCDMonitor:
         self.voltaje_max = 3.0
         
         # Microfono
-        self.nivel_base_mic = 0
+        self.linea_base_mic = None
         self.valor_mic = 0
         self.diferencia_mic = 0
         self.nivel_ruido = "silencio"
@@ -105,19 +130,58 @@ class SensorLCDMonitor:
         self.umbral_medio = 800
         self.umbral_alto = 1500
         
-        # Botones
-        self.btn1 = False
-        self.btn2 = False
-        self.btn3 = False
-        self.btn1_anterior = False
-        self.btn3_anterior = False
+        # Botones y PIR por interrupcion (anti-rebote por pin)
+        self.entradas = None
         
         # Pagina actual (0 a 2)
         self.pagina = 0
         
+        # Fondo fijo por pagina y lo ultimo enviado (se redibuja solo si cambia)
+        self.fondos = {}
+        self.clave_mostrada = None
+        self.cuadros_sin_cambios = 0
+        
         # Control de tiempo
         self.ultimo_update_sensores = 0
         self.intervalo_sensores = 1  # segundos - Mas rapido
+        self.intervalo_sensores_base = self.intervalo_sensores  # El reposo lo estira
+        
+        # Ultima lectura publicada (el dibujo solo lee esta referencia)
+        self.lectura = self.crear_lectura()
+        self.hilo_sensores = None
+        self.tiempos_cuadro = RegistroTiempos()
+        
+        # Reposo por PIR, botones y luz (None si MODO_REPOSO=0); un flanco corta la espera del cuadro
+        self.reposo = MaquinaReposo() if MODO_REPOSO else None
+        self.planificador = PlanificadorCuadros(despertador=self.reposo.despertador if self.reposo else None)
+        self.pantalla_encendida = True
+        
+        # Tiempos por etapa y contadores (sin costo si METRICAS_PUERTO=0)
+        self.metricas = MetricasMonitor(self)
+        self.tiempo_spi = 0.0
+        
+        # Ultima lectura por HTTP y SSE para el dashboard (desactivado si VIVO_PUERTO=0)
+        self.vivo = ServidorVivo()
+        
+        # Banda muerta antes de subir a la base o al hub (None = pasan todas las lecturas)
+        self.compresor = CompresorLecturas() if COMPRIMIR_LECTURAS else None
+        
+        # Subida a PostgreSQL en segundo plano (None si esta desactivada);
+        # con compresion no se espacian las filas: ya decide la banda muerta
+        self.subidor = None
+        if SUBIR_LECTURAS:
+            self.subidor = SubidorLecturas(intervalo_lecturas=0) if self.compresor else SubidorLecturas()
+        
+        # Historial local de todas las lecturas (archivo circular mapeado)
+        self.historial = None
+        
+        # Agregados por minuto/hora/dia, escritos en segundo plano
+        self.agregador = None
+        self.escritor_agregados = None
+        if GUARDAR_AGREGADOS:
+            self.escritor_agregados = EscritorEstados(ARCHIVO_AGREGADOS, ENCABEZADO_AGREGADOS)
+            self.agregador = Agregador(
+                lambda bloque: self.escritor_agregados.registrar(fila_csv(bloque)))
         
     def cargar_fuentes(self):
         """Carga las fuentes disponibles"""
@@ -130,31 +194,56 @@ class SensorLCDMonitor:
             self.font_normal = ImageFont.load_default()
             self.font_pequena = ImageFont.load_default()
         
-    def calibrar_microfono(self):
-        """Calibra el microfono tomando el nivel base"""
-        if DEBUG:
-            print("INFO: Calibrando microfono...")
-        
-        valores = []
-        for i in range(50):
-            if self.mic:
-                valores.append(self.mic.value)
-            time.sleep(0.02)
-        
-        if valores:
-            self.nivel_base_mic = sum(valores) / len(valores)
-            if DEBUG:
-                print("OK: Nivel base del microfono: {}\n".format(int(self.nivel_base_mic)))
+        # Glifos de los campos que cambian (el titulo va en el fondo fijo)
+        atlas_de(self.atlas, self.font_normal, textos_fijos=TEXTOS_FIJOS_PAGINAS)
+        atlas_de(self.atlas, self.font_pequena)
         
     def inicializar(self):
         """Inicializa todos los componentes"""
         print("CONFIG: Inicializando componentes...\n")
+        self.metricas.iniciar()
+        self.vivo.iniciar()
         
         # Cargar fuentes
         self.cargar_fuentes()
+        if self.subidor:
+            self.subidor.start()
+        if self.escritor_agregados:
+            self.escritor_agregados.start()
+        if GUARDAR_HISTORIAL:
+            try:
+                self.historial = AlmacenLecturas()
+            except Exception as e:
+                print("ERROR: Historial no disponible - " + str(e))
+        
+        # Sensores: propios o los del demonio por memoria compartida
+        if FUENTE_SENSORES == 'demonio':
+            if not self.conectar_demonio():
+                return False
+        else:
+            self.inicializar_sensores()
         
+        # Display ST7789
+        print("INFO: Inicializando Display ST7789...")
+        try:
+            self.device = self.hw.display(PIN_DC, PIN_RST)
+            self.salida = SalidaLCD(self.device)
+            print("OK: Display inicializado\n")
+        except Exception as e:
+            print("ERROR: Display - " + str(e))
+            print("INFO: Verifica conexion SPI")
+            return False
+        
+        print("="*60)
+        print("OK: INICIALIZACION COMPLETADA")
+        print("="*60)
+        return True
+    
+    def inicializar_sensores(self):
+        """Abre el GPIO, el DHT11, el ADS1115 y el microfono"""
         # GPIO
         print("INFO: Configurando GPIO...")
+        GPIO = self.gpio = self.hw.gpio()
         GPIO.setwarnings(False)
         GPIO.setmode(GPIO.BCM)
         
@@ -166,6 +255,15 @@ class SensorLCDMonitor:
         GPIO.setup(PIN_BTN1, GPIO.IN, pull_up_down=GPIO.PUD_UP)
         GPIO.setup(PIN_BTN2, GPIO.IN, pull_up_down=GPIO.PUD_UP)
         GPIO.setup(PIN_BTN3, GPIO.IN, pull_up_down=GPIO.PUD_UP)
+        
+        # Deteccion de flancos en lugar de leer los pines cada cuadro
+        self.movimiento = bool(GPIO.input(PIN_PIR))
+        self.movimiento_anterior = self.movimiento
+        self.entradas = EntradaGPIO(GPIO, al_encolar=self.reposo.actividad if self.reposo else None)
+        self.entradas.agregar_boton(PIN_BTN1)
+        self.entradas.agregar_boton(PIN_BTN3)
+        self.entradas.agregar_sensor(PIN_PIR)
+        self.hw.iniciar_actividad(PIN_PIR, [PIN_BTN1, PIN_BTN3])
         print("OK: GPIO configurado")
         print("  PIN_BTN1 = GPIO {}".format(PIN_BTN1))
         print("  PIN_BTN2 = GPIO {}".format(PIN_BTN2))
@@ -175,7 +273,7 @@ class SensorLCDMonitor:
         # DHT11
         print("INFO: Inicializando DHT11...")
         try:
-            self.dht = adafruit_dht.DHT11(board.D23, use_pulseio=False)
+            self.dht = self.hw.dht11(PIN_DHT11)
             print("OK: DHT11 inicializado\n")
         except Exception as e:
             print("ERROR: DHT11 - " + str(e) + "\n")
@@ -183,37 +281,37 @@ class SensorLCDMonitor:
         # ADS1115 + LDR (Canal A0)
         print("INFO: Inicializando ADS1115 y LDR (Canal A0)...")
         try:
-            self.ldr = AnalogIn(ads, 0)
+            self.ldr = self.hw.canal_analogico(0)
             print("OK: ADS1115 y LDR inicializados (Canal A0)")
             
             # MQ-135 Analogico en canal A2
-            self.mq135_channel = AnalogIn(ads, 2)
+            self.mq135_channel = self.hw.canal_analogico(2)
             print("OK: MQ-135 Analogico inicializado (Canal A2)")
             
             # Microfono en canal A1
-            self.mic = AnalogIn(ads, CANAL_MIC)
+            self.mic = self.hw.canal_analogico(CANAL_MIC)
+            self.hw.configurar_tasa_adc(TASA_ADS1115)  # Conversiones rapidas para el microfono
             print("OK: Microfono inicializado (Canal A{})\n".format(CANAL_MIC))
         except Exception as e:
             print("ERROR: ADS1115 - " + str(e) + "\n")
         
-        # Calibrar micrófono
+        # Sin calibracion bloqueante: la linea base guardada se sigue ajustando en linea
         if self.mic:
-            self.calibrar_microfono()
-        
-        # Display ST7789
-        print("INFO: Inicializando Display ST7789...")
+            self.linea_base_mic = LineaBaseMicrofono.cargar()
+            self.muestreador = MuestreadorMicrofono(self.mic, self.linea_base_mic, self.lock_ads)
+            self.muestreador.start()
+    
+    def conectar_demonio(self):
+        """Lecturas y flancos desde demonio_sensores.py, sin tocar el bus"""
         try:
-            serial = spi(port=0, device=0, gpio_DC=PIN_DC, gpio_RST=PIN_RST)
-            self.device = st7789(serial, width=240, height=240, rotate=3)
-            print("OK: Display inicializado\n")
-        except Exception as e:
-            print("ERROR: Display - " + str(e))
-            print("INFO: Verifica conexion SPI")
+            self.lector = LectorMemoria()
+        except (FileNotFoundError, ValueError) as e:
+            print("ERROR: Demonio de sensores no disponible - " + str(e))
             return False
-        
-        print("="*60)
-        print("OK: INICIALIZACION COMPLETADA")
-        print("="*60)
+        self.entradas = EntradaCompartida(self.lector)
+        self.desde_demonio = True
+        self.demonio_caido = not self.lector.al_dia()
+        print("OK: Sensores desde el demonio (memoria compartida)\n")
         return True
     
     def leer_sensores(self):
@@ -224,6 +322,23 @@ class SensorLCDMonitor:
             return  # No leer todavia
         
         self.ultimo_update_sensores = ahora
+        self.muestrear_sensores()
+    
+    def crear_lectura(self):
+        """Foto inmutable del estado actual de los sensores"""
+        return LecturaSensores(temp=self.temp, hum=self.hum, ppm_co2=self.ppm_co2,
+                               lux=self.lux, nivel_ruido=self.nivel_ruido,
+                               movimiento=self.movimiento, timestamp=time.time(),
+                               voltaje_ldr=self.voltaje_ldr, calidad_aire=self.calidad_aire,
+                               valor_mic=self.valor_mic, diferencia_mic=self.diferencia_mic,
+                               co2=self.co2)
+    
+    def muestrear_sensores(self):
+        """Lee todos los sensores y publica la lectura"""
+        if self.lector:
+            self.muestrear_memoria()
+            return
+        inicio = time.perf_counter()
         
         # DHT11
         if self.dht:
@@ -242,34 +357,26 @@ class SensorLCDMonitor:
                     # Si falla, usar el valor anterior (invisible para el usuario)
                     self.temp = self.temp_anterior
                     self.hum = self.hum_anterior
+                    self.metricas.respaldos.incrementar("temp")
                     if DEBUG:
                         print("DEBUG: DHT11 lectura None, usando valor anterior")
             except:
                 # Si hay excepcion, usar el valor anterior
                 self.temp = self.temp_anterior
                 self.hum = self.hum_anterior
+                self.metricas.errores.incrementar("dht11")
+                self.metricas.respaldos.incrementar("temp")
                 if DEBUG:
                     print("DEBUG: DHT11 error, usando valor anterior")
         
-        # Sensores digitales
-        self.co2 = GPIO.input(PIN_MQ135)
-        estado_pir_actual = GPIO.input(PIN_PIR)
-        self.movimiento = bool(estado_pir_actual)
-        
-        # Detectar transicion (cambio de estado)
-        if self.movimiento and not self.movimiento_anterior:
-            if DEBUG:
-                print("DEBUG: MOVIMIENTO DETECTADO (flanco de subida)")
-        elif not self.movimiento and self.movimiento_anterior:
-            if DEBUG:
-                print("DEBUG: Movimiento finalizado (flanco de bajada)")
-        
-        self.movimiento_anterior = self.movimiento
+        # Sensores digitales (el PIR llega por eventos en procesar_entrada)
+        self.co2 = self.gpio.input(PIN_MQ135)
         
         # LDR (Canal A0)
         if self.ldr:
             try:
-                voltaje_nuevo = self.ldr.voltage
+                with self.lock_ads:
+                    voltaje_nuevo = self.ldr.voltage
                 lux_nuevo = int((voltaje_nuevo / 3.3) * 1000)
                 
                 # Solo actualizar si es valido
@@ -283,19 +390,23 @@ class SensorLCDMonitor:
                     # Si falla, usar el valor anterior
                     self.voltaje_ldr = self.voltaje_ldr_anterior
                     self.lux = self.lux_anterior
+                    self.metricas.respaldos.incrementar("lux")
                     if DEBUG:
                         print("DEBUG: LDR lectura invalida, usando valor anterior")
             except:
                 # Si hay excepcion, usar el valor anterior
                 self.voltaje_ldr = self.voltaje_ldr_anterior
                 self.lux = self.lux_anterior
+                self.metricas.errores.incrementar("ldr")
+                self.metricas.respaldos.incrementar("lux")
                 if DEBUG:
                     print("DEBUG: LDR error, usando valor anterior")
         
         # MQ-135 Analogico (Canal A2)
         if self.mq135_channel:
             try:
-                voltaje_nuevo = self.mq135_channel.voltage
+                with self.lock_ads:
+                    voltaje_nuevo = self.mq135_channel.voltage
                 ppm_nuevo = self.voltaje_a_ppm(voltaje_nuevo)
                 calidad_nueva = self.clasificar_calidad(ppm_nuevo)
                 
@@ -308,216 +419,350 @@ class SensorLCDMonitor:
                     if DEBUG:
                         print("DEBUG: MQ-135 lectura invalida")
             except:
+                self.metricas.errores.incrementar("mq135")
                 if DEBUG:
                     print("DEBUG: MQ-135 error en lectura")
         
-        # Microfono (Canal A1)
-        if self.mic:
+        # Microfono (Canal A1): estadisticas de la ultima ventana del muestreador
+        if self.muestreador:
+            estadisticas = self.muestreador.estadisticas
+            if estadisticas.muestras:
+                self.valor_mic = estadisticas.valor
+                self.diferencia_mic = estadisticas.rms
+                self.nivel_ruido = clasificar_ruido(estadisticas.rms, *self.umbrales_ruido())
+                self.estadisticas_mic[self.nivel_ruido] += 1
+        
+        self.publicar_lectura(self.crear_lectura())
+        self.metricas.lectura.observar(time.perf_counter() - inicio)
+    
+    def revisar_demonio(self):
+        """Marca los sensores caidos si el demonio dejo de publicar; si se reinicio, reabre el segmento"""
+        if self.lector.reemplazado():
             try:
-                self.valor_mic = self.mic.value
-                self.diferencia_mic = abs(self.valor_mic - self.nivel_base_mic)
-                
-                # Determinar nivel de ruido
-                if self.diferencia_mic < self.umbral_bajo:
-                    self.nivel_ruido = "silencio"
-                    self.estadisticas_mic["silencio"] += 1
-                elif self.diferencia_mic < self.umbral_medio:
-                    self.nivel_ruido = "bajo"
-                    self.estadisticas_mic["bajo"] += 1
-                elif self.diferencia_mic < self.umbral_alto:
-                    self.nivel_ruido = "medio"
-                    self.estadisticas_mic["medio"] += 1
-                else:
-                    self.nivel_ruido = "alto"
-                    self.estadisticas_mic["alto"] += 1
-            except:
-                if DEBUG:
-                    print("DEBUG: Microfono error en lectura")
+                nuevo = LectorMemoria()
+            except (FileNotFoundError, ValueError):
+                nuevo = None
+            if nuevo:
+                # Otro hilo puede estar leyendo el segmento anterior: se cierra al salir
+                self.lectores_viejos.append(self.lector)
+                self.lector = nuevo
+                self.entradas = EntradaCompartida(nuevo)
+                print("INFO: Demonio de sensores reiniciado (pid {}), segmento reabierto".format(nuevo.pid))
+        
+        caido = not self.lector.al_dia()
+        if caido != self.demonio_caido:
+            if caido:
+                print("ERROR: Demonio de sensores sin publicar, lecturas congeladas")
+            else:
+                print("OK: Demonio de sensores publicando de nuevo")
+            self.demonio_caido = caido
+        return not caido
+    
+    def muestrear_memoria(self):
+        """Toma la ultima lectura del demonio de sensores (solo si es nueva)"""
+        if not self.revisar_demonio():
+            return
+        inicio = time.perf_counter()
+        lectura = self.lector.leer()
+        if lectura is None or lectura.timestamp == self.lectura.timestamp:
+            return
+        self.estadisticas_mic[lectura.nivel_ruido] += 1
+        self.publicar_lectura(lectura)
+        self.metricas.lectura.observar(time.perf_counter() - inicio)
+    
+    def publicar_lectura(self, lectura):
+        """Publica la lectura para el dibujo y para los que la guardan o la suben"""
+        # Asignar la referencia es atomico
+        self.lectura = lectura
+        self.vivo.publicar(lectura)
+        # Los promedios usan todas las muestras
+        if self.agregador:
+            self.agregador.agregar(lectura)
+        if self.historial is not None:
+            self.historial.agregar(lectura)  # Resolucion completa, sin banda muerta
+        if self.compresor and not self.compresor.filtrar(lectura):
+            return
+        if self.subidor:
+            self.subidor.agregar(lectura)
+    
+    def umbrales_ruido(self):
+        """Umbrales fijos o derivados del ruido observado"""
+        fijos = (self.umbral_bajo, self.umbral_medio, self.umbral_alto)
+        if UMBRALES_ADAPTATIVOS and self.linea_base_mic:
+            return self.linea_base_mic.umbrales(fijos)
+        return fijos
     
     def voltaje_a_ppm(self, voltaje):
         """Convierte voltaje del MQ-135 a PPM CO2"""
-        if voltaje <= self.voltaje_aire_limpio:
-            return 400
-        
-        ppm = 400 + ((voltaje - self.voltaje_aire_limpio) / 
-                     (self.voltaje_max - self.voltaje_aire_limpio)) * 2100
-        
-        return int(min(ppm, 3000))
+        return voltaje_a_ppm(voltaje, self.voltaje_aire_limpio, self.voltaje_max)
     
     def clasificar_calidad(self, ppm):
         """Clasifica calidad del aire segun PPM CO2"""
-        if ppm < 600:
-            return "excelente"
-        elif ppm < 800:
-            return "bueno"
-        elif ppm < 1000:
-            return "regular"
-        else:
-            return "malo"
+        return clasificar_calidad(ppm)
     
-    def leer_botones(self):
-        """Lee estado de botones - Invierte porque usa pull-up"""
-        self.btn1 = not GPIO.input(PIN_BTN1)
-        self.btn2 = not GPIO.input(PIN_BTN2)
-        self.btn3 = not GPIO.input(PIN_BTN3)
-    
-    def dibujar_pagina_1(self, draw):
-        """Pagina 1: Temperatura, Humedad, LDR"""
+    def dibujar_fondo(self, draw, pagina, y_pie):
+        """Partes fijas de una pagina: titulo, subtitulo, separador y pie"""
         draw.rectangle((0, 0, 240, 240), fill="black")
-        
-        y = 10
-        draw.text((10, y), "SENSOR MONITOR", fill="white", font=self.font_titulo)
-        y += 35
-        
-        draw.text((10, y), "Pag 1/3: Clima & Luz", fill="cyan", font=self.font_normal)
-        y += 30
-        
-        draw.line((0, y, 240, y), fill="blue", width=2)
-        y += 15
+        draw.text((10, 10), "SENSOR MONITOR", fill="white", font=self.font_titulo)
+        draw.text((10, 45), SUBTITULOS_PAGINA[pagina], fill="cyan", font=self.font_normal)
+        draw.line((0, 75, 240, 75), fill="blue", width=2)
+        draw.text((10, y_pie), "BTN1=Atras  BTN3=Siguiente", fill="gray", font=self.font_pequena)
+    
+    def dibujar_campos(self, draw, campos):
+        """Dibuja los textos que dependen de la lectura con el atlas de glifos"""
+        for posicion, texto, color, fuente in campos:
+            atlas_de(self.atlas, fuente).dibujar(draw, posicion, texto, color)
+    
+    def campos_pagina_1(self, lectura):
+        """Pagina 1: Temperatura, Humedad, LDR -> (campos, y del pie)"""
+        campos = []
+        y = 90
         
         # DHT11
-        if self.temp and self.hum:
-            draw.text((10, y), "Temp: {:.1f} C".format(self.temp), fill="cyan", font=self.font_normal)
+        if lectura.temp and lectura.hum and not self.demonio_caido:
+            campos.append(((10, y), "Temp: {:.1f} C".format(lectura.temp), "cyan", self.font_normal))
             y += 30
-            draw.text((10, y), "Humedad: {:.0f}%".format(self.hum), fill="cyan", font=self.font_normal)
+            campos.append(((10, y), "Humedad: {:.0f}%".format(lectura.hum), "cyan", self.font_normal))
         else:
-            draw.text((10, y), "Temp/Hum: ERROR", fill="red", font=self.font_normal)
+            campos.append(((10, y), "Temp/Hum: ERROR", "red", self.font_normal))
             y += 30
         
         y += 20
         
-        # LDR
-        if self.ldr:
-            draw.text((10, y), "Luz: {} lux".format(self.lux), fill="yellow", font=self.font_normal)
+        # LDR (local o desde el demonio)
+        if self.ldr or (self.desde_demonio and not self.demonio_caido):
+            campos.append(((10, y), "Luz: {} lux".format(lectura.lux), "yellow", self.font_normal))
             y += 30
-            draw.text((10, y), "V: {:.2f}V".format(self.voltaje_ldr), fill="yellow", font=self.font_normal)
+            campos.append(((10, y), "V: {:.2f}V".format(lectura.voltaje_ldr), "yellow", self.font_normal))
         else:
-            draw.text((10, y), "LDR: NO CONECTADO", fill="red", font=self.font_normal)
+            campos.append(((10, y), "LDR: NO CONECTADO", "red", self.font_normal))
         
-        y += 40
-        draw.text((10, y), "BTN1=Atras  BTN3=Siguiente", fill="gray", font=self.font_pequena)
+        return campos, y + 40
     
-    def dibujar_pagina_2(self, draw):
-        """Pagina 2: Sensores de movimiento y gas analogico"""
-        draw.rectangle((0, 0, 240, 240), fill="black")
-        
-        y = 10
-        draw.text((10, y), "SENSOR MONITOR", fill="white", font=self.font_titulo)
-        y += 35
-        
-        draw.text((10, y), "Pag 2/3: Movimiento & Aire", fill="cyan", font=self.font_normal)
-        y += 30
-        
-        draw.line((0, y, 240, y), fill="blue", width=2)
-        y += 15
+    def campos_pagina_2(self, lectura):
+        """Pagina 2: Sensores de movimiento y gas analogico -> (campos, y del pie)"""
+        campos = []
+        y = 90
         
         # PIR - Movimiento
-        pir_texto = "MOVIMIENTO" if self.movimiento else "Reposo"
-        pir_color = "red" if self.movimiento else "green"
-        draw.text((10, y), pir_texto, fill=pir_color, font=self.font_normal)
+        pir_texto = "MOVIMIENTO" if lectura.movimiento else "Reposo"
+        pir_color = "red" if lectura.movimiento else "green"
+        campos.append(((10, y), pir_texto, pir_color, self.font_normal))
         y += 35
         
         # MQ-135 Analogico - CO2
-        if self.calidad_aire != "error":
-            draw.text((10, y), "CO2: {} ppm".format(self.ppm_co2), fill="yellow", font=self.font_normal)
+        if lectura.calidad_aire != "error":
+            campos.append(((10, y), "CO2: {} ppm".format(lectura.ppm_co2), "yellow", self.font_normal))
             y += 30
             
-            calidad_color = "green" if self.calidad_aire == "excelente" else "yellow" if self.calidad_aire == "bueno" else "orange" if self.calidad_aire == "regular" else "red"
-            draw.text((10, y), "Aire: {}".format(self.calidad_aire.upper()), fill=calidad_color, font=self.font_normal)
+            calidad_color = "green" if lectura.calidad_aire == "excelente" else "yellow" if lectura.calidad_aire == "bueno" else "orange" if lectura.calidad_aire == "regular" else "red"
+            campos.append(((10, y), "Aire: {}".format(lectura.calidad_aire.upper()), calidad_color, self.font_normal))
         else:
-            draw.text((10, y), "MQ-135: ERROR", fill="red", font=self.font_normal)
+            campos.append(((10, y), "MQ-135: ERROR", "red", self.font_normal))
         
-        y += 50
-        draw.text((10, y), "BTN1=Atras  BTN3=Siguiente", fill="gray", font=self.font_pequena)
+        return campos, y + 50
     
-    def dibujar_pagina_3(self, draw):
-        """Pagina 3: Medidor de ruido del microfono"""
-        draw.rectangle((0, 0, 240, 240), fill="black")
-        
-        y = 10
-        draw.text((10, y), "SENSOR MONITOR", fill="white", font=self.font_titulo)
-        y += 35
+    def campos_pagina_3(self, lectura):
+        """Pagina 3: Medidor de ruido del microfono -> (campos, y del pie)"""
+        campos = []
+        y = 90
         
-        draw.text((10, y), "Pag 3/3: Ruido (Microfono)", fill="cyan", font=self.font_normal)
-        y += 30
-        
-        draw.line((0, y, 240, y), fill="blue", width=2)
-        y += 15
-        
-        # Estado del micrófono
-        if self.mic:
+        # Estado del micrófono (local o desde el demonio)
+        if self.mic or (self.desde_demonio and not self.demonio_caido):
             # Valor actual
-            draw.text((10, y), "Valor: {}".format(int(self.valor_mic)), fill="white", font=self.font_normal)
+            campos.append(((10, y), "Valor: {}".format(int(lectura.valor_mic)), "white", self.font_normal))
             y += 30
             
             # Diferencia del nivel base
-            draw.text((10, y), "Dif: {}".format(int(self.diferencia_mic)), fill="white", font=self.font_normal)
+            campos.append(((10, y), "Dif: {}".format(int(lectura.diferencia_mic)), "white", self.font_normal))
             y += 30
             
             # Nivel de ruido con color
-            if self.nivel_ruido == "silencio":
+            if lectura.nivel_ruido == "silencio":
                 ruido_color = "green"
                 ruido_texto = "SILENCIO"
-            elif self.nivel_ruido == "bajo":
+            elif lectura.nivel_ruido == "bajo":
                 ruido_color = "yellow"
                 ruido_texto = "BAJO"
-            elif self.nivel_ruido == "medio":
+            elif lectura.nivel_ruido == "medio":
                 ruido_color = "orange"
                 ruido_texto = "MEDIO"
             else:  # alto
                 ruido_color = "red"
                 ruido_texto = "ALTO"
             
-            draw.text((10, y), "Estado: {}".format(ruido_texto), fill=ruido_color, font=self.font_normal)
+            campos.append(((10, y), "Estado: {}".format(ruido_texto), ruido_color, self.font_normal))
             y += 35
             
             # Barra visual
-            barras = int(self.diferencia_mic / 30) if self.diferencia_mic > 0 else 0
+            barras = int(lectura.diferencia_mic / 30) if lectura.diferencia_mic > 0 else 0
             barra_visual = "|" * min(barras, 20)
-            draw.text((10, y), barra_visual, fill=ruido_color, font=self.font_pequena)
+            campos.append(((10, y), barra_visual, ruido_color, self.font_pequena))
         else:
-            draw.text((10, y), "Microfono: ERROR", fill="red", font=self.font_normal)
+            campos.append(((10, y), "Microfono: ERROR", "red", self.font_normal))
         
-        y += 50
-        draw.text((10, y), "BTN1=Atras  BTN3=Siguiente", fill="gray", font=self.font_pequena)
+        return campos, y + 50
+    
+    def campos_pagina(self, pagina, lectura):
+        """Campos y y del pie de la pagina indicada"""
+        if pagina == 0:
+            return self.campos_pagina_1(lectura)
+        elif pagina == 1:
+            return self.campos_pagina_2(lectura)
+        return self.campos_pagina_3(lectura)
+    
+    def dibujar_pagina(self, draw, pagina, lectura):
+        """Pagina completa: fondo y campos"""
+        campos, y_pie = self.campos_pagina(pagina, lectura)
+        self.dibujar_fondo(draw, pagina, y_pie)
+        self.dibujar_campos(draw, campos)
+    
+    def dibujar_pagina_1(self, draw, lectura):
+        """Pagina 1: Temperatura, Humedad, LDR"""
+        self.dibujar_pagina(draw, 0, lectura)
+    
+    def dibujar_pagina_2(self, draw, lectura):
+        """Pagina 2: Sensores de movimiento y gas analogico"""
+        self.dibujar_pagina(draw, 1, lectura)
+    
+    def dibujar_pagina_3(self, draw, lectura):
+        """Pagina 3: Medidor de ruido del microfono"""
+        self.dibujar_pagina(draw, 2, lectura)
+    
+    def obtener_fondo(self, pagina, y_pie):
+        """Fondo pre-dibujado de la pagina (se dibuja una sola vez)"""
+        clave = (pagina, y_pie)
+        fondo = self.fondos.get(clave)
+        if fondo is None:
+            fondo = Image.new(self.device.mode, self.device.size, "black")
+            self.dibujar_fondo(ImageDraw.Draw(fondo), pagina, y_pie)
+            self.fondos[clave] = fondo
+        return fondo
+    
+    def enviar_cuadro(self, imagen):
+        """Manda el cuadro al display y mide el tiempo de SPI"""
+        inicio = time.perf_counter()
+        self.salida.mostrar(imagen)
+        self.tiempo_spi = time.perf_counter() - inicio
+        self.metricas.spi.observar(self.tiempo_spi)
     
     def actualizar_display(self):
-        """Actualiza la pantalla"""
+        """Actualiza la pantalla solo si cambio lo que se muestra"""
         try:
-            with canvas(self.device) as draw:
-                if self.pagina == 0:
-                    self.dibujar_pagina_1(draw)
-                elif self.pagina == 1:
-                    self.dibujar_pagina_2(draw)
-                elif self.pagina == 2:
-                    self.dibujar_pagina_3(draw)
+            campos, y_pie = self.campos_pagina(self.pagina, self.lectura)
+            
+            # Mismos textos en la misma pagina: no se dibuja ni se envia nada
+            clave = (self.pagina, y_pie, tuple(campos))
+            if clave == self.clave_mostrada:
+                self.cuadros_sin_cambios += 1
+                return
+            
+            imagen = self.obtener_fondo(self.pagina, y_pie).copy()
+            self.dibujar_campos(ImageDraw.Draw(imagen), campos)
+            self.enviar_cuadro(imagen)
+            self.clave_mostrada = clave
         except Exception as e:
             print("ERROR: Actualizando display - " + str(e))
     
     def procesar_entrada(self):
-        """Procesa entrada de botones - Detecta cambio de estado"""
-        self.leer_botones()
-        
-        # Detecta transicion: botón presionado (cambio de 0 a 1)
-        if self.btn1 and not self.btn1_anterior:
-            if DEBUG:
-                print("DEBUG: BTN1 presionado - Pagina anterior")
-            self.pagina = (self.pagina - 1) % 3
-            time.sleep(0.3)
-        
-        if self.btn3 and not self.btn3_anterior:
-            if DEBUG:
-                print("DEBUG: BTN3 presionado - Pagina siguiente")
-            self.pagina = (self.pagina + 1) % 3
-            time.sleep(0.3)
-        
-        # Guardar estado anterior
-        self.btn1_anterior = self.btn1
-        self.btn3_anterior = self.btn3
+        """Procesa los eventos de botones y PIR pendientes (no bloquea)"""
+        for evento in self.entradas.leer_eventos():
+            if self.reposo:
+                self.reposo.actividad()  # Sin GPIO propio (demonio) el aviso llega por aca
+            if evento.pin == PIN_BTN1:
+                if DEBUG:
+                    print("DEBUG: BTN1 presionado - Pagina anterior")
+                self.pagina = (self.pagina - 1) % 3
+            
+            elif evento.pin == PIN_BTN3:
+                if DEBUG:
+                    print("DEBUG: BTN3 presionado - Pagina siguiente")
+                self.pagina = (self.pagina + 1) % 3
+            
+            elif evento.pin == PIN_PIR:
+                self.movimiento = evento.valor
+                
+                # Detectar transicion (cambio de estado)
+                if self.movimiento and not self.movimiento_anterior:
+                    if DEBUG:
+                        print("DEBUG: MOVIMIENTO DETECTADO (flanco de subida)")
+                elif not self.movimiento and self.movimiento_anterior:
+                    if DEBUG:
+                        print("DEBUG: Movimiento finalizado (flanco de bajada)")
+                
+                self.movimiento_anterior = self.movimiento
+    
+    def actualizar_reposo(self):
+        """Cambia de estado de reposo segun PIR, botones y luz y aplica sus ajustes"""
+        if not self.reposo or self.reposo.actualizar(self.lectura) is None:
+            return
+        fps, intervalo, pausa_mic, pantalla = self.reposo.ajustes(FPS_OBJETIVO, self.intervalo_sensores_base)
+        if fps:
+            self.planificador.cambiar_fps(fps)
+        self.intervalo_sensores = intervalo
+        if self.hilo_sensores:
+            self.hilo_sensores.cambiar_intervalo(intervalo)
+        if self.muestreador:
+            self.muestreador.pausa = pausa_mic
+        
+        if pantalla == self.pantalla_encendida:
+            return
+        self.pantalla_encendida = pantalla
+        try:
+            if pantalla:
+                self.device.show()
+            else:
+                self.device.hide()
+        except Exception as e:
+            print("ERROR: Encendiendo/apagando display - " + str(e))
+        if pantalla:
+            self.salida.forzar_completo()
+            self.clave_mostrada = None
+            self.planificador.reanudar()
     
-    def ejecutar(self):
-        """Loop principal"""
+    def limpiar(self):
+        """Detiene hilos y servidores y libera el hardware (tambien si inicializar fallo)"""
+        print("INFO: Limpiando recursos...")
+        if self.hilo_sensores:
+            self.hilo_sensores.detener()
+        if self.muestreador:
+            self.muestreador.detener()
+            self.linea_base_mic.guardar()
+        if self.subidor:
+            self.subidor.detener()
+        if self.historial is not None:
+            self.historial.cerrar()
+        if self.compresor:
+            print("INFO: Compresion: " + self.compresor.resumen())
+        if self.agregador:
+            self.agregador.cerrar()
+            self.escritor_agregados.detener()
+        modo = "hilo" if self.hilo_sensores else "en loop"
+        print("INFO: Tiempo por cuadro (sensores {}): {}".format(modo, self.tiempos_cuadro.resumen()))
+        print("INFO: Planificador: " + self.planificador.resumen())
+        if self.reposo:
+            print("INFO: Reposo: " + self.reposo.resumen())
+        self.metricas.detener()
+        self.vivo.detener()
+        if self.entradas:
+            self.entradas.limpiar()
+        if self.dht:
+            self.dht.exit()
+        if self.lector:
+            self.lector.cerrar()
+        for lector in self.lectores_viejos:
+            lector.cerrar()
+        if self.salida:
+            self.salida.cerrar()
+        if self.gpio:
+            self.gpio.cleanup()
+        print("OK: Finalizado")
+    
+    def ejecutar(self, duracion=None):
+        """Loop principal (duracion en segundos, None = hasta Ctrl+C)"""
         if not self.inicializar():
+            # Los escritores, servidores y el GPIO ya pudieron arrancar
+            self.limpiar()
             return
         
         print("\nOK: Monitor iniciado")
@@ -528,22 +773,40 @@ class SensorLCDMonitor:
         if DEBUG:
             print("DEBUG: Modo DEBUG activado - Veras mensajes cuando se presionen botones\n")
         
+        if SENSORES_EN_HILO:
+            self.hilo_sensores = HiloAdquisicion(self.muestrear_sensores, self.intervalo_sensores)
+            self.hilo_sensores.start()
+        
+        self.planificador.iniciar()
+        fin = time.monotonic() + duracion if duracion else None
+        
         try:
-            while True:
-                self.leer_sensores()
+            while fin is None or time.monotonic() < fin:
+                inicio_cuadro = time.perf_counter()
+                if not self.hilo_sensores:
+                    self.leer_sensores()
+                inicio_entrada = time.perf_counter()
                 self.procesar_entrada()
+                self.actualizar_reposo()
+                if not self.pantalla_encendida:
+                    # Pantalla apagada: nada que dibujar hasta un flanco o la proxima revision
+                    self.reposo.dormir()
+                    continue
+                inicio_dibujo = time.perf_counter()
+                self.tiempo_spi = 0.0
                 self.actualizar_display()
-                time.sleep(0.025)  # 25ms para refresh MAS RAPIDO (40 FPS)
+                fin_cuadro = time.perf_counter()
+                self.metricas.entrada.observar(inicio_dibujo - inicio_entrada)
+                self.metricas.dibujo.observar(fin_cuadro - inicio_dibujo - self.tiempo_spi)
+                self.metricas.cuadro.observar(fin_cuadro - inicio_cuadro)
+                self.tiempos_cuadro.registrar(fin_cuadro - inicio_cuadro)
+                self.planificador.esperar()
         
         except KeyboardInterrupt:
             print("\n\nINFO: Monitor detenido por usuario")
         
         finally:
-            print("INFO: Limpiando recursos...")
-            if self.dht:
-                self.dht.exit()
-            GPIO.cleanup()
-            print("OK: Finalizado")
+            self.limpiar()
 
 # ============================================
 # MAIN
@@ -551,7 +814,7 @@ class SensorLCDMonitor:
 
 if __name__ == '__main__':
     # Verificar .env
-    if not os.path.exists('.env'):
+    if MODO_HARDWARE != 'simulado' and not os.path.exists('.env'):
         print("ERROR: Archivo .env no encontrado")
         print("INFO: Copia el archivo .env de tu proyecto")
         sys.exit(1)
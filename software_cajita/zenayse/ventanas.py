@@ -0,0 +1,260 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Ventanas Deslizantes - Proyecto Zenalyze
+Media ponderada por tiempo, minimo, maximo y movimiento de los ultimos
+5/15/60 minutos, en tiempo constante por muestra (sumas acumuladas y colas
+monotonas) para acompanar cada estado de animo sin recorrer el historial
+"""
+
+import os
+import threading
+from collections import deque, namedtuple
+
+# ============================================
+# CONFIGURACION
+# ============================================
+
+# Largo de cada ventana (minutos)
+VENTANAS_CONTEXTO = tuple(int(m) for m in os.getenv('VENTANAS_CONTEXTO', '5,15,60').split(','))
+
+# Campo del contexto -> atributo de LecturaSensores
+CAMPOS_CONTEXTO = (
+    ("temp", "temp"),
+    ("hum", "hum"),
+    ("ppm", "ppm_co2"),
+    ("lux", "lux"),
+    ("mic", "diferencia_mic"),
+)
+
+# Una muestra pesa el tiempo desde la anterior, con tope para que un hueco
+# (demonio caido, reloj ajustado) no domine la media
+MAX_PESO = 60.0
+MIN_PESO = 1e-3
+
+ENCABEZADO_CONTEXTO = "".join(
+    "".join(",{0}_media_{1}m,{0}_min_{1}m,{0}_max_{1}m".format(campo, minutos) for campo, _ in CAMPOS_CONTEXTO)
+    + ",movimiento_{0}m,flancos_pir_{0}m".format(minutos)
+    for minutos in VENTANAS_CONTEXTO)
+
+# ============================================
+# REGISTROS
+# ============================================
+
+# medias, minimos y maximos: tuplas en el orden de CAMPOS_CONTEXTO
+# movimiento: fraccion del tiempo con PIR activo; flancos: subidas del PIR
+ResumenVentana = namedtuple('ResumenVentana', ['minutos', 'cuenta', 'medias', 'minimos', 'maximos',
+                                               'movimiento', 'flancos'])
+
+
+def fila_contexto(resumenes):
+    """Columnas CSV (con la coma inicial) con el formato de ENCABEZADO_CONTEXTO"""
+    partes = []
+    for r in resumenes:
+        if not r.cuenta:
+            partes.append("," * (3 * len(CAMPOS_CONTEXTO) + 2))
+            continue
+        for media, minimo, maximo in zip(r.medias, r.minimos, r.maximos):
+            partes.append(",{:.2f},{:.2f},{:.2f}".format(media, minimo, maximo))
+        partes.append(",{:.3f},{}".format(r.movimiento, r.flancos))
+    return "".join(partes)
+
+# ============================================
+# CLASE VENTANA
+# ============================================
+
+class VentanaDeslizante:
+    """Una ventana de tiempo: sumas que entran y salen, y colas monotonas para min/max"""
+
+    def __init__(self, segundos, campos=len(CAMPOS_CONTEXTO)):
+        self.segundos = segundos
+        self.campos = campos
+        self.muestras = deque()  # (ts, peso, valores, movimiento, flanco)
+
+        self.sumas = [0.0] * campos
+        self.peso = 0.0
+        self.peso_movimiento = 0.0
+        self.flancos = 0
+        self.salidas = 0  # Desde el ultimo recalculo exacto de las sumas
+
+        # Colas de (ts, valor): minimos crecientes y maximos decrecientes
+        self.minimos = [deque() for _ in range(campos)]
+        self.maximos = [deque() for _ in range(campos)]
+
+    def agregar(self, ts, peso, valores, movimiento, flanco):
+        """Suma una muestra y descarta las que quedaron fuera (O(1) amortizado)"""
+        self.muestras.append((ts, peso, valores, movimiento, flanco))
+        sumas = self.sumas
+        for i, valor in enumerate(valores):
+            sumas[i] += valor * peso
+
+            cola = self.minimos[i]
+            while cola and cola[-1][1] >= valor:
+                cola.pop()
+            cola.append((ts, valor))
+
+            cola = self.maximos[i]
+            while cola and cola[-1][1] <= valor:
+                cola.pop()
+            cola.append((ts, valor))
+
+        self.peso += peso
+        if movimiento:
+            self.peso_movimiento += peso
+        if flanco:
+            self.flancos += 1
+        self.descartar(ts)
+
+        # Restar acumula error de redondeo: cada vez que sale una ventana entera
+        # se recalculan las sumas (sigue siendo O(1) amortizado, y nunca al presionar)
+        if self.salidas > len(self.muestras):
+            self.recalcular()
+
+    def descartar(self, ahora):
+        """Saca las muestras anteriores a ahora - segundos"""
+        limite = ahora - self.segundos
+        muestras = self.muestras
+        while muestras and muestras[0][0] < limite:
+            ts, peso, valores, movimiento, flanco = muestras.popleft()
+            for i, valor in enumerate(valores):
+                self.sumas[i] -= valor * peso
+            self.peso -= peso
+            if movimiento:
+                self.peso_movimiento -= peso
+            if flanco:
+                self.flancos -= 1
+            self.salidas += 1
+
+        for cola in self.minimos + self.maximos:
+            while cola and cola[0][0] < limite:
+                cola.popleft()
+
+    def recalcular(self):
+        """Sumas exactas desde las muestras que quedan"""
+        self.sumas = [sum(m[2][i] * m[1] for m in self.muestras) for i in range(self.campos)]
+        self.peso = sum(m[1] for m in self.muestras)
+        self.peso_movimiento = sum(m[1] for m in self.muestras if m[3])
+        self.salidas = 0
+
+    def resumen(self, ahora):
+        """ResumenVentana de lo que queda dentro de la ventana a la hora ahora"""
+        self.descartar(ahora)
+        cuenta = len(self.muestras)
+        if not cuenta:
+            return ResumenVentana(self.segundos // 60, 0, (), (), (), 0.0, 0)
+        peso = self.peso
+        return ResumenVentana(self.segundos // 60, cuenta,
+                              tuple(s / peso for s in self.sumas),
+                              tuple(cola[0][1] for cola in self.minimos),
+                              tuple(cola[0][1] for cola in self.maximos),
+                              self.peso_movimiento / peso, self.flancos)
+
+# ============================================
+# CLASE CONTEXTO
+# ============================================
+
+class ContextoAmbiental:
+    """Todas las ventanas; agregar corre en el hilo de sensores y resumen al presionar un boton"""
+
+    def __init__(self, minutos=VENTANAS_CONTEXTO):
+        self.ventanas = [VentanaDeslizante(m * 60) for m in minutos]
+        self.lock = threading.Lock()
+        self.ultimo_ts = None
+        self.ultimo_movimiento = False
+
+    def agregar(self, lectura):
+        """Suma una LecturaSensores a cada ventana"""
+        ts = lectura.timestamp
+        valores = tuple(float(getattr(lectura, atributo)) for _, atributo in CAMPOS_CONTEXTO)
+        movimiento = bool(lectura.movimiento)
+        with self.lock:
+            peso = 1.0 if self.ultimo_ts is None else min(max(ts - self.ultimo_ts, MIN_PESO), MAX_PESO)
+            flanco = movimiento and not self.ultimo_movimiento
+            self.ultimo_ts = ts
+            self.ultimo_movimiento = movimiento
+            for ventana in self.ventanas:
+                ventana.agregar(ts, peso, valores, movimiento, flanco)
+
+    def resumen(self, ahora):
+        """Un ResumenVentana por ventana, sin recorrer muestras"""
+        with self.lock:
+            return [ventana.resumen(ahora) for ventana in self.ventanas]
+
+# ============================================
+# MAIN - Costo por muestra y comparacion con un recorrido completo
+# ============================================
+
+if __name__ == '__main__':
+    import random
+    import sys
+    import time
+    from compresion_lecturas import lecturas_simuladas
+
+    # Tres horas a 0.3 s con huecos de reposo (una lectura cada 10 s a ratos)
+    lecturas = [l for i, l in enumerate(lecturas_simuladas(36000))
+                if not (12000 <= i < 24000) or i % 33 == 0]
+    contexto = ContextoAmbiental()
+
+    inicio = time.perf_counter()
+    for lectura in lecturas:
+        contexto.agregar(lectura)
+    por_muestra = (time.perf_counter() - inicio) / len(lecturas)
+
+    def recorrido(lecturas, ahora, segundos):
+        """Lo mismo que ResumenVentana, recorriendo todas las muestras"""
+        sumas = [0.0] * len(CAMPOS_CONTEXTO)
+        peso_total = peso_mov = 0.0
+        minimos = [float('inf')] * len(CAMPOS_CONTEXTO)
+        maximos = [float('-inf')] * len(CAMPOS_CONTEXTO)
+        flancos = 0
+        anterior = None
+        for lectura in lecturas:
+            if lectura.timestamp > ahora:
+                break
+            peso = 1.0 if anterior is None else min(max(lectura.timestamp - anterior.timestamp, MIN_PESO), MAX_PESO)
+            flanco = lectura.movimiento and not (anterior and anterior.movimiento)
+            anterior = lectura
+            if lectura.timestamp < ahora - segundos:
+                continue
+            for i, (_, atributo) in enumerate(CAMPOS_CONTEXTO):
+                valor = float(getattr(lectura, atributo))
+                sumas[i] += valor * peso
+                minimos[i] = min(minimos[i], valor)
+                maximos[i] = max(maximos[i], valor)
+            peso_total += peso
+            peso_mov += peso if lectura.movimiento else 0.0
+            flancos += flanco
+        return [s / peso_total for s in sumas], minimos, maximos, peso_mov / peso_total, flancos
+
+    # Presiones al azar: se rehace el contexto hasta ese momento y se compara
+    azar = random.Random(3)
+    error_max = 0.0
+    distintos = 0
+    tiempos = []
+    for _ in range(20):
+        corte = azar.randrange(len(lecturas) // 10, len(lecturas))
+        parcial = ContextoAmbiental()
+        for lectura in lecturas[:corte]:
+            parcial.agregar(lectura)
+        ahora = lecturas[corte - 1].timestamp + azar.uniform(0, 5)
+        t0 = time.perf_counter()
+        resumenes = parcial.resumen(ahora)
+        tiempos.append(time.perf_counter() - t0)
+        for r in resumenes:
+            medias, minimos, maximos, movimiento, flancos = recorrido(lecturas[:corte], ahora, r.minutos * 60)
+            error_max = max([error_max, abs(r.movimiento - movimiento)] +
+                            [abs(a - b) for a, b in zip(r.medias, medias)])
+            if list(r.minimos) != minimos or list(r.maximos) != maximos or r.flancos != flancos:
+                distintos += 1
+
+    print("INFO: {} muestras, {:.1f} us por muestra ({} ventanas)".format(
+        len(lecturas), por_muestra * 1e6, len(VENTANAS_CONTEXTO)))
+    tiempos.sort()
+    print("INFO: Resumen al presionar: mediana {:.1f} us, maximo {:.1f} us (20 presiones)".format(
+        tiempos[len(tiempos) // 2] * 1e6, tiempos[-1] * 1e6))
+    print("INFO: Contra recorrido completo: error de media {:.2e}, min/max/flancos distintos: {}".format(
+        error_max, distintos))
+    ok = error_max < 1e-6 and not distintos
+    print(("OK: " if ok else "ERROR: ") + "Ventanas iguales al recorrido completo")
+    print("INFO: Ultimo contexto:" + fila_contexto(contexto.resumen(lecturas[-1].timestamp)))
+    sys.exit(0 if ok else 1)